@@ -0,0 +1,153 @@
+"""Benchmarks per-entry cost of the lint rules
+
+Usage::
+
+    python benchmarks/bench_lint.py [--ref REF] [NUM_ENTRIES]
+
+This builds a catalog of NUM_ENTRIES entries (defaults to 20000) with a
+mix of python-format and python-brace-format variables, escaped braces
+and malformed variables, then times each lint rule over every entry
+and prints the best of 5 runs.
+
+With ``--ref``, the rules are also timed with the dennis package from
+git revision REF, like ``--ref HEAD~1`` or ``--ref main``, and the
+results are printed side by side. Both runs happen in their own
+process with the same catalog.
+
+"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+
+# Number of times each rule is timed
+REPEAT = 5
+
+MSGS = [
+    ("Hello %(name)s", "Bonjour %(name)s"),
+    ("%(count)s apples (%(pct)s%%)", "%(count)s pommes (%(pct)s%%)"),
+    ("Delete {name}?", "Supprimer {name} ?"),
+    ("Use {{braces}} for {var}", "Utilisez {{accolades}} pour {var}"),
+    ("Broken {foo", "Cassé {foo"),
+    ("Broken foo}", "Cassé foo}"),
+    ("Malformed %(foo)", "Malformé %(foo)"),
+    ("Plain text without any variables", "Texte simple sans variables"),
+]
+
+
+def build_catalog(num_entries):
+    parts = [
+        'msgid ""\n',
+        'msgstr ""\n',
+        '"Content-Type: text/plain; charset=UTF-8\\n"\n',
+        "\n",
+    ]
+    for i in range(num_entries):
+        msgid, msgstr = MSGS[i % len(MSGS)]
+        parts.append(f'msgid "{msgid} {i}"\nmsgstr "{msgstr} {i}"\n\n')
+    return "".join(parts)
+
+
+def time_rules(num_entries):
+    """Returns a list of (rule, name, us/entry) for the importable dennis"""
+    from dennis.linter import LintedEntry, get_lint_rules
+    from dennis.tools import VariableTokenizer, parse_pofile
+
+    po = parse_pofile(build_catalog(num_entries))
+    linted_entries = [LintedEntry(poentry) for poentry in po.translated_entries()]
+    vartok = VariableTokenizer(["python-format", "python-brace-format"])
+
+    timings = []
+    for num, rule_cls in sorted(get_lint_rules().items()):
+        rule = rule_cls()
+        # Like timeit, the best of a few runs is the least noisy
+        elapsed = float("inf")
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            for linted_entry in linted_entries:
+                rule.lint(vartok, linted_entry)
+            elapsed = min(elapsed, time.perf_counter() - start)
+        per_entry = elapsed / len(linted_entries) * 1_000_000
+        timings.append((num, rule_cls.__name__, per_entry))
+    return timings
+
+
+def run_timings(num_entries, path):
+    """Times the rules in a new process with dennis imported from path"""
+    env = dict(os.environ, PYTHONPATH=path)
+    output = subprocess.check_output(
+        [sys.executable, __file__, "--json", str(num_entries)], env=env, cwd=path
+    )
+    return [tuple(timing) for timing in json.loads(output)]
+
+
+def export_ref(ref, dest):
+    """Writes the dennis package from git revision ref into dest"""
+    archive = subprocess.check_output(
+        ["git", "archive", "--format=tar", ref, "dennis"], cwd=REPO
+    )
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tf:
+        tf.extractall(dest)
+
+
+def print_timings(num_entries, timings):
+    print(f"{num_entries} entries")
+    for num, name, per_entry in timings:
+        print(f"{num}  {name:40}  {per_entry:7.2f} us/entry")
+    total = sum(per_entry for _, _, per_entry in timings)
+    print(f"{'all rules':46}  {total:7.2f} us/entry")
+
+
+def print_comparison(num_entries, ref, ref_timings, timings):
+    ref_rules = {num: per_entry for num, _, per_entry in ref_timings}
+    print(f"{num_entries} entries, us/entry")
+    print(f"{'':46}  {ref[:10]:>10}  {'current':>10}  {'change':>7}")
+    rows = [
+        (f"{num}  {name}", ref_rules.get(num), per_entry)
+        for num, name, per_entry in timings
+    ]
+    rows.append(
+        (
+            "all rules",
+            sum(ref_rules.values()),
+            sum(per_entry for _, _, per_entry in timings),
+        )
+    )
+    for label, before, after in rows:
+        if before is None:
+            # The rule is new since ref
+            print(f"{label:46}  {'-':>10}  {after:10.2f}")
+        else:
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{label:46}  {before:10.2f}  {after:10.2f}  {change:+6.1f}%")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    ref = None
+    as_json = False
+    if args and args[0] == "--json":
+        as_json = True
+        args = args[1:]
+    elif args and args[0] == "--ref":
+        ref = args[1]
+        args = args[2:]
+    num_entries = int(args[0]) if args else 20000
+
+    if as_json:
+        print(json.dumps(time_rules(num_entries)))
+    elif ref:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            export_ref(ref, tmpdir)
+            ref_timings = run_timings(num_entries, tmpdir)
+        print_comparison(num_entries, ref, ref_timings, run_timings(num_entries, REPO))
+    else:
+        print_timings(num_entries, time_rules(num_entries))
@@ -0,0 +1,91 @@
+"""Benchmarks the translate transforms on long strings
+
+Usage::
+
+    python benchmarks/bench_translate.py [MAX_LENGTH]
+
+This builds help-page-like strings, with python-format and
+python-brace-format variables and HTML and as plain text, doubling the
+length up to MAX_LENGTH characters (defaults to 100000), then times each
+transform over them. Time per character should stay about the same as
+strings get longer.
+
+It also times translating each sentence of the help page by itself with
+a few pipelines, which is what translating a catalog looks like.
+
+"""
+
+import sys
+import time
+
+from dennis.tools import VariableTokenizer
+from dennis.translator import Token, Translator, get_available_pipeline_parts
+
+PARAGRAPH = (
+    "<p>Where are your add-ons? If you want to use %(count)s plugins with "
+    'the browser, open the <a href="{url}">Add-ons Manager</a> and search '
+    "for them. There's no need to restart. Need help? Yes, we're here for "
+    "you: ask over there in the support forum!</p>\n"
+)
+
+
+PLAIN_PARAGRAPH = (
+    "Where are your add-ons? If you want to use plugins with the browser, "
+    "open the Add-ons Manager and search for them. There's no need to "
+    "restart. Need help? Yes, we're here for you: ask over there in the "
+    "support forum!\n"
+)
+
+
+PIPELINES = [
+    "shouty",
+    "shouty,double,redacted,reverse",
+    "html,pirate,anglequote",
+    "html,zombie,shouty,reverse",
+]
+
+
+def build_string(paragraph, length):
+    return (paragraph * (length // len(paragraph) + 1))[:length]
+
+
+def bench(max_length):
+    vartok = VariableTokenizer(["python-format", "python-brace-format"])
+    parts = get_available_pipeline_parts()
+
+    lengths = []
+    length = 1000
+    while length <= max_length:
+        lengths.append(length)
+        length *= 2
+
+    for title, paragraph in (("help page", PARAGRAPH), ("plain text", PLAIN_PARAGRAPH)):
+        print(f"{title} (ns/char)")
+        print(f"{'transform':10}" + "".join(f"{length:>10}" for length in lengths))
+        for name, cls in sorted(parts.items()):
+            trans = cls()
+            timings = []
+            for length in lengths:
+                s = build_string(paragraph, length)
+                start = time.perf_counter()
+                trans.transform(vartok, [Token(s)])
+                elapsed = time.perf_counter() - start
+                timings.append(elapsed / length * 1_000_000_000)
+            print(f"{name:10}" + "".join(f"{timing:10.1f}" for timing in timings))
+        print("")
+
+    sentences = [sentence + "." for sentence in PARAGRAPH.split(".")] * 1000
+    print(f"{len(sentences)} sentences (us/string)")
+    for spec in PIPELINES:
+        translator = Translator(
+            ["python-format", "python-brace-format"], spec.split(",")
+        )
+        start = time.perf_counter()
+        for sentence in sentences:
+            translator.translate_string(sentence)
+        elapsed = time.perf_counter() - start
+        print(f"{spec:32}  {elapsed / len(sentences) * 1_000_000:7.2f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,221 @@
+"""Reading catalogs out of zip and tar archives
+
+A file in an archive is named by the path of the archive and the name
+of the member joined with ``!`` like
+``bundle.zip!locale/de/LC_MESSAGES/messages.po``. Members are read
+into memory, so nothing is extracted to disk.
+
+"""
+
+import os
+import tarfile
+import zipfile
+
+from dennis.poreader import DECOMPRESS_ERRORS
+
+ARCHIVE_SEP = "!"
+
+# Suffixes of archives dennis reads
+ARCHIVE_SUFFIXES = (
+    ".zip",
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+)
+
+# Errors the archive modules raise for broken archives that aren't IOErrors
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError) + DECOMPRESS_ERRORS
+
+
+def is_archive(fn):
+    """Returns whether fn is the filename of an archive"""
+    return fn.endswith(ARCHIVE_SUFFIXES) and os.path.isfile(fn)
+
+
+def split_member(fn):
+    """Splits the path of a member of an archive into its parts
+
+    :returns: ``(archive, member)`` or None if fn isn't the path of a
+        member of an archive
+
+    """
+    if not isinstance(fn, str) or ARCHIVE_SEP not in fn or "\n" in fn:
+        return None
+    pos = fn.find(ARCHIVE_SEP)
+    while pos != -1:
+        archive = fn[:pos]
+        if is_archive(archive):
+            return archive, fn[pos + 1 :]
+        pos = fn.find(ARCHIVE_SEP, pos + 1)
+    return None
+
+
+def is_member(fn):
+    """Returns whether fn is the path of a member of an archive"""
+    return split_member(fn) is not None
+
+
+def member_path(archive, member):
+    """Returns the path of a member of an archive"""
+    return archive + ARCHIVE_SEP + member
+
+
+def abspath(fn):
+    """Returns the absolute path of a file or a member of an archive"""
+    parts = split_member(fn)
+    if parts is None:
+        return os.path.abspath(fn)
+    return member_path(os.path.abspath(parts[0]), parts[1])
+
+
+class ArchiveReader:
+    """Reads members of a zip or tar archive
+
+    Compressed tar files can't be read from the middle, so members of a
+    tar file are found by reading forward from the last member that was
+    read. Reading members in the order they're in the archive only reads
+    the archive once.
+
+    :arg path: filename of the archive
+
+    :raises IOError: if the archive can't be opened
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fingerprint = fingerprint(path)
+        self.pid = os.getpid()
+        self.zip = None
+        self.tar = None
+        # TarInfo for tar members that have been passed, by name
+        self.tar_members = {}
+        # The member that was read last and its contents
+        self.last = (None, None)
+        try:
+            if zipfile.is_zipfile(path):
+                self.zip = zipfile.ZipFile(path)
+            else:
+                self.tar = tarfile.open(path)
+        except ARCHIVE_ERRORS as exc:
+            raise IOError(f"Invalid archive {path}: {exc}")
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+        if self.tar is not None:
+            self.tar.close()
+
+    def names(self):
+        """Returns names of the files in the archive
+
+        Names are in the order they're in the archive.
+
+        :raises IOError: if the archive is broken
+
+        """
+        try:
+            if self.zip is not None:
+                infos = [info for info in self.zip.infolist() if not info.is_dir()]
+            else:
+                infos = [info for info in self.tar.getmembers() if info.isfile()]
+                self.tar_members.update((info.name, info) for info in infos)
+        except ARCHIVE_ERRORS as exc:
+            raise IOError(f"Invalid archive {self.path}: {exc}")
+        return [info.filename if self.zip else info.name for info in infos]
+
+    def read(self, member):
+        """Returns the contents of a member of the archive
+
+        :raises IOError: if the archive is broken or doesn't have member
+
+        """
+        if self.last[0] == member:
+            return self.last[1]
+        try:
+            if self.zip is not None:
+                data = self.zip.read(member)
+            else:
+                data = self.read_tar_member(member)
+        except KeyError:
+            raise IOError(f'Archive {self.path} doesn\'t have "{member}".')
+        except ARCHIVE_ERRORS as exc:
+            raise IOError(f"Invalid archive {self.path}: {exc}")
+        self.last = (member, data)
+        return data
+
+    def read_tar_member(self, member):
+        info = self.tar_members.get(member)
+        while info is None:
+            info = self.tar.next()
+            if info is None:
+                raise KeyError(member)
+            self.tar_members[info.name] = info
+            if info.name != member:
+                info = None
+        fp = self.tar.extractfile(info)
+        if fp is None:
+            # Directories and links don't have contents
+            raise KeyError(member)
+        with fp:
+            return fp.read()
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# The archive that was read last. Members of an archive are usually read
+# one after another, so this saves opening the archive for each one.
+_reader = None
+
+
+def get_reader(path):
+    """Returns an ArchiveReader for path, reusing the last one if it can
+
+    :raises IOError: if the archive can't be opened
+
+    """
+    global _reader
+    if _reader is not None and _reader.pid != os.getpid():
+        # A forked worker process can't share the open archive with its
+        # parent since the file position is shared
+        _reader = None
+    if _reader is not None:
+        if _reader.path == path and _reader.fingerprint == fingerprint(path):
+            return _reader
+        _reader.close()
+        _reader = None
+    _reader = ArchiveReader(path)
+    return _reader
+
+
+def list_members(archive, suffixes):
+    """Returns paths of the files in an archive that end in suffixes
+
+    :raises IOError: if the archive can't be read
+
+    """
+    names = get_reader(archive).names()
+    return [member_path(archive, name) for name in names if name.endswith(suffixes)]
+
+
+def read_member(fn):
+    """Returns the contents of a member of an archive as bytes
+
+    :arg fn: path of the member like ``bundle.zip!de/messages.po``
+
+    :raises IOError: if the archive can't be read or doesn't have the
+        member
+
+    """
+    parts = split_member(fn)
+    if parts is None:
+        raise IOError(f'File "{fn}" does not exist.')
+    archive, member = parts
+    return get_reader(archive).read(member)
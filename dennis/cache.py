@@ -0,0 +1,760 @@
+"""On-disk caches so dennis doesn't redo work for files that haven't changed"""
+
+import contextlib
+import gc
+import hashlib
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_right
+
+from polib import POFile
+
+from dennis import __version__
+from dennis.linter import HTMLParseError, LintedEntry, build_scanner
+from dennis.archives import is_member, read_member
+from dennis.poreader import POReader, ReaderEntry
+from dennis.tools import LRUCache, VariableTokenizer, parse_pofile
+from dennis.translator import Token
+
+# Default maximum size of a cache directory in bytes
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+# Files modified less than this many nanoseconds before they were read
+# could change again without their modification time changing, so
+# they're always checked against their hash. This covers filesystems
+# with timestamps as coarse as 2 seconds.
+RACY_NS = 2 * 10**9
+
+
+@contextlib.contextmanager
+def atomic_file(path):
+    """Opens a file for writing bytes that's moved to path when it's done
+
+    Other processes never see partially written files.
+
+    """
+    dirname = os.path.dirname(path) or "."
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            yield fp
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def dump_pickle(value, path):
+    """Pickles value to path atomically"""
+    with atomic_file(path) as fp:
+        pickle.dump(value, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def dump_json_lines(values, path):
+    """Writes each value as a line of JSON to path atomically
+
+    Index files next to catalogs are written this way instead of being
+    pickled, since loading a pickle from a source tree could run code.
+
+    """
+    with atomic_file(path) as fp:
+        for value in values:
+            fp.write(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+            fp.write(b"\n")
+
+
+class DiskCache:
+    """Directory of pickled values keyed by hex digest
+
+    Every value is stored in its own file. Hits touch the file so the
+    directory can be trimmed down to ``max_size`` bytes by evicting the
+    least recently used values first.
+
+    This is safe to use from several processes at the same time: values
+    are written atomically and files that disappear are treated as
+    misses.
+
+    :arg cache_dir: the directory to keep cached values in
+    :arg max_size: the maximum size of the cache directory in bytes
+
+    """
+
+    suffix = ".pickle"
+
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key):
+        """Returns the value for key or None if it's not in the cache"""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as fp:
+                value = pickle.load(fp)
+            # Bump the mtime so this is the most recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # The file is corrupt or from an incompatible version, so we
+            # treat it as a miss and it'll get overwritten.
+            return None
+        return value
+
+    def set(self, key, value):
+        """Stores value for key"""
+        dump_pickle(value, self.path(key))
+
+    def evict(self):
+        """Removes least recently used values until under max_size"""
+        try:
+            dir_entries = list(os.scandir(self.cache_dir))
+        except FileNotFoundError:
+            return
+
+        files = []
+        total_size = 0
+        for dir_entry in dir_entries:
+            if not dir_entry.name.endswith(self.suffix):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, dir_entry.path))
+            total_size += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+
+class LintCache(DiskCache):
+    """Cache of lint results for files keyed on contents and configuration
+
+    Results are keyed by the hash of the file contents, the dennis
+    version, the variable formats and the lint rules used, so changing
+    any of those is a miss.
+
+    """
+
+    def key(self, fn, linter):
+        """Computes the cache key for linting fn with linter
+
+        :arg fn: the filename of the file to lint
+        :arg linter: the Linter or TemplateLinter that lints the file
+
+        :returns: hex digest
+
+        :raises IOError: if the file can't be read
+
+        """
+        hasher = hashlib.sha256()
+        config = __version__ + "\n" + repr(linter.cache_config)
+        hasher.update(config.encode("utf-8"))
+        hasher.update(b"\0")
+        hash_file(hasher, fn)
+        return hasher.hexdigest()
+
+
+class CatalogCache(DiskCache):
+    """Cache of parsed pofiles
+
+    Each pofile has a snapshot of its parsed entries keyed on its path.
+    A snapshot is used if the modification time and size of the file are
+    the same as when it was parsed or, if they're not, if the contents
+    hash the same. Otherwise the file is parsed again and the snapshot is
+    replaced.
+
+    Like git's "racy" entries, a file that was modified within
+    :py:attr:`racy_ns` of when it was read could change again without
+    its modification time changing on filesystems with coarse
+    timestamps, so its contents are always hashed.
+
+    Snapshots don't include the original block text of entries except
+    for compressed files and members of archives. It's read from the
+    file when it's used like it is for freshly parsed files.
+
+    """
+
+    # Entry attributes stored in snapshots
+    fields = (
+        "msgid",
+        "msgstr",
+        "msgid_plural",
+        "msgstr_plural",
+        "msgctxt",
+        "obsolete",
+        "encoding",
+        "comment",
+        "tcomment",
+        "occurrences",
+        "flags",
+        "previous_msgctxt",
+        "previous_msgid",
+        "previous_msgid_plural",
+        "linenum",
+        "span",
+        "_original",
+    )
+
+    racy_ns = RACY_NS
+
+    def key(self, fn):
+        """Computes the cache key for fn
+
+        :returns: hex digest
+
+        """
+        path = __version__ + "\n" + os.path.abspath(fn)
+        return hashlib.sha256(path.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def file_hash(self, fn):
+        return file_digest(fn)
+
+    def snapshot(self, po, stat, file_hash, read_time):
+        """Returns a snapshot of a POFile or None if it can't have one
+
+        :arg read_time: ``time.time_ns()`` from before the file was read
+
+        """
+        if not all(type(entry) is ReaderEntry for entry in po):
+            # Files only polib could parse don't have spans
+            return None
+        fields = self.fields
+        return {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": file_hash,
+            "read_time": read_time,
+            "encoding": po.encoding,
+            "header": po.header,
+            "metadata": po.metadata,
+            "metadata_is_fuzzy": po.metadata_is_fuzzy,
+            "entries": [
+                tuple(getattr(entry, field) for field in fields) for entry in po
+            ],
+        }
+
+    def load_snapshot(self, fn, snapshot):
+        """Builds a POFile from a snapshot"""
+        reader = POReader(fn, encoding=snapshot["encoding"])
+        po = POFile(pofile=fn, encoding=snapshot["encoding"])
+        po.header = snapshot["header"]
+        po.metadata = snapshot["metadata"]
+        po.metadata_is_fuzzy = snapshot["metadata_is_fuzzy"]
+
+        fields = self.fields
+        new_entry = ReaderEntry.__new__
+        entries = []
+        for values in snapshot["entries"]:
+            entry = new_entry(ReaderEntry)
+            entry.__dict__.update(zip(fields, values))
+            entry.reader = reader
+            entries.append(entry)
+        po.extend(entries)
+        return po
+
+    def load(self, key, fn, stat):
+        """Returns the POFile from the snapshot for fn or None"""
+        snapshot = self.get(key)
+        if snapshot is None or snapshot["size"] != stat.st_size:
+            return None
+
+        read_time = snapshot.get("read_time", snapshot["mtime"])
+        racy = snapshot["mtime"] >= read_time - self.racy_ns
+        if racy or snapshot["mtime"] != stat.st_mtime_ns:
+            read_time = time.time_ns()
+            if snapshot["hash"] != self.file_hash(fn):
+                return None
+            # The file is the same, so we update the snapshot so we don't
+            # hash it again next time unless it's still racy.
+            snapshot["mtime"] = stat.st_mtime_ns
+            snapshot["read_time"] = read_time
+            self.save(key, snapshot)
+
+        return self.load_snapshot(fn, snapshot)
+
+    def parse(self, fn):
+        """Parses fn using the snapshot if the file hasn't changed
+
+        :arg fn: the filename of the pofile
+
+        :returns: polib POFile
+
+        :raises IOError: if the file can't be read or parsed
+
+        """
+        key = self.key(fn)
+        stat = os.stat(fn)
+        read_time = time.time_ns()
+
+        # Loading a snapshot creates lots of objects, but none of them are
+        # garbage, so collecting while loading is wasted time.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            po = self.load(key, fn, stat)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if po is not None:
+            return po
+
+        # The hash is from before the file is parsed, so if the file
+        # changes while it's parsed without its mtime changing, the
+        # snapshot doesn't match it
+        file_hash = self.file_hash(fn)
+        po = parse_pofile(fn)
+        new_stat = os.stat(fn)
+        if (new_stat.st_mtime_ns, new_stat.st_size) != (stat.st_mtime_ns, stat.st_size):
+            # The file changed while we were parsing it, so we don't know
+            # which version we have.
+            return po
+
+        snapshot = self.snapshot(po, stat, file_hash, read_time)
+        if snapshot is not None:
+            self.save(key, snapshot)
+        return po
+
+    def save(self, key, snapshot):
+        try:
+            self.set(key, snapshot)
+        except OSError:
+            # If we can't write to the cache, we just don't cache.
+            pass
+
+
+def hash_file(hasher, fn):
+    """Updates hasher with the contents of fn
+
+    :arg fn: filename or path of a member of an archive
+
+    """
+    if is_member(fn):
+        hasher.update(read_member(fn))
+        return
+    with open(fn, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            hasher.update(chunk)
+
+
+def file_digest(fn):
+    """Returns the hex digest of the contents of fn"""
+    hasher = hashlib.sha256()
+    hash_file(hasher, fn)
+    return hasher.hexdigest()
+
+
+class EntryCache(LRUCache):
+    """Cache of lint results for individual entries
+
+    Linters look up entries by their msgid, msgid_plural, msgstr
+    values, dennis-ignore note, variable formats and lint rules, so an
+    entry that's the same in another file or another run doesn't need
+    to be linted again. Values are lists of ``(kind, col, code, msg)``
+    tuples.
+
+    With track_added, this keeps track of entries added since the last
+    call to :py:meth:`pop_added` so that caches in worker processes can
+    be merged back.
+
+    :arg maxsize: the maximum number of entries to hold
+    :arg track_added: whether to keep track of added entries; if this is
+        on, :py:meth:`pop_added` has to be called regularly
+
+    """
+
+    def __init__(self, maxsize=100000, track_added=False):
+        super().__init__(maxsize)
+        self.track_added = track_added
+        self.added = []
+
+    def set(self, key, value):
+        super().set(key, value)
+        if self.track_added:
+            self.added.append((key, value))
+
+    def pop_added(self):
+        """Returns the ``(key, value)`` pairs added and forgets them"""
+        added = self.added
+        self.added = []
+        return added
+
+    def update(self, items):
+        """Adds ``(key, value)`` pairs from another cache"""
+        for key, value in items:
+            LRUCache.set(self, key, value)
+
+    def __getstate__(self):
+        # The pairs added in this process aren't interesting elsewhere
+        state = self.__dict__.copy()
+        state["added"] = []
+        return state
+
+    def load(self, path):
+        """Loads entries saved with :py:meth:`save`
+
+        Missing, corrupt or out-of-date files are ignored.
+
+        """
+        try:
+            with open(path, "rb") as fp:
+                data = pickle.load(fp)
+        except Exception:
+            return
+        if not isinstance(data, dict) or data.get("version") != __version__:
+            return
+
+        for key, value in data["items"]:
+            LRUCache.set(self, key, value)
+
+    def save(self, path):
+        """Saves the entries to path"""
+        dump_pickle({"version": __version__, "items": list(self.data.items())}, path)
+
+
+def encode_analysis_item(key, value):
+    """Returns a msgid analysis item as JSON-compatible values"""
+    kind = key[0]
+    if kind == "html":
+        if isinstance(value, HTMLParseError):
+            value = {"error": [str(arg) for arg in value.args]}
+        else:
+            value = [[token.s, token.type, token.mutable] for token in value]
+    elif kind == "tokens":
+        value = sorted(value) if isinstance(value, set) else list(value)
+    elif kind != "names":
+        raise ValueError(f"unknown analysis item {kind!r}")
+    return [list(key), value]
+
+
+def decode_analysis_item(item):
+    """Returns the ``(key, value)`` msgid analysis item from JSON values
+
+    :raises ValueError: if item isn't a valid item
+
+    """
+    key, value = item
+    key = tuple(key)
+    kind = key[0]
+    if kind == "html":
+        if isinstance(value, dict):
+            value = HTMLParseError(*value["error"])
+        else:
+            value = [Token(s, type_, bool(mutable)) for s, type_, mutable in value]
+    elif kind == "tokens":
+        # Tokens are a set when they're unique
+        value = set(value) if key[2] else list(value)
+    elif kind == "names":
+        value = list(value)
+    else:
+        raise ValueError(f"unknown analysis item {kind!r}")
+    return key, value
+
+
+class PotIndex:
+    """Precomputed msgid analysis for a .pot file
+
+    The variables, variable names and html tags of every msgid in the
+    .pot file are stored in ``<pot>.dennis-index`` next to it. Linters
+    load it with ``load_msgid_analysis()`` so they don't analyze the
+    msgids again for every locale.
+
+    The index file is JSON, since it's in the source tree and could come
+    from anywhere. Its first line is the fingerprint and the items are
+    only read if it matches. The index is rebuilt when the contents of
+    the .pot file, the variable formats or the dennis version change.
+
+    :arg pot_fn: the filename of the .pot file
+
+    """
+
+    suffix = ".dennis-index"
+
+    def __init__(self, pot_fn):
+        self.pot_fn = pot_fn
+        self.path = pot_fn + self.suffix
+
+    def fingerprint(self, varformats):
+        """Returns what the index has to match to be used
+
+        :raises IOError: if the .pot file can't be read
+
+        """
+        hasher = hashlib.sha256()
+        hash_file(hasher, self.pot_fn)
+        return {
+            "version": __version__,
+            "formats": [fmt.name for fmt in VariableTokenizer(varformats).formats],
+            "pot_hash": hasher.hexdigest(),
+        }
+
+    def load(self, fingerprint):
+        """Returns the items in the index or None if it's missing or stale"""
+        try:
+            with open(self.path, "rb") as fp:
+                if json.loads(fp.readline()) != fingerprint:
+                    return None
+                return [decode_analysis_item(item) for item in json.loads(fp.read())]
+        except (OSError, ValueError, TypeError, KeyError, IndexError):
+            return None
+
+    def build(self, varformats):
+        """Analyzes the msgids in the .pot file
+
+        :returns: list of ``(key, value)`` msgid analysis items
+
+        :raises IOError: if the .pot file can't be parsed
+
+        """
+        vartok = VariableTokenizer(varformats)
+        scanner = build_scanner(vartok, [])
+        table = LRUCache(maxsize=sys.maxsize)
+        for poentry in parse_pofile(self.pot_fn):
+            linted_entry = LintedEntry(poentry, scanner, table)
+            msgid_strings = linted_entry.str.msgid_strings
+            for text in msgid_strings:
+                for unique in (True, False):
+                    linted_entry.variable_names(vartok, text, unique=unique)
+            # The lint rules tokenize plurals with the strings joined
+            linted_entry.extract_tokens(vartok, " ".join(msgid_strings))
+            for text in msgid_strings:
+                try:
+                    linted_entry.html_tokens(vartok, text)
+                except HTMLParseError:
+                    break
+        return list(table.data.items())
+
+    def save(self, fingerprint, items):
+        """Saves the items to the index file"""
+        encoded = [encode_analysis_item(key, value) for key, value in items]
+        dump_json_lines([fingerprint, encoded], self.path)
+
+    def get_items(self, varformats):
+        """Returns the analysis items, rebuilding the index if it's stale
+
+        If the index can't be written, the items are still returned.
+
+        :raises IOError: if the .pot file can't be read or parsed
+
+        """
+        fingerprint = self.fingerprint(varformats)
+        items = self.load(fingerprint)
+        if items is None:
+            items = self.build(varformats)
+            try:
+                self.save(fingerprint, items)
+            except OSError:
+                pass
+        return items
+
+
+class EntryIndex:
+    """Index of where the entries are in a pofile
+
+    This maps line numbers and entry numbers to byte ranges of the file
+    so a few entries can be parsed without reading the rest of the file.
+    The index is stored in ``<pofile>.dennis-entries`` next to the
+    pofile and is rebuilt when the size or modification time of the
+    pofile changes. Like for :py:class:`CatalogCache`, if the pofile was
+    modified within :py:attr:`racy_ns` of when it was indexed, or if
+    only its modification time changed, its contents are checked
+    against the hash in the index. Like the :py:class:`PotIndex` file,
+    the index is JSON with the fingerprint on the first line.
+
+    Entries are numbered from 0 in the order they're in the file. The
+    metadata entry isn't counted.
+
+    :arg fn: the filename of the pofile
+
+    """
+
+    suffix = ".dennis-entries"
+
+    racy_ns = RACY_NS
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.path = fn + self.suffix
+        self.encoding = None
+        self.size = 0
+        # Hash of the pofile and time.time_ns() from before it was read
+        self.hash = None
+        self.read_time = None
+        # Line number and byte offset where each entry starts
+        self.linenums = array("q")
+        self.starts = array("q")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def fingerprint(self):
+        """Returns what the index has to match to be used
+
+        :raises IOError: if the pofile can't be read
+
+        """
+        stat = os.stat(self.fn)
+        return {
+            "version": __version__,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+        }
+
+    def load(self, fingerprint):
+        """Loads the index file and returns whether it's usable"""
+        try:
+            with open(self.path, "rb") as fp:
+                header = json.loads(fp.readline())
+                if not self.is_current(header, fingerprint):
+                    return False
+                data = json.loads(fp.read())
+            encoding = data["encoding"]
+            linenums = array("q", data["linenums"])
+            starts = array("q", data["starts"])
+        except (OSError, ValueError, TypeError, KeyError, OverflowError):
+            return False
+        if not isinstance(encoding, str) or len(linenums) != len(starts):
+            return False
+        self.encoding = encoding
+        self.size = fingerprint["size"]
+        self.hash = header["hash"]
+        self.read_time = header["read_time"]
+        self.linenums = linenums
+        self.starts = starts
+        return True
+
+    def is_current(self, header, fingerprint):
+        """Returns whether the index with header is for the pofile now
+
+        :raises IOError: if the pofile can't be read
+        :raises KeyError: if header is missing something
+
+        """
+        if (header["version"], header["size"]) != (
+            fingerprint["version"],
+            fingerprint["size"],
+        ):
+            return False
+        racy = header["mtime"] >= header["read_time"] - self.racy_ns
+        if racy or header["mtime"] != fingerprint["mtime"]:
+            return header["hash"] == file_digest(self.fn)
+        return True
+
+    def build(self, fingerprint):
+        """Reads the pofile and indexes the entries in it
+
+        :raises IOError: if the pofile can't be parsed
+
+        """
+        # The hash is from before the file is read, so if the file
+        # changes while it's read, the index doesn't match it
+        self.read_time = time.time_ns()
+        self.hash = file_digest(self.fn)
+        reader = POReader(self.fn)
+        linenums = array("q")
+        starts = array("q")
+        for entry in reader:
+            linenums.append(entry.linenum)
+            starts.append(entry.span[0])
+        self.encoding = reader.encoding
+        self.size = fingerprint["size"]
+        self.linenums = linenums
+        self.starts = starts
+
+    def save(self, fingerprint):
+        """Saves the index file"""
+        header = dict(fingerprint, hash=self.hash, read_time=self.read_time)
+        dump_json_lines(
+            [
+                header,
+                {
+                    "encoding": self.encoding,
+                    "linenums": self.linenums.tolist(),
+                    "starts": self.starts.tolist(),
+                },
+            ],
+            self.path,
+        )
+
+    def load_or_build(self):
+        """Loads the index file, rebuilding it if it's missing or stale
+
+        If the index can't be written, the index is still usable.
+
+        :raises IOError: if the pofile can't be read or parsed
+
+        """
+        fingerprint = self.fingerprint()
+        if not self.load(fingerprint):
+            self.build(fingerprint)
+            try:
+                self.save(fingerprint)
+            except OSError:
+                pass
+
+    def find_line(self, linenum):
+        """Returns the number of the entry that line linenum is in
+
+        Lines before the first entry are in entry 0.
+
+        """
+        return max(bisect_right(self.linenums, linenum) - 1, 0)
+
+    def entry_span(self, first, stop):
+        """Returns the byte range of entries ``first`` up to ``stop``"""
+        start = self.starts[first]
+        end = self.starts[stop] if stop < len(self) else self.size
+        return (start, end)
+
+    def iter_entries(self, first, stop):
+        """Parses and yields entries ``first`` up to ``stop``
+
+        :raises IOError: if the pofile has a syntax error
+
+        """
+        first = max(first, 0)
+        stop = min(stop, len(self))
+        if first >= stop:
+            return iter(())
+        # The first entry in a file without metadata starts at line 1
+        first_line = self.linenums[first] if self.starts[first] else 1
+        reader = POReader(
+            self.fn,
+            span=self.entry_span(first, stop),
+            first_line=first_line,
+            encoding=self.encoding,
+        )
+        return iter(reader)
+
+    def iter_lines(self, first_line, last_line):
+        """Parses and yields the entries with lines between two lines
+
+        :arg first_line: the first line number
+        :arg last_line: the last line number, inclusive
+
+        :raises IOError: if the pofile has a syntax error
+
+        """
+        first = self.find_line(first_line)
+        stop = bisect_right(self.linenums, last_line)
+        return self.iter_entries(first, stop)
@@ -1,18 +1,32 @@
+import itertools
 import os
 import sys
 import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from functools import wraps
 from textwrap import dedent
 
 import click
 
 from dennis import __version__
+from dennis.archives import abspath, is_archive, is_member, list_members
+from dennis.cache import CatalogCache, EntryCache, LintCache, PotIndex
+from dennis.discovery import walk_files
 from dennis.linter import Linter
 from dennis.linter import get_lint_rules as get_linter_rules
+from dennis.poreader import (
+    COMPRESSED_SUFFIXES,
+    decode_pofile,
+    iter_pofile,
+    strip_compressed_suffix,
+)
+from dennis.reporters import OutputBuffer, get_reporters
 from dennis.templatelinter import TemplateLinter
 from dennis.templatelinter import get_lint_rules as get_template_linter_rules
 from dennis.tools import (
     get_available_formats,
+    LRUCache,
     parse_pofile,
     withlines,
 )
@@ -21,6 +35,14 @@ from dennis.translator import get_available_pipeline_parts, InvalidPipeline, Tra
 USAGE = "%prog [options] [command] [command-options]"
 VERSION = "dennis " + __version__
 
+# Name lint results for a file read from stdin are shown with
+STDIN_NAME = "<stdin>"
+
+# Suffixes of the files lint finds in directories
+LINT_SUFFIXES = tuple(
+    ext + suffix for ext in (".po", ".pot") for suffix in ("",) + COMPRESSED_SUFFIXES
+)
+
 
 def utf8_args(fun):
     @wraps(fun)
@@ -103,6 +125,242 @@ def epilog(docstring):
     return _epilog
 
 
+def read_paths(fp, null=False):
+    """Returns the paths in a file with one path per line
+
+    :arg fp: binary file to read
+    :arg null: whether paths are separated by NUL characters instead
+
+    """
+    data = fp.read()
+    if null:
+        names = data.split(b"\0")
+    else:
+        names = [name.rstrip(b"\r") for name in data.split(b"\n")]
+    return [os.fsdecode(name) for name in names if name]
+
+
+def archive_members(fn, suffixes):
+    """Returns paths of the members of archive fn that end in suffixes"""
+    try:
+        return list_members(os.path.abspath(fn), suffixes)
+    except IOError as ioe:
+        raise click.UsageError(
+            f'Problem opening archive "{click.format_filename(fn)}": {ioe}'
+        )
+
+
+def is_template_text(text):
+    """Returns whether the pofile contents in text are a .pot file
+
+    Contents from stdin don't have a filename to go by, so a pofile
+    without any translated strings is a .pot file.
+
+    """
+    try:
+        for entry in iter_pofile(text):
+            if entry.msgstr or any(entry.msgstr_plural.values()):
+                return False
+    except IOError:
+        # The linter reports the problem
+        return False
+    return True
+
+
+def lint_file(linter, templatelinter, fn, cache=None, lines=None, text=None):
+    """Lints a single .po/.pot/.mo file
+
+    :arg linter: the Linter to use for .po and .mo files
+    :arg templatelinter: the TemplateLinter to use for .pot files
+    :arg fn: the filename to lint
+    :arg cache: the LintCache to use or None
+    :arg lines: ``(first_line, last_line)`` to only lint the entries
+        with lines in that range or None; the cache isn't used for these
+    :arg text: the contents of the file if it was read from stdin; it's
+        linted with templatelinter if it has no translated strings and
+        linter otherwise and isn't cached
+
+    :returns: ``(results, ioerror)`` tuple; if the file couldn't be opened
+        or parsed, results is None and ioerror is the IOError
+
+    """
+    if text is not None:
+        if is_template_text(text):
+            linter = templatelinter
+        try:
+            if lines is not None:
+                return linter.verify_lines(text, *lines), None
+            return linter.verify_file(text), None
+        except IOError as ioe:
+            return None, ioe
+
+    try:
+        if not os.path.exists(fn) and not is_member(fn):
+            # verify_file treats anything that isn't a file as the contents
+            # of a pofile, so we have to check this here.
+            raise IOError(f'File "{fn}" does not exist.')
+
+        if strip_compressed_suffix(fn).endswith(".pot"):
+            linter = templatelinter
+
+        if lines is not None:
+            return linter.verify_lines(fn, *lines), None
+
+        if cache is not None:
+            key = cache.key(fn, linter)
+            results = cache.get(key)
+            if results is not None:
+                return results, None
+
+        results = linter.verify_file(fn)
+    except IOError as ioe:
+        return None, ioe
+
+    if cache is not None:
+        try:
+            cache.set(key, results)
+        except OSError:
+            # If we can't write to the cache, we just don't cache.
+            pass
+    return results, None
+
+
+# Linters for the worker processes when linting in parallel. These are built
+# once per worker by _init_lint_worker.
+_worker_linters = None
+
+
+def build_linters(
+    varformats, rules, entry_cache=None, msgid_analysis=None, catalog_cache=None
+):
+    """Builds the Linter and TemplateLinter for a lint run
+
+    :arg msgid_analysis: optional msgid analysis items from a
+        :py:class:`dennis.cache.PotIndex` to load into the linters
+    :arg catalog_cache: optional :py:class:`dennis.cache.CatalogCache`
+        for the linters to load parsed files from
+
+    """
+    linter = Linter(varformats, rules, entry_cache, catalog_cache=catalog_cache)
+    templatelinter = TemplateLinter(
+        varformats, rules, entry_cache, catalog_cache=catalog_cache
+    )
+    if msgid_analysis:
+        linter.load_msgid_analysis(msgid_analysis)
+        templatelinter.load_msgid_analysis(msgid_analysis)
+    return linter, templatelinter
+
+
+def _init_lint_worker(
+    varformats, rules, cache, entry_cache, msgid_analysis, catalog_cache, lines
+):
+    global _worker_linters
+    if entry_cache is not None:
+        # Entries linted here are sent back with each result
+        entry_cache.track_added = True
+    linter, templatelinter = build_linters(
+        varformats, rules, entry_cache, msgid_analysis, catalog_cache
+    )
+    _worker_linters = (linter, templatelinter, cache, entry_cache, lines)
+
+
+def _lint_worker(fn, text):
+    linter, templatelinter, cache, entry_cache, lines = _worker_linters
+    result = lint_file(linter, templatelinter, fn, cache, lines, text)
+
+    # Send back the entries this worker linted so they get saved.
+    added = entry_cache.pop_added() if entry_cache is not None else []
+    return result, added
+
+
+def iter_lint_results(
+    po_files,
+    varformats,
+    rules,
+    jobs,
+    cache=None,
+    entry_cache=None,
+    msgid_analysis=None,
+    catalog_cache=None,
+    lines=None,
+    stdin_text=None,
+):
+    """Lints files yielding ``(fn, (results, ioerror))`` in order
+
+    po_files can be any iterable, so files can be linted while they're
+    still being found.
+
+    If jobs is greater than 1, files are linted concurrently in a pool of
+    worker processes. Either way, results come back in the same order the
+    files were given in.
+
+    ``stdin_text`` is the contents of the file named :py:data:`STDIN_NAME`
+    in po_files if there is one.
+
+    """
+    po_files = iter(po_files)
+    first = list(itertools.islice(po_files, 2))
+    po_files = itertools.chain(first, po_files)
+
+    if jobs > 1 and len(first) > 1:
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_lint_worker,
+            initargs=(
+                varformats,
+                rules,
+                cache,
+                entry_cache,
+                msgid_analysis,
+                catalog_cache,
+                lines,
+            ),
+        ) as executor:
+            # Files are handed out as they're found with a few queued up
+            # for each worker, so workers don't wait for the next file
+            pending = deque()
+            for fn in po_files:
+                text = stdin_text if fn == STDIN_NAME else None
+                pending.append((fn, executor.submit(_lint_worker, fn, text)))
+                while len(pending) > jobs * 4 or (pending and pending[0][1].done()):
+                    yield _finish_lint(pending.popleft(), entry_cache)
+            while pending:
+                yield _finish_lint(pending.popleft(), entry_cache)
+        return
+
+    linter, templatelinter = build_linters(
+        varformats, rules, entry_cache, msgid_analysis, catalog_cache
+    )
+    for fn in po_files:
+        text = stdin_text if fn == STDIN_NAME else None
+        yield fn, lint_file(linter, templatelinter, fn, cache, lines, text)
+
+
+def _finish_lint(item, entry_cache):
+    fn, future = item
+    result, added = future.result()
+    if entry_cache is not None:
+        entry_cache.update(added)
+    return fn, result
+
+
+def iter_files(items, suffixes, exclude=(), gitignore=False):
+    """Yields items, walking the directories in them as it goes
+
+    :arg items: paths of files and directories
+    :arg suffixes: suffixes of files to find in directories
+    :arg exclude: ignore patterns for what to skip in directories
+    :arg gitignore: whether to skip what ``.gitignore`` files in
+        directories ignore
+
+    """
+    for item in items:
+        if item != STDIN_NAME and os.path.isdir(item):
+            yield from walk_files(item, suffixes, exclude, gitignore)
+        else:
+            yield item
+
+
 def click_run():
     sys.excepthook = exception_handler
     cli(obj={})
@@ -138,23 +396,141 @@ def cli():
         "Defaults to no rules excluded. See Available Lint Rules."
     ),
 )
-@click.option("--reporter", default="", help="Reporter to use for output.")
+@click.option(
+    "--reporter",
+    default="",
+    help=(
+        "Reporter to use for output: line, jsonl or sarif. "
+        "Defaults to human-readable output."
+    ),
+)
 @click.option("--errorsonly/--no-errorsonly", default=False, help="Only print errors.")
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of files to lint in parallel. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="DENNIS_CACHE_DIR",
+    default=None,
+    help=(
+        "Directory to cache lint results in. Files that haven't changed "
+        "since they were last linted aren't linted again. Can also be set "
+        "with DENNIS_CACHE_DIR."
+    ),
+)
+@click.option(
+    "--no-cache", is_flag=True, default=False, help="Don't use the lint cache."
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=100,
+    help="Maximum size of each of the lint caches in megabytes.",
+)
+@click.option(
+    "--pot",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help=(
+        "The .pot file the .po files were made from. Its msgids are "
+        "analyzed once and kept in an index file next to it for later runs."
+    ),
+)
+@click.option(
+    "--lines",
+    default=None,
+    metavar="A-B",
+    help=(
+        "Only lint entries with lines from line A to line B. An index of "
+        "where the entries are is kept next to each file so later runs only "
+        "read those lines."
+    ),
+)
+@click.option(
+    "--files-from",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default=None,
+    help=(
+        "Read paths to lint from this file, one per line, as well as from "
+        "the arguments. Use - to read them from stdin."
+    ),
+)
+@click.option(
+    "--null",
+    "-0",
+    is_flag=True,
+    default=False,
+    help="Paths in --files-from are separated by NUL characters, not lines.",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    metavar="PATTERN",
+    help=(
+        "Skip files and directories matching this .gitignore-style pattern "
+        "when going through directories. Can be given more than once."
+    ),
+)
+@click.option(
+    "--gitignore",
+    is_flag=True,
+    default=False,
+    help="Skip what .gitignore files ignore when going through directories.",
+)
 @click.argument("path", nargs=-1)
 @click.pass_context
 @epilog(
     format_formats() + "\n" + format_lint_rules() + "\n" + format_lint_template_rules()
 )
-def lint(ctx, quiet, varformat, rules, excluderules, reporter, errorsonly, path):
+def lint(
+    ctx,
+    quiet,
+    varformat,
+    rules,
+    excluderules,
+    reporter,
+    errorsonly,
+    jobs,
+    cache_dir,
+    no_cache,
+    cache_size,
+    pot,
+    lines,
+    files_from,
+    null,
+    exclude,
+    gitignore,
+    path,
+):
     """
     Lints .po/.pot files for issues
 
+    To lint a file from stdin, use "-".
+
+    Files compressed with gzip, xz or bzip2 (.po.gz, .po.xz, .po.bz2) are
+    decompressed as they're read. Compiled .mo files can be linted by
+    passing them explicitly.
+
+    Zip and tar archives are linted without extracting them. Files in
+    archives are shown like "bundle.zip!de/LC_MESSAGES/messages.po" and
+    can be linted by themselves by passing that.
+
     You can ignore rules on a string-by-string basis by adding an
     extracted comment "dennis-ignore: <comma-separated-rules>".  See
     documentation for details.
 
     """
-    if not quiet:
+    reporters = get_reporters()
+    if reporter not in reporters:
+        raise click.UsageError(f"invalid reporter: {reporter}.")
+
+    # Machine-readable output can't have anything else mixed in
+    if not quiet and not reporters[reporter].machine_readable:
         click.echo(f"dennis version {__version__}")
 
     # Make sure requested rules are valid
@@ -181,139 +557,137 @@ def lint(ctx, quiet, varformat, rules, excluderules, reporter, errorsonly, path)
         # Remove excluded rules
         rules = [rule for rule in rules if rule not in excludes]
 
-    # Build linters and lint
-    linter = Linter(varformat.split(","), rules)
-    templatelinter = TemplateLinter(varformat.split(","), rules)
-
-    po_files = []
-    for item in path:
-        if os.path.isdir(item):
-            for root, dirs, files in os.walk(item):
-                po_files.extend(
-                    [
-                        os.path.join(root, fn)
-                        for fn in files
-                        if fn.endswith((".po", ".pot"))
-                    ]
-                )
-        else:
-            po_files.append(item)
+    if lines is not None:
+        try:
+            first_line, last_line = (int(num) for num in lines.split("-"))
+        except ValueError:
+            first_line = last_line = 0
+        if first_line < 1 or last_line < first_line:
+            raise click.UsageError(f"invalid lines: {lines}. Use A-B like 4000-4200.")
+        lines = (first_line, last_line)
+
+    if null and files_from is None:
+        raise click.UsageError("--null only works with --files-from.")
+
+    path = list(path)
+    if files_from == "-":
+        path.extend(read_paths(sys.stdin.buffer, null))
+    elif files_from is not None:
+        try:
+            with open(files_from, "rb") as fp:
+                path.extend(read_paths(fp, null))
+        except IOError as ioe:
+            raise click.UsageError(
+                f'Problem opening file: "{click.format_filename(files_from)}": {ioe}'
+            )
 
-    po_files = [os.path.abspath(fn) for fn in po_files if fn.endswith((".po", ".pot"))]
+    stdin_text = None
+    if "-" in path:
+        if files_from == "-":
+            raise click.UsageError("can't read paths and a file from stdin.")
+        try:
+            stdin_text = decode_pofile(sys.stdin.buffer.read())
+        except IOError as ioe:
+            raise click.UsageError(f"Problem reading stdin: {ioe}")
 
-    if not po_files:
+    items = []
+    for item in path:
+        if item == "-":
+            items.append(STDIN_NAME)
+        elif os.path.isdir(item):
+            items.append(item)
+        elif is_archive(item):
+            items.extend(archive_members(item, LINT_SUFFIXES))
+        elif item.endswith(LINT_SUFFIXES + (".mo",)):
+            # .mo files are only linted when they're passed in explicitly
+            # since directories usually have the .po files they were built
+            # from, too
+            items.append(abspath(item))
+
+    # Directories are walked while the files found so far are linted
+    po_files = iter_files(items, LINT_SUFFIXES, exclude, gitignore)
+    first = next(po_files, None)
+    if first is None:
         raise click.UsageError("nothing to work on. Use --help for help.")
+    po_files = itertools.chain([first], po_files)
 
-    files_to_errors = {}
     total_error_count = 0
-    total_warning_count = 0
-    total_files_with_errors = 0
 
-    for fn in po_files:
-        formatted_fn = click.format_filename(fn)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    cache = None
+    entry_cache = None
+    catalog_cache = None
+    if cache_dir and not no_cache:
+        cache = LintCache(
+            os.path.join(cache_dir, "lint"), max_size=cache_size * 1024 * 1024
+        )
+        entry_cache = EntryCache()
+        entry_cache.load(os.path.join(cache_dir, "entries.pickle"))
+        catalog_cache = CatalogCache(
+            os.path.join(cache_dir, "catalogs"), max_size=cache_size * 1024 * 1024
+        )
+
+    msgid_analysis = None
+    if pot:
         try:
-            if not os.path.exists(fn):
-                raise click.UsageError(f'File "{formatted_fn}" does not exist.')
-
-            if fn.endswith(".po"):
-                results = linter.verify_file(fn)
-            else:
-                results = templatelinter.verify_file(fn)
+            msgid_analysis = PotIndex(pot).get_items(varformat.split(","))
         except IOError as ioe:
-            # This is not a valid .po file. So mark it as an error.
-            err(f">>> Problem opening file: {formatted_fn}")
-            err(repr(ioe))
-            click.echo("")
-
-            # FIXME - should we track this separately as an invalid
-            # file?
-            files_to_errors[fn] = (1, 0)
-            total_error_count += 1
-            continue
-
-        if errorsonly:
-            # Go through and nix all the non-error LintMessages
-            results = [res for res in results if res.kind == "err"]
-
-        # We don't want to print output for files that are fine, so we
-        # update the bookkeeping and move on.
-        if not results:
-            files_to_errors[fn] = (0, 0)
-            continue
+            raise click.UsageError(
+                f'Problem opening file: "{click.format_filename(pot)}": {ioe}'
+            )
 
-        if not quiet and not reporter:
-            click.secho(f">>> Working on: {formatted_fn}", fg="green", bold=True)
-
-        error_results = [res for res in results if res.kind == "err"]
-        warning_results = [res for res in results if res.kind == "warn"]
-
-        error_count = len(error_results)
-        total_error_count += error_count
-
-        warning_count = len(warning_results)
-        total_warning_count += warning_count
-
-        if not quiet:
-            for msg in error_results:
-                if reporter == "line":
-                    click.echo(f"{fn}: {msg.poentry.linenum}: 0: {msg.code}: {msg.msg}")
-                else:
-                    err(f"{msg.code}: {msg.msg}")
-                    click.echo(withlines(msg.poentry.linenum, msg.poentry.original))
-                    click.echo("")
-
-        if not quiet and not errorsonly:
-            for msg in warning_results:
-                if reporter == "line":
-                    click.echo(f"{fn}: {msg.poentry.linenum}: 0: {msg.code}: {msg.msg}")
-                else:
-                    click.secho(f"{msg.code}: {msg.msg}", fg="yellow", bold=True)
-                    click.echo(withlines(msg.poentry.linenum, msg.poentry.original))
-                    click.echo("")
-
-        files_to_errors[fn] = (error_count, warning_count)
-
-        if error_count > 0:
-            total_files_with_errors += 1
-
-        if not quiet and reporter != "line":
-            click.echo("Totals")
-            if not errorsonly:
-                click.echo(f"  Warnings: {warning_count:5}")
-            click.echo(f"  Errors:   {error_count:5}")
-            click.echo("")
+    rule_classes = {all_rules[rule] for rule in rules}
+    report = reporters[reporter](
+        OutputBuffer(), rule_classes, errorsonly=errorsonly, quiet=quiet
+    )
+    report.start()
+
+    # Lint files and print the results in the order the files were given
+    lint_results = iter_lint_results(
+        po_files,
+        varformat.split(","),
+        list(rules),
+        jobs,
+        cache,
+        entry_cache,
+        msgid_analysis,
+        catalog_cache,
+        lines,
+        stdin_text,
+    )
+    for fn, (results, ioe) in lint_results:
+        if fn != STDIN_NAME and not os.path.exists(fn) and not is_member(fn):
+            raise click.UsageError(
+                f'File "{click.format_filename(fn)}" does not exist.'
+            )
 
-    if len(po_files) > 1 and not quiet and reporter != "line":
-        click.echo("Final totals")
-        click.echo(f"  Number of files examined:          {len(po_files):5}")
-        click.echo(f"  Total number of files with errors: {total_files_with_errors:5}")
-        if not errorsonly:
-            click.echo(f"  Total number of warnings:          {total_warning_count:5}")
-        click.echo(f"  Total number of errors:            {total_error_count:5}")
-        click.echo("")
+        if ioe is not None:
+            # This is not a valid .po file. So mark it as an error.
+            report.file_error(fn, ioe)
+            total_error_count += 1
+        else:
+            if errorsonly:
+                # Go through and nix all the non-error LintMessages
+                results = [res for res in results if res.kind == "err"]
 
-        file_counts = [
-            (counts[0], counts[1], fn.split(os.sep)[-3], fn.split(os.sep)[-1])
-            for (fn, counts) in files_to_errors.items()
-        ]
+            report.file_results(fn, results)
+            total_error_count += len([res for res in results if res.kind == "err"])
 
-        file_counts = list(reversed(sorted(file_counts)))
-        printed_header = False
-        for error_count, warning_count, locale, fn in file_counts:
-            if not error_count and not warning_count:
-                continue
+        # Write out everything for this file in one go
+        report.out.flush()
 
-            if not printed_header:
-                if errorsonly:
-                    click.echo("Errors  Filename")
-                else:
-                    click.echo("Warnings  Errors  Filename")
-                printed_header = True
+    report.finish()
+    report.out.flush()
 
-            if errorsonly:
-                click.echo(f" {error_count:5}  {locale} ({fn})")
-            else:
-                click.echo(f"   {warning_count:5}   {error_count:5}  {locale} ({fn})")
+    if cache is not None:
+        cache.evict()
+        catalog_cache.evict()
+        try:
+            entry_cache.save(os.path.join(cache_dir, "entries.pickle"))
+        except OSError:
+            pass
 
     # Return 0 if everything was fine or 1 if there were errors.
     ctx.exit(code=1 if total_error_count else 0)
@@ -324,31 +698,88 @@ def lint(ctx, quiet, varformat, rules, excluderules, reporter, errorsonly, path)
     "--showuntranslated", is_flag=True, default=False, help="Show untranslated strings"
 )
 @click.option("--showfuzzy", is_flag=True, default=False, help="Show fuzzy strings")
-@click.argument("path", nargs=-1, type=click.Path(exists=True))
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="DENNIS_CACHE_DIR",
+    default=None,
+    help=(
+        "Directory to cache parsed files in. Files that haven't changed "
+        "since they were last parsed aren't parsed again. Can also be set "
+        "with DENNIS_CACHE_DIR."
+    ),
+)
+@click.option(
+    "--no-cache", is_flag=True, default=False, help="Don't use the parsed file cache."
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=1),
+    default=100,
+    help="Maximum size of the parsed file cache in megabytes.",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    metavar="PATTERN",
+    help=(
+        "Skip files and directories matching this .gitignore-style pattern "
+        "when going through directories. Can be given more than once."
+    ),
+)
+@click.option(
+    "--gitignore",
+    is_flag=True,
+    default=False,
+    help="Skip what .gitignore files ignore when going through directories.",
+)
+@click.argument("path", nargs=-1)
 @click.pass_context
-def status(ctx, showuntranslated, showfuzzy, path):
-    """Show status of a .po file."""
+def status(
+    ctx,
+    showuntranslated,
+    showfuzzy,
+    cache_dir,
+    no_cache,
+    cache_size,
+    exclude,
+    gitignore,
+    path,
+):
+    """Show status of a .po file.
+
+    Zip and tar archives are read without extracting them.
+
+    """
     click.echo(f"dennis version {__version__}")
 
-    po_files = []
+    catalog_cache = None
+    if cache_dir and not no_cache:
+        catalog_cache = CatalogCache(
+            os.path.join(cache_dir, "catalogs"), max_size=cache_size * 1024 * 1024
+        )
+
+    items = []
     for item in path:
         if os.path.isdir(item):
-            for root, dirs, files in os.walk(item):
-                po_files.extend(
-                    [os.path.join(root, fn) for fn in files if fn.endswith(".po")]
-                )
+            items.append(item)
+        elif is_archive(item):
+            items.extend(archive_members(item, (".po",)))
+        elif os.path.exists(item) or is_member(item):
+            if item.endswith(".po"):
+                items.append(abspath(item))
         else:
-            po_files.append(item)
-
-    po_files = [os.path.abspath(fn) for fn in po_files if fn.endswith(".po")]
+            raise click.UsageError(
+                f'File "{click.format_filename(item)}" does not exist.'
+            )
 
-    for fn in po_files:
+    for fn in iter_files(items, (".po",), exclude, gitignore):
         formatted_fn = click.format_filename(fn)
         try:
-            if not os.path.exists(fn):
+            if not os.path.exists(fn) and not is_member(fn):
                 raise IOError(f'File "{formatted_fn}" does not exist.')
 
-            pofile = parse_pofile(fn)
+            pofile = parse_pofile(fn, catalog_cache)
         except IOError as ioe:
             err(f">>> Problem opening file: {formatted_fn}")
             err(repr(ioe))
@@ -412,6 +843,9 @@ def status(ctx, showuntranslated, showfuzzy, path):
         else:
             click.echo(f"  Percentage:                {pofile.percent_translated()}%")
 
+    if catalog_cache is not None:
+        catalog_cache.evict()
+
     ctx.exit(0)
 
 
@@ -434,10 +868,19 @@ def status(ctx, showuntranslated, showfuzzy, path):
     is_flag=True,
     help="Command line args are strings to be translated",
 )
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=0),
+    default=100000,
+    help=(
+        "Maximum number of translated strings to keep, so strings that "
+        "are the same are only translated once. 0 turns it off."
+    ),
+)
 @click.argument("path", nargs=-1)
 @click.pass_context
 @epilog(format_formats() + "\n" + format_pipeline_parts())
-def translate(ctx, varformat, pipeline, strings, path):
+def translate(ctx, varformat, pipeline, strings, cache_size, path):
     """
     Translate a single string or .po file of strings.
 
@@ -455,14 +898,17 @@ def translate(ctx, varformat, pipeline, strings, path):
         raise click.UsageError("nothing to work on. Use --help for help.")
 
     try:
-        translator = Translator(varformat.split(","), pipeline.split(","))
+        translator = Translator(
+            varformat.split(","),
+            pipeline.split(","),
+            cache=LRUCache(maxsize=cache_size) if cache_size else None,
+        )
     except InvalidPipeline as ipe:
         raise click.UsageError(ipe.args[0])
 
     if strings:
         # Args are strings to be translated
-        for arg in path:
-            data = translator.translate_string(arg)
+        for data in translator.translate_strings(path):
             click.echo(data)
 
     elif path[0] == "-":
@@ -482,6 +928,13 @@ def translate(ctx, varformat, pipeline, strings, path):
         for arg in path:
             click.echo(translator.translate_file(arg))
 
+        if translator.cache is not None:
+            click.echo(
+                "Translation cache: {} hits, {} misses.".format(
+                    translator.cache.hits, translator.cache.misses
+                )
+            )
+
     ctx.exit(0)
 
 
@@ -0,0 +1,224 @@
+"""Finding catalogs in directory trees
+
+Directories are walked with :py:func:`os.scandir`, so files are only
+looked at by name and directories that are ignored aren't walked at
+all. Patterns for what to ignore use the syntax of ``.gitignore`` files.
+
+"""
+
+import os
+import re
+
+GITIGNORE = ".gitignore"
+
+
+def translate_glob(glob):
+    """Translates a glob in an ignore pattern into a regular expression
+
+    ``*`` and ``?`` don't match ``/``. ``**`` between slashes matches
+    any number of directories.
+
+    """
+    parts = []
+    i = 0
+    length = len(glob)
+    while i < length:
+        char = glob[i]
+        i += 1
+        if char == "*":
+            start = i - 1
+            while i < length and glob[i] == "*":
+                i += 1
+            whole = (start == 0 or glob[start - 1] == "/") and (
+                i == length or glob[i] == "/"
+            )
+            if i - start == 2 and whole:
+                if i == length:
+                    parts.append(".*")
+                else:
+                    # "**/" matches zero or more directories
+                    parts.append("(?:.*/)?")
+                    i += 1
+            else:
+                parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = i
+            if end < length and glob[end] in "!^":
+                end += 1
+            if end < length and glob[end] == "]":
+                end += 1
+            end = glob.find("]", end)
+            if end == -1:
+                parts.append(re.escape(char))
+                continue
+            chars = glob[i:end].replace("\\", "\\\\")
+            if chars[0] in "!^":
+                chars = "^" + chars[1:]
+            parts.append(f"[{chars}]")
+            i = end + 1
+        elif char == "\\" and i < length:
+            parts.append(re.escape(glob[i]))
+            i += 1
+        else:
+            parts.append(re.escape(char))
+    return "".join(parts)
+
+
+class IgnorePattern:
+    """A pattern for files and directories to ignore
+
+    Patterns work like lines in a ``.gitignore`` file:
+
+    * a leading ``!`` makes a pattern un-ignore what it matches
+    * a trailing ``/`` makes a pattern only match directories
+    * a pattern with a ``/`` anywhere else matches paths relative to
+      the directory it applies to; otherwise it matches names at any
+      depth
+
+    :arg pattern: the pattern
+
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        elif pattern.startswith(("\\!", "\\#")):
+            pattern = pattern[1:]
+
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        regex = translate_glob(pattern.lstrip("/"))
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+        self.regex = re.compile(regex, re.DOTALL)
+
+    def __repr__(self):
+        return f"<IgnorePattern {self.pattern!r}>"
+
+    def matches(self, path, is_dir):
+        """Returns whether the pattern matches path
+
+        :arg path: path relative to the directory the pattern applies to
+            with ``/`` between parts
+        :arg is_dir: whether path is a directory
+
+        """
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.fullmatch(path) is not None
+
+
+def parse_ignore_lines(lines):
+    """Returns the IgnorePatterns for lines of a ``.gitignore`` file
+
+    Blank lines and comments are skipped.
+
+    """
+    patterns = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.endswith("\\ "):
+            line = line.rstrip(" ")
+        if not line or line.startswith("#") or line.strip("/") == "":
+            continue
+        patterns.append(IgnorePattern(line))
+    return patterns
+
+
+def read_ignore_file(fn):
+    """Returns the IgnorePatterns in a ``.gitignore`` file
+
+    Files that can't be read have no patterns.
+
+    """
+    try:
+        with open(fn, encoding="utf-8", errors="replace") as fp:
+            return parse_ignore_lines(fp)
+    except OSError:
+        return []
+
+
+class IgnoreRules:
+    """IgnorePatterns for a directory and the directories it's in
+
+    Each set of patterns applies to the paths under the directory it was
+    added for. Like in git, the last pattern that matches a path decides
+    whether it's ignored.
+
+    :arg rules: sequence of ``(base, patterns)`` where base is the
+        directory the patterns apply to relative to the top of the walk
+
+    """
+
+    def __init__(self, rules=()):
+        self.rules = tuple((base, patterns) for base, patterns in rules if patterns)
+
+    def add(self, base, patterns):
+        """Returns new IgnoreRules with patterns that apply under base"""
+        if not patterns:
+            return self
+        return IgnoreRules(self.rules + ((base, patterns),))
+
+    def is_ignored(self, path, is_dir):
+        """Returns whether path relative to the top of the walk is ignored"""
+        ignored = False
+        for base, patterns in self.rules:
+            rel = path[len(base) + 1 :] if base else path
+            for pattern in patterns:
+                # Only patterns that would change the answer matter
+                if pattern.negate == ignored and pattern.matches(rel, is_dir):
+                    ignored = not ignored
+        return ignored
+
+
+def walk_files(top, suffixes, exclude=(), gitignore=False):
+    """Yields absolute paths of files under top that end in suffixes
+
+    Files are yielded as they're found. Like :py:func:`os.walk`, the
+    files in a directory come before the files in its subdirectories
+    and symlinks to directories aren't followed.
+
+    :arg top: the directory to walk
+    :arg suffixes: tuple of suffixes of the files to yield
+    :arg exclude: ignore patterns for files and directories to skip;
+        see :py:class:`IgnorePattern`
+    :arg gitignore: whether to also skip what ``.gitignore`` files in
+        the walked directories ignore
+
+    """
+    top = os.path.abspath(top)
+    rules = IgnoreRules([("", [IgnorePattern(pattern) for pattern in exclude])])
+    stack = [(top, "", rules)]
+    while stack:
+        path, rel, rules = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        if gitignore and any(entry.name == GITIGNORE for entry in entries):
+            rules = rules.add(rel, read_ignore_file(os.path.join(path, GITIGNORE)))
+
+        subdirs = []
+        for entry in entries:
+            entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                if not entry.is_symlink() and not rules.is_ignored(entry_rel, True):
+                    subdirs.append((entry.path, entry_rel, rules))
+            elif entry.name.endswith(suffixes) and not rules.is_ignored(
+                entry_rel, False
+            ):
+                yield entry.path
+
+        stack.extend(reversed(subdirs))
@@ -1,9 +1,12 @@
 import re
-import uuid
 from collections import namedtuple
+from functools import cached_property
 from itertools import zip_longest
 
+from dennis.moreader import is_mofile, iter_mofile, read_mofile
+from dennis.poreader import can_read_span, iter_pofile, iter_pofile_lines
 from dennis.tools import (
+    LRUCache,
     VariableTokenizer,
     all_subclasses,
     parse_dennis_note,
@@ -41,11 +44,36 @@ class LintMessage:
 
 
 class LintedEntry:
-    def __init__(self, poentry):
+    """Analysis of a POEntry shared by all the lint rules
+
+    Things derived from the entry like the strings to lint and the
+    variable and html tokens in them are computed the first time a rule
+    asks for them and then reused, so each string is tokenized once no
+    matter how many rules are enabled. Rules must not modify the
+    returned values.
+
+    """
+
+    def __init__(self, poentry, scanner=None, msgid_analysis=None):
+        """
+        :arg poentry: the POEntry to lint
+        :arg scanner: optional :py:class:`TriggerScanner` for finding
+            which strings rules and variable formats can skip
+        :arg msgid_analysis: optional :py:class:`dennis.tools.LRUCache`
+            shared between entries for the analysis of msgid strings;
+            every locale has the same msgids, so they're only analyzed
+            once. It must only be used with one variable tokenizer.
+
+        """
         self.poentry = poentry
         self.msgid = poentry.msgid
+        self.scanner = scanner
+        self.msgid_analysis = msgid_analysis
+        self._tokens = {}
+        self._html_tokens = {}
+        self._triggers = {}
 
-    @property
+    @cached_property
     def str(self):
         poentry = self.poentry
         if poentry.msgid_plural:
@@ -57,7 +85,7 @@ class LintedEntry:
 
         return IdString(msgid_fields, msgid_strings)
 
-    @property
+    @cached_property
     def strs(self):
         poentry = self.poentry
         strs = []
@@ -84,12 +112,198 @@ class LintedEntry:
         # List of TranslatedStrings
         return strs
 
+    @cached_property
+    def _msgid_texts(self):
+        msgid_strings = self.str.msgid_strings
+        return set(msgid_strings) | {" ".join(msgid_strings)}
+
+    def _shared(self, text):
+        """Returns the msgid analysis table if text is a msgid string"""
+        if self.msgid_analysis is not None and text in self._msgid_texts:
+            return self.msgid_analysis
+        return None
+
+    def may_contain(self, text, triggers):
+        """Returns whether text might contain any of the trigger characters
+
+        The first call for a text scans it once for all the characters
+        the scanner knows about. Without a scanner or for characters the
+        scanner doesn't look for, this always returns True.
+
+        """
+        if not triggers or self.scanner is None:
+            return True
+        if not self.scanner.covers(triggers):
+            return True
+        try:
+            found = self._triggers[text]
+        except KeyError:
+            found = self.scanner.scan(text)
+            self._triggers[text] = found
+        return not found.isdisjoint(triggers)
+
+    def msgstrs_may_contain(self, triggers):
+        """Returns whether any msgstr might contain the trigger characters"""
+        return any(
+            trstr.msgstr_string and self.may_contain(trstr.msgstr_string, triggers)
+            for trstr in self.strs
+        )
+
+    def extract_tokens(self, vartok, text, unique=True):
+        """Returns the variable tokens in text
+
+        This is ``vartok.extract_tokens(text, unique)``, but it's only
+        computed once for each text.
+
+        """
+        key = (vartok, text, unique)
+        try:
+            return self._tokens[key]
+        except KeyError:
+            pass
+
+        shared = self._shared(text)
+        shared_key = ("tokens", text, unique)
+        tokens = shared.get(shared_key) if shared is not None else None
+        if tokens is None:
+            if vartok.triggers and not self.may_contain(text, vartok.triggers):
+                tokens = set() if unique else []
+            else:
+                tokens = vartok.extract_tokens(text, unique=unique)
+            if shared is not None:
+                shared.set(shared_key, tokens)
+        self._tokens[key] = tokens
+        return tokens
+
+    def variable_names(self, vartok, text, unique=True):
+        """Returns the names of the variables in text
+
+        The names are in the same order as the tokens from
+        :py:meth:`extract_tokens`. Variables without a name like ``%s``
+        have the name ``""``.
+
+        """
+        key = ("names", vartok, text, unique)
+        try:
+            return self._tokens[key]
+        except KeyError:
+            pass
+
+        shared = self._shared(text)
+        shared_key = ("names", text, unique)
+        names = shared.get(shared_key) if shared is not None else None
+        if names is None:
+            names = [
+                vartok.extract_variable_name(token)
+                for token in self.extract_tokens(vartok, text, unique=unique)
+            ]
+            if shared is not None:
+                shared.set(shared_key, names)
+        self._tokens[key] = names
+        return names
+
+    @cached_property
+    def _html(self):
+        from dennis.translator import HTMLExtractorTransform
+
+        return HTMLExtractorTransform()
+
+    def _parse_html(self, vartok, text):
+        from dennis.translator import Token
+
+        # Each string is parsed by itself, so nothing left over from
+        # the last string can change the tags found in this one
+        html = self._html
+        html.reset()
+        try:
+            if "<" not in text:
+                return []
+            tokens = [
+                token
+                for token in html.transform(vartok, [Token(text)])
+                if token.type == "html" and not token.s.startswith("&")
+            ]
+            tokens.sort(key=lambda token: token.s)
+            return tokens
+        except HTMLParseError as exc:
+            return exc
+
+    def html_tokens(self, vartok, text):
+        """Returns the html tags in text sorted by their text
+
+        Entities like ``&amp;`` aren't included.
+
+        :raises HTMLParseError: If it's invalid HTML.
+
+        """
+        key = (vartok, text)
+        try:
+            tokens = self._html_tokens[key]
+        except KeyError:
+            shared = self._shared(text)
+            tokens = shared.get(("html", text)) if shared is not None else None
+            if tokens is None:
+                tokens = self._parse_html(vartok, text)
+                if shared is not None:
+                    shared.set(("html", text), tokens)
+            self._html_tokens[key] = tokens
+
+        if isinstance(tokens, HTMLParseError):
+            raise tokens
+        return tokens
+
+
+class TriggerScanner:
+    """Finds which trigger characters are in a string in a single scan
+
+    Lint rules and variable formats have ``triggers``: characters that
+    have to be in a string for the rule to find anything or for the
+    string to have variables. The linter builds one scanner for all of
+    them and each string is scanned once, so rules can skip strings
+    without running their own regular expressions.
+
+    :arg triggers: iterable of trigger strings
+
+    """
+
+    def __init__(self, triggers):
+        self.chars = frozenset("".join(triggers))
+        self.scanner_re = re.compile(
+            "[" + "".join(re.escape(char) for char in sorted(self.chars)) + "]"
+        )
+
+    def covers(self, triggers):
+        """Does this scanner look for all the characters in triggers?"""
+        return self.chars.issuperset(triggers)
+
+    def scan(self, text):
+        """Returns the set of trigger characters in text"""
+        return frozenset(self.scanner_re.findall(text))
+
+
+def build_scanner(vartok, rules):
+    """Builds a TriggerScanner for the variable formats and lint rules
+
+    :returns: TriggerScanner or None if there's nothing to scan for
+
+    """
+    triggers = [rule.triggers for rule in rules if getattr(rule, "triggers", "")]
+    if vartok.triggers:
+        triggers.append(vartok.triggers)
+    if not triggers:
+        return None
+    return TriggerScanner(triggers)
+
 
 class LintRule:
     num = ""
     name = ""
     desc = ""
 
+    # Characters that have to be in a msgstr for this rule to find
+    # problems with it. Empty means the rule looks at every msgstr.
+    triggers = ""
+
     def lint(self, vartok, linted_entry):
         """Takes a linted entry and generates LintMessages
 
@@ -106,6 +320,15 @@ class MalformedNoTypeLintRule(LintRule):
     num = "E101"
     name = "notype"
     desc = "%(count) with no type at the end"
+    triggers = "%"
+
+    malformed_re = re.compile(
+        r"(?:"
+        r"%"  # %
+        r"[\(][^\)\s]+[\)]"  # things in parens or not
+        r"(?:(?=[^diouxefGgcrs])|$)"  # end of string or something that's not a format char
+        r")"
+    )
 
     def lint(self, vartok, linted_entry):
         msgs = []
@@ -114,19 +337,13 @@ class MalformedNoTypeLintRule(LintRule):
         if not vartok.contains("python-format"):
             return msgs
 
-        malformed_re = re.compile(
-            r"(?:"
-            r"%"  # %
-            r"[\(][^\)\s]+[\)]"  # things in parens or not
-            r"(?:(?=[^diouxefGgcrs])|$)"  # end of string or something that's not a format char
-            r")"
-        )
-
         for trstr in linted_entry.strs:
-            if not trstr.msgstr_string:
+            if not trstr.msgstr_string or not linted_entry.may_contain(
+                trstr.msgstr_string, self.triggers
+            ):
                 continue
 
-            malformed = malformed_re.findall(trstr.msgstr_string)
+            malformed = self.malformed_re.findall(trstr.msgstr_string)
             if not malformed:
                 continue
 
@@ -149,6 +366,18 @@ class MalformedMissingRightBraceLintRule(LintRule):
     num = "E102"
     name = "missingrightbrace"
     desc = "{foo with missing }"
+    triggers = "{"
+
+    # Matches "{" followed by things that aren't "}" up to the next "{" or the
+    # end of the string. "{{" and "}}" are escaped braces and aren't
+    # variables, so the matcher consumes them as pairs and they don't count
+    # as "{" or "}". Matches of escaped braces have no group.
+    malformed_re = re.compile(
+        r"(\{(?!\{)"  # { that's not {{
+        r"(?:\{\{|\}\}|[^{}]|\{(?!\{))+"  # anything but }
+        r"(?:\{(?!\{)|$))"  # { or end of string
+        r"|\{\{|\}\}"  # escaped braces
+    )
 
     def lint(self, vartok, linted_entry):
         msgs = []
@@ -157,26 +386,20 @@ class MalformedMissingRightBraceLintRule(LintRule):
         if not vartok.contains("python-brace-format"):
             return []
 
-        malformed_re = re.compile(r"(?:\{[^\}]+(?:\{|$))")
-        double_open = str(uuid.uuid4())
-        double_close = str(uuid.uuid4())
-
         for trstr in linted_entry.strs:
-            if not trstr.msgstr_string:
+            if not trstr.msgstr_string or not linted_entry.may_contain(
+                trstr.msgstr_string, self.triggers
+            ):
                 continue
 
-            malformed = malformed_re.findall(
-                trstr.msgstr_string.replace("{{", double_open).replace(
-                    "}}", double_close
-                )
-            )
+            malformed = [
+                item.strip()
+                for item in self.malformed_re.findall(trstr.msgstr_string)
+                if item
+            ]
             if not malformed:
                 continue
 
-            malformed = [
-                item.strip().replace(double_open, "{{").replace(double_close, "}}")
-                for item in malformed
-            ]
             msgs.append(
                 LintMessage(
                     ERROR,
@@ -195,6 +418,18 @@ class MalformedMissingLeftBraceLintRule(LintRule):
     num = "E103"
     name = "missingleftbrace"
     desc = "foo} with missing {"
+    triggers = "}"
+
+    # Matches the start of the string or "}" followed by things that aren't "{"
+    # up to a "}". "{{" and "}}" are escaped braces and aren't variables, so
+    # the matcher consumes them as pairs and they don't count as "{" or "}".
+    # Matches of escaped braces have no group.
+    malformed_re = re.compile(
+        r"((?:^|\}(?!\}))"  # start of string or } that's not }}
+        r"(?:\{\{|\}\}|[^{}]|\}(?!\}))*"  # anything but {
+        r"\}(?!\}))"  # }
+        r"|\{\{|\}\}"  # escaped braces
+    )
 
     def lint(self, vartok, linted_entry):
         msgs = []
@@ -203,26 +438,20 @@ class MalformedMissingLeftBraceLintRule(LintRule):
         if not vartok.contains("python-brace-format"):
             return []
 
-        malformed_re = re.compile(r"(?:(?:^|\})[^\{]*\})")
-        double_open = str(uuid.uuid4())
-        double_close = str(uuid.uuid4())
-
         for trstr in linted_entry.strs:
-            if not trstr.msgstr_string:
+            if not trstr.msgstr_string or not linted_entry.may_contain(
+                trstr.msgstr_string, self.triggers
+            ):
                 continue
 
-            malformed = malformed_re.findall(
-                trstr.msgstr_string.replace("{{", double_open).replace(
-                    "}}", double_close
-                )
-            )
+            malformed = [
+                item.strip()
+                for item in self.malformed_re.findall(trstr.msgstr_string)
+                if item
+            ]
             if not malformed:
                 continue
 
-            malformed = [
-                item.strip().replace(double_open, "{{").replace(double_close, "}}")
-                for item in malformed
-            ]
             msgs.append(
                 LintMessage(
                     ERROR,
@@ -240,6 +469,9 @@ class BadFormatLintRule(LintRule):
     num = "E104"
     name = "badformat"
     desc = "% followed by a bad format character"
+    triggers = "%"
+
+    splitter = re.compile(r"(\%(?:.|$))")
 
     def lint(self, vartok, linted_entry):
         msgs = []
@@ -248,13 +480,15 @@ class BadFormatLintRule(LintRule):
         if not vartok.contains("python-format"):
             return []
 
-        splitter = re.compile(r"(\%(?:.|$))")
-
         for trstr in linted_entry.strs:
-            if not trstr.msgstr_string:
+            if not trstr.msgstr_string or not linted_entry.may_contain(
+                trstr.msgstr_string, self.triggers
+            ):
                 continue
 
-            msgid_tokens = list(vartok.extract_tokens(" ".join(trstr.msgid_strings)))
+            msgid_tokens = list(
+                linted_entry.extract_tokens(vartok, " ".join(trstr.msgid_strings))
+            )
             if not msgid_tokens:
                 continue
             # FIXME: Pretty sure we can just check the first token because they'll
@@ -263,7 +497,7 @@ class BadFormatLintRule(LintRule):
             if not (len(first_token) == 2 and first_token[0] == "%"):
                 continue
 
-            for match in splitter.findall(trstr.msgstr_string):
+            for match in self.splitter.findall(trstr.msgstr_string):
                 if len(match) == 1 or match[1] not in "(diouxefGgcrs%":
                     msgs.append(
                         LintMessage(
@@ -302,8 +536,10 @@ class MissingVarsLintRule(LintRule):
                 # ignore.
                 continue
 
-            msgid_tokens = vartok.extract_tokens(" ".join(trstr.msgid_strings))
-            msgstr_tokens = vartok.extract_tokens(trstr.msgstr_string)
+            msgid_tokens = linted_entry.extract_tokens(
+                vartok, " ".join(trstr.msgid_strings)
+            )
+            msgstr_tokens = linted_entry.extract_tokens(vartok, trstr.msgstr_string)
 
             missing = msgid_tokens.difference(msgstr_tokens)
 
@@ -401,25 +637,11 @@ class MismatchedHTMLLintRule(LintRule):
     def lint(self, vartok, linted_entry):
         msgs = []
 
-        from dennis.translator import HTMLExtractorTransform, Token
-
-        html = HTMLExtractorTransform()
-
         def equiv(left, right):
             return left == right
 
         def tokenize(text):
-            """Tokenizes the text using the HTMLExtractorTransform
-
-            :raises HTMLParseError: If it's invalid HTML.
-
-            """
-            tokens = [
-                token
-                for token in html.transform(vartok, [Token(text)])
-                if token.type == "html" and not token.s.startswith("&")
-            ]
-            return sorted(tokens, key=lambda token: token.s)
+            return linted_entry.html_tokens(vartok, text)
 
         for trstr in linted_entry.strs:
             if not trstr.msgstr_string:
@@ -521,13 +743,15 @@ class InvalidVarsLintRule(LintRule):
             if not trstr.msgstr_string:
                 continue
 
-            msgid_tokens = vartok.extract_tokens(" ".join(trstr.msgid_strings))
+            msgid_tokens = linted_entry.extract_tokens(
+                vartok, " ".join(trstr.msgid_strings)
+            )
             # If this is python-format or python-brace-format and there are
             # no tokens in the msgid, then "no tokens, no problem".
             if not msgid_tokens:
                 continue
 
-            msgstr_tokens = vartok.extract_tokens(trstr.msgstr_string)
+            msgstr_tokens = linted_entry.extract_tokens(vartok, trstr.msgstr_string)
 
             invalid = msgstr_tokens.difference(msgid_tokens)
 
@@ -563,17 +787,104 @@ def convert_rules(rules_spec):
     return rules
 
 
-class Linter:
-    def __init__(self, vars_, rules_spec):
+class BaseLinter:
+    """Lints the entries of catalogs with a set of lint rules
+
+    :py:class:`Linter` and :py:class:`dennis.templatelinter.TemplateLinter`
+    differ in which rules they use and which entries they lint.
+
+    """
+
+    def __init__(
+        self,
+        vars_,
+        rules_spec,
+        entry_cache=None,
+        msgid_analysis_size=100000,
+        catalog_cache=None,
+    ):
+        """
+        :arg vars_: list of variable formats
+        :arg rules_spec: list of lint rule codes or names to use
+        :arg entry_cache: optional cache for lint results of entries
+            like a :py:class:`dennis.cache.EntryCache`; entries with the
+            same strings and dennis-ignore note are only linted once
+        :arg msgid_analysis_size: the maximum number of analyzed msgid
+            strings to keep around for linting other files with the
+            same msgids; 0 turns it off
+        :arg catalog_cache: optional :py:class:`dennis.cache.CatalogCache`
+            that :py:meth:`verify_file` loads files that haven't changed
+            from instead of parsing them
+
+        """
         self.vartok = VariableTokenizer(vars_)
         self.rules_spec = rules_spec
-        self.rules = convert_rules(self.rules_spec)
+        self.rules = self.convert_rules(self.rules_spec)
+        self.entry_cache = entry_cache
+        self.catalog_cache = catalog_cache
+        self.scanner = build_scanner(self.vartok, self.rules)
+        if msgid_analysis_size:
+            self.msgid_analysis = LRUCache(maxsize=msgid_analysis_size)
+        else:
+            self.msgid_analysis = None
+        self.cache_config = (
+            self.__class__.__name__,
+            tuple(fmt.name for fmt in self.vartok.formats),
+            tuple(sorted(rule.num for rule in self.rules)),
+        )
 
-    def lint_poentry(self, poentry):
-        linted_entry = LintedEntry(poentry)
+    def load_msgid_analysis(self, items):
+        """Adds ``(key, value)`` pairs to the msgid analysis table
+
+        This lets you use analysis computed ahead of time like a
+        :py:class:`dennis.cache.PotIndex`. The table grows to hold the
+        loaded items on top of ``msgid_analysis_size`` analyzed strings,
+        so none of them are evicted before they're used.
 
+        """
+        if self.msgid_analysis is None:
+            return
+        table = self.msgid_analysis
+        for key, value in items:
+            if key not in table:
+                table.maxsize += 1
+            table.set(key, value)
+
+    def convert_rules(self, rules_spec):
+        """Returns the lint rules for the codes and names in rules_spec"""
+        raise NotImplementedError
+
+    def should_lint(self, poentry):
+        """Returns whether poentry should be linted"""
+        return True
+
+    def entry_cache_key(self, poentry, skip):
+        if poentry.msgid_plural:
+            msgstrs = tuple(sorted(poentry.msgstr_plural.items()))
+        else:
+            msgstrs = poentry.msgstr
+        return (
+            self.cache_config,
+            poentry.msgid,
+            poentry.msgid_plural,
+            msgstrs,
+            tuple(skip),
+        )
+
+    def lint_poentry(self, poentry):
         skip = parse_dennis_note(poentry.comment)
 
+        if self.entry_cache is not None:
+            key = self.entry_cache_key(poentry, skip)
+            cached = self.entry_cache.get(key)
+            if cached is not None:
+                return [
+                    LintMessage(kind, poentry.linenum, col, code, msg, poentry)
+                    for kind, col, code, msg in cached
+                ]
+
+        linted_entry = LintedEntry(poentry, self.scanner, self.msgid_analysis)
+
         msgs = []
 
         # Check the comment to see if what we should ignore.
@@ -581,24 +892,124 @@ class Linter:
             if skip == "*" or lint_rule.num in skip:
                 continue
 
+            # Skip rules that can't find anything in these msgstrs
+            triggers = getattr(lint_rule, "triggers", "")
+            if triggers and not linted_entry.msgstrs_may_contain(triggers):
+                continue
+
             msgs.extend(lint_rule.lint(self.vartok, linted_entry))
 
+        if self.entry_cache is not None:
+            self.entry_cache.set(
+                key, [(msg.kind, msg.col, msg.code, msg.msg) for msg in msgs]
+            )
+
         return msgs
 
     def verify_file(self, filename_or_string):
         """Verifies strings in file.
 
+        Files ending in ``.mo`` are read as compiled .mo files. Their
+        LintMessages have the index of the entry in the .mo file as the
+        line number.
+
         :arg filename_or_string: filename to verify or the contents of
             a pofile as a string
 
         :returns: list of LintMessage objects
 
-        :raises IOError: if the file is not a valid .po file or
+        :raises IOError: if the file is not a valid .po or .mo file or
             doesn't exist
         """
-        po = parse_pofile(filename_or_string)
-        msgs = []
-        for entry in po.translated_entries():
-            msgs.extend(self.lint_poentry(entry))
+        if is_mofile(filename_or_string):
+            po = read_mofile(filename_or_string)
+        else:
+            po = parse_pofile(filename_or_string, self.catalog_cache)
+        return list(self.lint_entries(po))
 
-        return msgs
+    def lint_entries(self, entries):
+        """Lints entries yielding LintMessages as it goes
+
+        Only entries :py:meth:`should_lint` says yes to are linted.
+        Nothing holds on to entries after they're linted except the
+        LintMessages for them.
+
+        :arg entries: iterable of POEntry objects
+
+        :returns: generator of LintMessage objects
+
+        """
+        should_lint = self.should_lint
+        for entry in entries:
+            if should_lint(entry):
+                yield from self.lint_poentry(entry)
+
+    def iter_verify_file(self, filename_or_string):
+        """Verifies strings in file yielding LintMessages as it goes
+
+        Unlike :py:meth:`verify_file`, this parses the file as it lints
+        it, so only one entry is in memory at a time.
+
+        :arg filename_or_string: filename to verify or the contents of
+            a pofile as a string
+
+        :returns: generator of LintMessage objects
+
+        :raises IOError: if the file is not a valid .po or .mo file or
+            doesn't exist; LintMessages for some of the entries before
+            the problem may have been yielded already
+        """
+        if is_mofile(filename_or_string):
+            return self.lint_entries(iter_mofile(filename_or_string))
+        return self.lint_entries(iter_pofile(filename_or_string))
+
+    def verify_lines(self, filename, first_line, last_line, index=None):
+        """Verifies the entries with lines between two lines of a file
+
+        Only the part of the file those entries are in is read. This
+        uses a :py:class:`dennis.cache.EntryIndex` of where the entries
+        are in the file. Compressed files and members of archives are
+        read up to last_line. For .mo files, the line numbers are entry
+        indexes.
+
+        :arg filename: filename to verify
+        :arg first_line: the first line number
+        :arg last_line: the last line number, inclusive
+        :arg index: the EntryIndex for the file; if None, it's loaded
+            from next to the file or built
+
+        :returns: list of LintMessage objects
+
+        :raises IOError: if the file is not a valid .po or .mo file or
+            doesn't exist
+        """
+        if is_mofile(filename):
+            entries = (
+                entry
+                for entry in iter_mofile(filename)
+                if first_line <= entry.linenum <= last_line
+            )
+            return list(self.lint_entries(entries))
+
+        if not can_read_span(filename):
+            # Compressed files and archives can't be read from the middle
+            entries = iter_pofile_lines(filename, first_line, last_line)
+            return list(self.lint_entries(entries))
+
+        if index is None:
+            from dennis.cache import EntryIndex
+
+            index = EntryIndex(filename)
+            index.load_or_build()
+        return list(self.lint_entries(index.iter_lines(first_line, last_line)))
+
+
+class Linter(BaseLinter):
+    """Lints translated entries of .po and .mo files"""
+
+    def convert_rules(self, rules_spec):
+        return convert_rules(rules_spec)
+
+    def should_lint(self, poentry):
+        # Only translated entries that aren't fuzzy or obsolete
+        return poentry.translated()
@@ -0,0 +1,187 @@
+"""Reader for compiled .mo files
+
+This reads the string tables of a .mo file straight out of a memory map
+of the file. Strings are decoded one entry at a time as the entries are
+iterated over, so linting a .mo file doesn't need the whole catalog in
+memory.
+
+.mo files don't have comments, flags or line numbers. Entries get the
+index of their strings in the file's tables as their ``linenum``.
+
+"""
+
+import mmap
+import struct
+
+from polib import POEntry, POFile
+
+from dennis.poreader import CHARSET_RE, DEFAULT_ENCODING, charset_exists, is_file
+
+MAGIC = 0x950412DE
+MAGIC_SWAPPED = 0xDE120495
+
+
+def is_mofile(fn_or_string):
+    """Returns whether fn_or_string is the filename of a .mo file"""
+    return fn_or_string.endswith(".mo") and is_file(fn_or_string)
+
+
+class MOReaderEntry(POEntry):
+    """POEntry for a string in a .mo file
+
+    ``linenum`` is the index of the entry in the .mo file. The metadata
+    is index 0, so entries start at 1. ``original`` is the entry
+    written out like it would be in a .po file.
+
+    """
+
+    @property
+    def original(self):
+        return str(self)
+
+
+class MOReader:
+    """Reads a .mo file yielding POEntry objects
+
+    Iterating over a MOReader yields the entries in the file (except the
+    metadata entry) in the order they're in the file's tables. The
+    ``metadata`` and ``encoding`` attributes are filled in once the
+    metadata entry has been read.
+
+    :arg fn: filename of the .mo file
+
+    :raises IOError: if the file isn't a valid .mo file
+
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.encoding = DEFAULT_ENCODING
+        self.metadata = {}
+
+    def error(self, reason):
+        return IOError(f"Invalid mo file {self.fn}: {reason}")
+
+    def __iter__(self):
+        with open(self.fn, "rb") as fp:
+            try:
+                mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                raise self.error("file is empty")
+            with mm:
+                yield from self.iter_entries(mm)
+
+    def iter_entries(self, mm):
+        size = len(mm)
+        if size < 20:
+            raise self.error("file is too short")
+
+        (magic,) = struct.unpack_from("<I", mm, 0)
+        if magic == MAGIC:
+            order = "<"
+        elif magic == MAGIC_SWAPPED:
+            order = ">"
+        else:
+            raise self.error("magic number is incorrect")
+
+        revision, num_strings, msgids_offset, msgstrs_offset = struct.unpack_from(
+            order + "4I", mm, 4
+        )
+        # From the .mo format spec: "A program seeing an unexpected major
+        # revision number should stop reading the MO file entirely"
+        if revision >> 16 not in (0, 1):
+            raise self.error("unexpected major revision number")
+
+        table_size = num_strings * 8
+        if max(msgids_offset, msgstrs_offset) + table_size > size:
+            raise self.error("string tables are past the end of the file")
+
+        msgids = struct.iter_unpack(
+            order + "2I", mm[msgids_offset : msgids_offset + table_size]
+        )
+        msgstrs = struct.iter_unpack(
+            order + "2I", mm[msgstrs_offset : msgstrs_offset + table_size]
+        )
+
+        for index, (msgid_pos, msgstr_pos) in enumerate(zip(msgids, msgstrs)):
+            msgid_len, msgid_offset = msgid_pos
+            msgstr_len, msgstr_offset = msgstr_pos
+            if msgid_offset + msgid_len > size or msgstr_offset + msgstr_len > size:
+                raise self.error(f"string {index} is past the end of the file")
+
+            msgid = mm[msgid_offset : msgid_offset + msgid_len]
+            msgstr = mm[msgstr_offset : msgstr_offset + msgstr_len]
+
+            if index == 0 and not msgid:
+                self.parse_metadata(msgstr)
+                continue
+
+            try:
+                yield self.build_entry(index, msgid, msgstr)
+            except UnicodeDecodeError as exc:
+                raise self.error(f"string {index} can't be decoded: {exc}")
+
+    def build_entry(self, index, msgid, msgstr):
+        encoding = self.encoding
+        entry = MOReaderEntry(linenum=index)
+
+        msgctxt, sep, rest = msgid.partition(b"\x04")
+        if sep:
+            entry.msgctxt = msgctxt.decode(encoding)
+            msgid = rest
+
+        msgid, sep, msgid_plural = msgid.partition(b"\x00")
+        entry.msgid = msgid.decode(encoding)
+        if sep:
+            entry.msgid_plural = msgid_plural.decode(encoding)
+            entry.msgstr_plural = {
+                i: form.decode(encoding) for i, form in enumerate(msgstr.split(b"\x00"))
+            }
+        else:
+            entry.msgstr = msgstr.decode(encoding)
+        return entry
+
+    def parse_metadata(self, data):
+        match = CHARSET_RE.search(data)
+        if match:
+            charset = match.group(1).strip().decode("ascii", "replace")
+            if charset_exists(charset):
+                self.encoding = charset
+
+        for line in data.decode(self.encoding, "replace").split("\n"):
+            key, sep, val = line.partition(":")
+            if key:
+                self.metadata[key] = val.strip()
+
+
+def iter_mofile(fn):
+    """Yields entries of a .mo file as they're read
+
+    :arg fn: filename of the .mo file
+
+    :returns: generator of POEntry objects
+
+    :raises IOError: if the file isn't a valid .mo file
+
+    """
+    return iter(MOReader(fn))
+
+
+def read_mofile(fn):
+    """Reads an entire .mo file into a POFile
+
+    :arg fn: filename of the .mo file
+
+    :returns: polib POFile
+
+    :raises IOError: if the file isn't a valid .mo file
+
+    """
+    reader = MOReader(fn)
+    entries = list(reader)
+
+    po = POFile(encoding=reader.encoding)
+    po.metadata = reader.metadata
+    po.extend(entries)
+    return po
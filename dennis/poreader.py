@@ -0,0 +1,833 @@
+"""Single-pass reader for .po/.pot files
+
+polib parses pofiles fine, but dennis needs the original text of each
+block so it can print it out with line numbers. Getting that out of
+polib means reading the file several times. This reader does a single
+pass over the file, builds the same polib POEntry objects polib would
+and records where each block is in the file as it goes. The block text
+is only pulled out of the file when something asks for it.
+
+The state machine here mirrors the one in polib so that entries,
+line numbers and syntax errors match what polib produces.
+
+Files compressed with gzip, xz or bzip2 are decompressed as they're
+read.
+
+"""
+
+import codecs
+import importlib
+import io
+import mmap
+import os
+import re
+import zlib
+
+from polib import POEntry, POFile
+
+try:
+    from lzma import LZMAError
+except ImportError:
+    # Python was built without lzma, so there are no xz files to read
+    LZMAError = OSError
+
+DEFAULT_ENCODING = "utf-8"
+
+# Magic bytes at the start of compressed files and the module that reads
+# them
+COMPRESSED_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "lzma"),
+    (b"BZh", "bz2"),
+)
+
+# Suffixes of compressed pofiles
+COMPRESSED_SUFFIXES = (".gz", ".xz", ".bz2")
+
+# Errors the decompressors raise for broken files that aren't IOErrors
+DECOMPRESS_ERRORS = (EOFError, zlib.error, LZMAError)
+
+# Same pattern polib uses to detect the encoding of a pofile
+CHARSET_RE = re.compile(rb'"?Content-Type:.+? charset=([\w_\-:\.]+)')
+CHARSET_TEXT_RE = re.compile(r'"?Content-Type:.+? charset=([\w_\-:\.]+)')
+
+UNESCAPED_QUOTE_RE = re.compile(r'([^\\]|^)"')
+
+ESCAPE_RE = re.compile(r'\\(\\|n|t|r|v|b|f|")')
+ESCAPES = {
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "v": "\v",
+    "b": "\b",
+    "f": "\f",
+    "\\": "\\",
+    '"': '"',
+}
+
+KEYWORDS = {
+    "msgctxt": "ct",
+    "msgid": "mi",
+    "msgstr": "ms",
+    "msgid_plural": "mp",
+}
+PREV_KEYWORDS = {
+    "msgid_plural": "pp",
+    "msgid": "pm",
+    "msgctxt": "pc",
+}
+
+# Signification of symbols (same as polib):
+#
+# * ST: Beginning of the file (start)
+# * HE: Header
+# * TC: a translation comment
+# * GC: a generated comment
+# * OC: a file/line occurrence
+# * FL: a flags line
+# * CT: a message context
+# * PC: a previous msgctxt
+# * PM: a previous msgid
+# * PP: a previous msgid_plural
+# * MI: a msgid
+# * MP: a msgid plural
+# * MS: a msgstr
+# * MX: a msgstr plural
+# * MC: a msgid or msgstr continuation line
+#
+# This maps symbol -> states that symbol is valid in.
+ALL_STATES = {
+    "st",
+    "he",
+    "gc",
+    "oc",
+    "fl",
+    "ct",
+    "pc",
+    "pm",
+    "pp",
+    "tc",
+    "ms",
+    "mp",
+    "mx",
+    "mi",
+}
+TRANSITIONS = {
+    "tc": ALL_STATES - {"ct"},
+    "gc": ALL_STATES,
+    "oc": ALL_STATES,
+    "fl": ALL_STATES,
+    "pc": ALL_STATES,
+    "pm": ALL_STATES,
+    "pp": ALL_STATES,
+    "ct": {"st", "he", "gc", "oc", "fl", "tc", "pc", "pm", "pp", "ms", "mx"},
+    "mi": {"st", "he", "gc", "oc", "fl", "ct", "tc", "pc", "pm", "pp", "ms", "mx"},
+    "mp": {"tc", "gc", "pc", "pm", "pp", "mi"},
+    "ms": {"mi", "mp", "tc"},
+    "mx": {"mi", "mx", "mp", "tc"},
+    "mc": {"ct", "mi", "mp", "ms", "mx", "pm", "pp", "pc"},
+}
+
+# Symbols that start a new entry if the current entry has a msgstr
+NEW_ENTRY_SYMBOLS = {"tc", "gc", "oc", "fl", "pp", "pm", "pc", "ct", "mi"}
+
+# Continuation lines append to the field of the current state
+CONTINUATION_FIELDS = {
+    "ct": "msgctxt",
+    "mi": "msgid",
+    "mp": "msgid_plural",
+    "ms": "msgstr",
+    "pp": "previous_msgid_plural",
+    "pm": "previous_msgid",
+    "pc": "previous_msgctxt",
+}
+
+
+def unescape(text):
+    """Unescapes a quoted po string the same way polib does"""
+    if "\\" not in text:
+        return text
+    return ESCAPE_RE.sub(lambda match: ESCAPES[match.group(1)], text)
+
+
+def has_unescaped_quote(text):
+    return '"' in text and UNESCAPED_QUOTE_RE.search(text) is not None
+
+
+def is_file(fn_or_string):
+    try:
+        return os.path.isfile(fn_or_string)
+    except (TypeError, ValueError, UnicodeEncodeError):
+        return False
+
+
+def strip_compressed_suffix(fn):
+    """Returns fn without a compressed file suffix like ``.gz``"""
+    for suffix in COMPRESSED_SUFFIXES:
+        if fn.endswith(suffix):
+            return fn[: -len(suffix)]
+    return fn
+
+
+def is_pofile_path(fn_or_string):
+    """Returns whether fn_or_string is a file or a member of an archive"""
+    from dennis.archives import is_member
+
+    return is_file(fn_or_string) or is_member(fn_or_string)
+
+
+def compression(fn):
+    """Returns the name of the module that decompresses fn
+
+    This looks at the first bytes of the file, so compressed files are
+    found no matter what they're named.
+
+    :arg fn: filename or path of a member of an archive
+
+    :returns: ``"gzip"``, ``"lzma"``, ``"bz2"`` or None if the file
+        isn't compressed
+
+    :raises IOError: if the file can't be read
+
+    """
+    from dennis.archives import is_member, read_member
+
+    if is_member(fn):
+        magic = read_member(fn)[:6]
+    else:
+        with open(fn, "rb") as fp:
+            magic = fp.read(6)
+    return compression_of(magic)
+
+
+def compression_of(data):
+    """Returns the name of the module that decompresses data or None"""
+    for prefix, name in COMPRESSED_MAGIC:
+        if data.startswith(prefix):
+            return name
+    return None
+
+
+def can_read_span(fn):
+    """Returns whether part of fn can be read without the rest of it
+
+    Compressed files and members of archives have to be read from the
+    beginning.
+
+    """
+    return is_file(fn) and compression(fn) is None
+
+
+def open_pofile(fn):
+    """Opens a pofile for reading bytes, decompressing it as it's read
+
+    Members of archives are read into memory first.
+
+    :arg fn: filename or path of a member of an archive
+
+    :raises IOError: if the file can't be read
+
+    """
+    from dennis.archives import is_member, read_member
+
+    name = compression(fn)
+    if is_member(fn):
+        fp = io.BytesIO(read_member(fn))
+    elif name is None:
+        return open(fn, "rb")
+    else:
+        fp = fn
+    if name is None:
+        return fp
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        raise IOError(f"Can't decompress {fn}: {name} isn't available")
+    return module.open(fp, "rb")
+
+
+def charset_exists(charset):
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        return False
+    return True
+
+
+class ReaderEntry(POEntry):
+    """POEntry that gets its original block text from the reader
+
+    ``span`` is the ``(start, end)`` offset of the block in the pofile:
+    bytes for files and characters for strings. ``original`` slices the
+    text out when it's used, so entries nobody prints don't hold on to
+    a copy of their block. Compressed files and members of archives
+    can't be read from the middle, so entries from them get their block
+    text while they're parsed.
+
+    Pickled entries from files take the reader with them and read their
+    block when it's used. Entries from strings take the text of their
+    block with them.
+
+    """
+
+    reader = None
+    span = (0, 0)
+    _original = None
+
+    @property
+    def original(self):
+        if self._original is not None:
+            return self._original
+        if self.reader is None:
+            return ""
+        return self.reader.read_block(*self.span)
+
+    @original.setter
+    def original(self, value):
+        self._original = value
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        reader = state.get("reader")
+        if reader is not None and reader.fpath is None:
+            # The reader has the whole string, so we only take our part
+            state["_original"] = self.original
+            del state["reader"]
+        elif self._original is not None:
+            state.pop("reader", None)
+        return state
+
+
+class POReader:
+    """Reads a pofile in a single pass yielding POEntry objects
+
+    Iterating over a POReader yields the entries in the file (except
+    the metadata entry) as they are parsed. Each entry is a
+    :py:class:`ReaderEntry` with an ``original`` attribute holding the
+    text of the block the entry was parsed from.
+
+    The ``header``, ``metadata``, ``metadata_is_fuzzy`` and
+    ``encoding`` attributes are filled in as the file is read.
+
+    To read some of the entries of a big file, pass the byte range they
+    are in. The file is memory-mapped and only that range is read.
+    Entries and line numbers are the same as when reading the whole
+    file, but the header and metadata aren't read and the encoding
+    isn't detected.
+
+    :arg fn_or_string: filename of the pofile or the contents of a
+        pofile as a string
+    :arg span: ``(start, end)`` byte range of the file to read; it has
+        to start at the beginning of an entry's block and the file can't
+        be compressed
+    :arg first_line: line number of the line at ``start``
+    :arg encoding: encoding of the file when reading a range
+
+    :raises IOError: if the pofile has a syntax error or is a broken
+        compressed file
+
+    """
+
+    def __init__(self, fn_or_string, span=None, first_line=1, encoding=None):
+        self.fn_or_string = fn_or_string
+        self.fpath = fn_or_string if is_pofile_path(fn_or_string) else None
+        self.encoding = encoding or DEFAULT_ENCODING
+        self.header = ""
+        self.metadata = {}
+        self.metadata_is_fuzzy = 0
+        if span is not None and self.fpath is None:
+            raise ValueError("span can only be used with a filename")
+        # Whether blocks can be read from the middle of the file
+        self.can_read_span = self.fpath is not None and can_read_span(self.fpath)
+        if span is not None and not self.can_read_span:
+            raise ValueError("span can't be used with compressed files or archives")
+        self.span = span
+        self.first_line = first_line
+
+    def iter_lines(self):
+        """Yields ``(line, end)`` for lines of the pofile
+
+        ``end`` is the offset in the pofile where the line ends: in bytes
+        for files and characters for strings.
+
+        This figures out the encoding of the file from the first lines
+        without re-reading them.
+
+        """
+        if self.fpath is None:
+            match = CHARSET_TEXT_RE.search(self.fn_or_string)
+            if match and charset_exists(match.group(1).strip()):
+                self.encoding = match.group(1).strip()
+            end = 0
+            for line in self.fn_or_string.splitlines(True):
+                end += len(line)
+                yield line, end
+            return
+
+        if self.span is not None:
+            yield from self.iter_span_lines()
+            return
+
+        try:
+            yield from self.iter_file_lines()
+        except DECOMPRESS_ERRORS as exc:
+            raise self.decompress_error(exc)
+
+    def iter_file_lines(self):
+        """Yields ``(line, end)`` for lines of the file"""
+        with open_pofile(self.fpath) as fp:
+            # Figure out the encoding which is in the metadata block at the
+            # top of the file. We stop looking once we're past that block.
+            head = []
+            msgids = 0
+            for raw_line in fp:
+                head.append(raw_line)
+                match = CHARSET_RE.search(raw_line)
+                if match:
+                    enc = match.group(1).strip().decode("utf-8")
+                    if charset_exists(enc):
+                        self.encoding = enc
+                        break
+                if raw_line.lstrip().startswith(b"msgid "):
+                    msgids += 1
+                    if msgids > 1:
+                        break
+
+            encoding = self.encoding
+            end = 0
+            for raw_line in head:
+                end += len(raw_line)
+                yield raw_line.decode(encoding).replace("\r\n", "\n"), end
+            for raw_line in fp:
+                end += len(raw_line)
+                yield raw_line.decode(encoding).replace("\r\n", "\n"), end
+
+    def iter_span_lines(self):
+        """Yields ``(line, end)`` for lines in the span of the file"""
+        start, end = self.span
+        encoding = self.encoding
+        with open(self.fpath, "rb") as fp:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                mm.seek(start)
+                while mm.tell() < end:
+                    raw_line = mm.readline()
+                    yield raw_line.decode(encoding).replace("\r\n", "\n"), mm.tell()
+
+    def read_block(self, start, end):
+        """Returns the text of the pofile between two offsets
+
+        Only the block is read and nothing is kept around, so entries
+        don't hold on to the rest of the file. Compressed files and
+        members of archives are read from the beginning up to the block.
+        If the file changed since it was parsed, this returns whatever
+        is there now.
+
+        """
+        if self.fpath is None:
+            return self.fn_or_string[start:end]
+        if self.can_read_span:
+            with open(self.fpath, "rb") as fp:
+                fp.seek(start)
+                block = fp.read(end - start)
+        else:
+            try:
+                with open_pofile(self.fpath) as fp:
+                    fp.seek(start)
+                    block = fp.read(end - start)
+            except DECOMPRESS_ERRORS as exc:
+                raise self.decompress_error(exc)
+        return block.decode(self.encoding).replace("\r\n", "\n")
+
+    def decompress_error(self, exc):
+        return IOError(f"Invalid compressed file {self.fpath}: {exc}")
+
+    def syntax_error(self, linenum, reason=""):
+        fpath = "%s " % self.fpath if self.fpath else ""
+        msg = "Syntax error in po file %s(line %s)" % (fpath, linenum)
+        if reason:
+            msg = msg + ": " + reason
+        return IOError(msg)
+
+    def __iter__(self):
+        current_line = self.first_line - 1
+        # Like polib, the first entry in the file gets line 0
+        entry = ReaderEntry(linenum=0 if self.first_line == 1 else self.first_line)
+        entry.reader = self
+        state = "st"
+        msgstr_index = 0
+        obsolete = 0
+        # First token of the last non-blank line
+        first = None
+        # A range of the file starts after the header and metadata
+        in_range = self.span is not None and self.span[0] > 0
+        found_metadata = in_range
+
+        # Offsets where the current line starts and ends and where the last
+        # non-blank line ends
+        line_end = last_end = self.span[0] if self.span is not None else 0
+        # Offset where the block for the current entry starts and where the
+        # block before it ends
+        entry_start = entry_prev_end = line_end
+        # The entry waiting for the next entry to show up so we know where
+        # its block ends
+        pending = None
+        pending_start = 0
+        # Files that can't be read from the middle keep the lines of the
+        # pending and current entries as ``(start, line)`` to build the
+        # block text from
+        keep_lines = self.fpath is not None and not self.can_read_span
+        block_lines = []
+
+        def finish(new_entry):
+            """Finishes an entry and returns the previous one if complete
+
+            Entries are handed back one entry late because the block for
+            an entry goes up to the start of the next entry.
+
+            """
+            nonlocal found_metadata, pending, pending_start, block_lines
+
+            if not found_metadata and not new_entry.obsolete and new_entry.msgid == "":
+                # This is the metadata entry--it's not returned with the
+                # other entries.
+                found_metadata = True
+                self.parse_metadata(new_entry)
+                return None
+
+            # Lines before the start of this entry belong to the pending
+            # entry's block. If there's no pending entry, they're the
+            # metadata block and header which we toss.
+            done = pending
+            if done is not None:
+                done.span = (pending_start, entry_prev_end)
+                if keep_lines:
+                    done.original = block_text(pending_start, entry_prev_end)
+
+            pending = new_entry
+            pending_start = entry_start
+            if keep_lines:
+                block_lines = [item for item in block_lines if item[0] >= entry_start]
+            return done
+
+        def block_text(start, end):
+            return "".join(
+                line for offset, line in block_lines if start <= offset < end
+            )
+
+        for line, next_end in self.iter_lines():
+            current_line += 1
+            line_start = line_end
+            line_end = next_end
+            if keep_lines:
+                block_lines.append((line_start, line))
+
+            if line_start == 0 and line.startswith("\ufeff"):
+                line = line[1:]
+            line = line.strip()
+            if not line:
+                continue
+            prev_end = last_end
+            last_end = line_end
+
+            if line[0] == '"':
+                # Continuation lines are the most common kind of line, so
+                # handle them before splitting the line into tokens.
+                first = '"'
+                if has_unescaped_quote(line[1:-1]):
+                    raise self.syntax_error(
+                        current_line, "unescaped double quote found"
+                    )
+                symbol = "mc"
+
+            else:
+                tokens = line.split(None, 2)
+                nb_tokens = len(tokens)
+                first = tokens[0]
+
+                if first == "#~|":
+                    continue
+
+                if first == "#~" and nb_tokens > 1:
+                    line = line[3:].strip()
+                    tokens = tokens[1:]
+                    nb_tokens -= 1
+                    first = tokens[0]
+                    obsolete = 1
+                else:
+                    obsolete = 0
+
+                if first in KEYWORDS and nb_tokens > 1:
+                    line = line[len(first) :].lstrip()
+                    if has_unescaped_quote(line[1:-1]):
+                        raise self.syntax_error(
+                            current_line, "unescaped double quote found"
+                        )
+                    symbol = KEYWORDS[first]
+
+                elif first == "#:":
+                    if nb_tokens <= 1:
+                        continue
+                    symbol = "oc"
+
+                elif line[:1] == '"':
+                    if has_unescaped_quote(line[1:-1]):
+                        raise self.syntax_error(
+                            current_line, "unescaped double quote found"
+                        )
+                    symbol = "mc"
+
+                elif line[:7] == "msgstr[":
+                    symbol = "mx"
+
+                elif first == "#,":
+                    if nb_tokens <= 1:
+                        continue
+                    symbol = "fl"
+
+                elif first == "#" or first.startswith("##"):
+                    symbol = "tc"
+
+                elif first == "#.":
+                    if nb_tokens <= 1:
+                        continue
+                    symbol = "gc"
+
+                elif first == "#|":
+                    if nb_tokens <= 1:
+                        raise self.syntax_error(current_line)
+
+                    # Remove the marker and any whitespace right after that.
+                    line = line[2:].lstrip()
+
+                    if tokens[1].startswith('"'):
+                        symbol = "mc"
+                    elif nb_tokens == 2:
+                        raise self.syntax_error(
+                            current_line, "invalid continuation line"
+                        )
+                    elif tokens[1] not in PREV_KEYWORDS:
+                        raise self.syntax_error(
+                            current_line, "unknown keyword %s" % tokens[1]
+                        )
+                    else:
+                        line = line[len(tokens[1]) :].lstrip()
+                        symbol = PREV_KEYWORDS[tokens[1]]
+
+                else:
+                    raise self.syntax_error(current_line)
+
+            if state not in TRANSITIONS[symbol]:
+                raise self.syntax_error(current_line)
+
+            if symbol in NEW_ENTRY_SYMBOLS and state in ("ms", "mx"):
+                done = finish(entry)
+                if done is not None:
+                    yield done
+                entry = ReaderEntry(linenum=current_line)
+                entry.reader = self
+                entry_start = line_start
+                entry_prev_end = prev_end
+
+            try:
+                if symbol == "mc":
+                    token = unescape(line[1:-1])
+                    if state == "mx":
+                        entry.msgstr_plural[msgstr_index] += token
+                    else:
+                        field = CONTINUATION_FIELDS[state]
+                        setattr(entry, field, getattr(entry, field) + token)
+                    # Continuation lines don't change the state
+                    continue
+
+                elif symbol == "mi":
+                    entry.obsolete = obsolete
+                    entry.msgid = unescape(line[1:-1])
+
+                elif symbol == "ms":
+                    entry.msgstr = unescape(line[1:-1])
+
+                elif symbol == "oc":
+                    for occurrence in line[3:].split():
+                        fil, sep, linenum = occurrence.rpartition(":")
+                        if sep and linenum.isdigit():
+                            entry.occurrences.append((fil, linenum))
+                        else:
+                            entry.occurrences.append((occurrence, ""))
+
+                elif symbol == "fl":
+                    entry.flags += [flag.strip() for flag in line[3:].split(",")]
+
+                elif symbol == "gc":
+                    if entry.comment != "":
+                        entry.comment += "\n"
+                    entry.comment += line[3:]
+
+                elif symbol == "tc":
+                    if state in ("st", "he") and not in_range:
+                        # Header comment
+                        if self.header != "":
+                            self.header += "\n"
+                        self.header += line[2:]
+                        state = "he"
+                        continue
+
+                    if entry.tcomment != "":
+                        entry.tcomment += "\n"
+                    tcomment = line.lstrip("#")
+                    if tcomment.startswith(" "):
+                        tcomment = tcomment[1:]
+                    entry.tcomment += tcomment
+
+                elif symbol == "ct":
+                    entry.msgctxt = unescape(line[1:-1])
+
+                elif symbol == "mp":
+                    entry.msgid_plural = unescape(line[1:-1])
+
+                elif symbol == "mx":
+                    msgstr_index = int(line[7])
+                    entry.msgstr_plural[msgstr_index] = unescape(
+                        line[line.find('"') + 1 : -1]
+                    )
+
+                elif symbol == "pp":
+                    entry.previous_msgid_plural = unescape(line[1:-1])
+
+                elif symbol == "pm":
+                    entry.previous_msgid = unescape(line[1:-1])
+
+                elif symbol == "pc":
+                    entry.previous_msgctxt = unescape(line[1:-1])
+
+            except Exception:
+                raise self.syntax_error(current_line)
+
+            state = symbol
+
+        # Entries are added when the next entry starts, so we add the last
+        # entry here if there were lines. Trailing comments are ignored.
+        if first is not None and not first.startswith("#"):
+            done = finish(entry)
+            if done is not None:
+                yield done
+
+        if pending is not None:
+            pending.span = (pending_start, last_end)
+            if keep_lines:
+                pending.original = block_text(pending_start, last_end)
+            yield pending
+
+    def parse_metadata(self, metadata_entry):
+        self.metadata_is_fuzzy = metadata_entry.flags
+        key = None
+        for msg in metadata_entry.msgstr.splitlines():
+            try:
+                key, val = msg.split(":", 1)
+                self.metadata[key] = val.strip()
+            except (ValueError, KeyError):
+                if key is not None:
+                    self.metadata[key] += "\n" + msg.strip()
+
+
+def decode_pofile(data):
+    """Decodes the contents of a pofile read as bytes
+
+    Data compressed with gzip, xz or bzip2 is decompressed first. The
+    text is decoded with the charset in the metadata.
+
+    :arg data: the pofile as bytes
+
+    :returns: the pofile as a string
+
+    :raises IOError: if the data can't be decompressed or decoded
+
+    """
+    name = compression_of(data)
+    if name is not None:
+        try:
+            data = importlib.import_module(name).decompress(data)
+        except ImportError:
+            raise IOError(f"Can't decompress data: {name} isn't available")
+        except DECOMPRESS_ERRORS + (OSError,) as exc:
+            raise IOError(f"Invalid compressed data: {exc}")
+
+    encoding = DEFAULT_ENCODING
+    match = CHARSET_RE.search(data)
+    if match:
+        charset = match.group(1).strip().decode("ascii", "replace")
+        if charset_exists(charset):
+            encoding = charset
+    try:
+        return data.decode(encoding).replace("\r\n", "\n")
+    except UnicodeDecodeError as exc:
+        raise IOError(f"Can't decode pofile as {encoding}: {exc}")
+
+
+def iter_pofile(fn_or_string):
+    """Yields entries of a pofile as they're parsed
+
+    :arg fn_or_string: filename of the pofile or the contents of a
+        pofile as a string
+
+    :returns: generator of POEntry objects with ``original`` attributes
+
+    :raises IOError: if the pofile has a syntax error
+
+    """
+    return iter(POReader(fn_or_string))
+
+
+def iter_pofile_lines(fn_or_string, first_line, last_line):
+    """Yields entries of a pofile with lines between two lines
+
+    This reads the whole file up to ``last_line``. Use a
+    :py:class:`dennis.cache.EntryIndex` to only read part of a big file
+    that isn't compressed.
+
+    :arg fn_or_string: filename of the pofile or the contents of a
+        pofile as a string
+    :arg first_line: the first line number
+    :arg last_line: the last line number, inclusive
+
+    :returns: generator of POEntry objects with ``original`` attributes
+
+    :raises IOError: if the pofile has a syntax error
+
+    """
+    # The entry first_line is in starts at or before it
+    pending = None
+    for entry in POReader(fn_or_string):
+        if entry.linenum <= first_line:
+            pending = entry
+            continue
+        if pending is not None:
+            yield pending
+            pending = None
+        if entry.linenum > last_line:
+            return
+        yield entry
+    if pending is not None:
+        yield pending
+
+
+def read_pofile(fn_or_string):
+    """Reads an entire pofile into a POFile
+
+    :arg fn_or_string: filename of the pofile or the contents of a
+        pofile as a string
+
+    :returns: polib POFile with POEntry objects with ``original``
+        attributes
+
+    :raises IOError: if the pofile has a syntax error
+
+    """
+    reader = POReader(fn_or_string)
+    entries = list(reader)
+
+    po = POFile(pofile=fn_or_string, encoding=reader.encoding)
+    po.header = reader.header
+    po.metadata = reader.metadata
+    po.metadata_is_fuzzy = reader.metadata_is_fuzzy
+    po.extend(entries)
+    return po
@@ -0,0 +1,399 @@
+"""Reporters that print lint results"""
+
+import json
+import os
+import pathlib
+
+import click
+
+from dennis import __version__
+from dennis.moreader import MOReaderEntry
+from dennis.tools import all_subclasses, withlines
+
+
+class OutputBuffer:
+    """Collects output and writes it in large chunks
+
+    Text for stdout and stderr is kept in order and consecutive text for
+    the same stream is joined, so each run of text is written with one
+    call when :py:meth:`flush` is called or once there's more than
+    ``max_size`` characters waiting. Styles are stripped once per write
+    if the stream isn't a terminal.
+
+    :arg max_size: the number of characters to collect before writing
+
+    """
+
+    def __init__(self, max_size=64 * 1024):
+        self.max_size = max_size
+        self.segments = []
+        self.size = 0
+
+    def write(self, text, err=False):
+        if self.segments and self.segments[-1][0] == err:
+            self.segments[-1][1].append(text)
+        else:
+            self.segments.append((err, [text]))
+        self.size += len(text)
+        if self.size >= self.max_size:
+            self.flush()
+
+    def flush(self):
+        for err, parts in self.segments:
+            click.echo("".join(parts), nl=False, err=err)
+        self.segments = []
+        self.size = 0
+
+
+def entry_text(poentry):
+    """Returns the text of an entry for showing with a lint message
+
+    Entries from .po files have their line numbers. Entries from .mo
+    files don't have lines, so they get their index in the file.
+
+    """
+    if isinstance(poentry, MOReaderEntry):
+        original = poentry.original.rstrip("\n")
+        return f"entry {poentry.linenum}:\n{original}"
+    return withlines(poentry.linenum, poentry.original)
+
+
+def locale_dir(fn):
+    """Returns the locale directory of locale/LC_MESSAGES/messages.po"""
+    parts = fn.split(os.sep)
+    return parts[-3] if len(parts) >= 3 else ""
+
+
+def mo_properties(poentry):
+    """Returns the index and msgid of an entry from a .mo file or None"""
+    if isinstance(poentry, MOReaderEntry):
+        return {"entry": poentry.linenum, "msgid": poentry.msgid}
+    return None
+
+
+def make_styler(**styles):
+    """Returns a function that styles text like ``click.style(text, **styles)``
+
+    The escape codes are only computed once.
+
+    """
+    start, end = click.style("\0", **styles).split("\0")
+    return lambda text: start + text + end
+
+
+class Reporter:
+    """Reporter base class
+
+    The lint command calls :py:meth:`start` once, then
+    :py:meth:`file_results` or :py:meth:`file_error` for each file as it
+    finishes and :py:meth:`finish` at the end. Output goes to an
+    :py:class:`OutputBuffer` that's flushed after every file.
+
+    :arg out: the OutputBuffer to write to
+    :arg rules: the lint rule classes being used
+    :arg errorsonly: whether results only have errors
+    :arg quiet: whether to only print problems opening files
+
+    """
+
+    name = ""
+    desc = ""
+
+    # Whether other output like the dennis version would break this
+    # reporter's output
+    machine_readable = False
+
+    def __init__(self, out, rules, errorsonly=False, quiet=False):
+        self.out = out
+        self.rules = rules
+        self.errorsonly = errorsonly
+        self.quiet = quiet
+
+    def start(self):
+        pass
+
+    def file_results(self, fn, results):
+        """Reports the LintMessages for a file"""
+        raise NotImplementedError
+
+    def file_error(self, fn, ioe):
+        """Reports a file that couldn't be opened or parsed"""
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+
+class TextReporter(Reporter):
+    name = ""
+    desc = "Human-readable output with the problem strings and totals"
+
+    def __init__(self, out, rules, errorsonly=False, quiet=False):
+        super().__init__(out, rules, errorsonly=errorsonly, quiet=quiet)
+        self.style_error = make_styler(fg="red", bold=True)
+        self.style_warning = make_styler(fg="yellow", bold=True)
+        self.style_header = make_styler(fg="green", bold=True)
+
+        self.files_to_errors = {}
+        self.file_count = 0
+        self.total_error_count = 0
+        self.total_warning_count = 0
+        self.total_files_with_errors = 0
+
+    def echo(self, text=""):
+        self.out.write(text + "\n")
+
+    def err(self, text):
+        self.out.write(self.style_error(f"Error: {text}") + "\n", err=True)
+
+    def file_error(self, fn, ioe):
+        # This is printed even with quiet
+        self.err(f">>> Problem opening file: {click.format_filename(fn)}")
+        self.err(repr(ioe))
+        self.echo()
+
+        # FIXME - should we track this separately as an invalid
+        # file?
+        self.file_count += 1
+        self.files_to_errors[fn] = (1, 0)
+        self.total_error_count += 1
+
+    def print_file_results(self, fn, error_results, warning_results):
+        echo = self.echo
+        echo(self.style_header(f">>> Working on: {click.format_filename(fn)}"))
+
+        for msg in error_results:
+            self.err(f"{msg.code}: {msg.msg}")
+            echo(entry_text(msg.poentry))
+            echo()
+
+        if not self.errorsonly:
+            for msg in warning_results:
+                echo(self.style_warning(f"{msg.code}: {msg.msg}"))
+                echo(entry_text(msg.poentry))
+                echo()
+
+        echo("Totals")
+        if not self.errorsonly:
+            echo(f"  Warnings: {len(warning_results):5}")
+        echo(f"  Errors:   {len(error_results):5}")
+        echo()
+
+    def file_results(self, fn, results):
+        self.file_count += 1
+
+        # We don't want to print output for files that are fine, so we
+        # update the bookkeeping and move on.
+        if not results:
+            self.files_to_errors[fn] = (0, 0)
+            return
+
+        error_results = [res for res in results if res.kind == "err"]
+        warning_results = [res for res in results if res.kind == "warn"]
+
+        error_count = len(error_results)
+        self.total_error_count += error_count
+
+        warning_count = len(warning_results)
+        self.total_warning_count += warning_count
+
+        if not self.quiet:
+            self.print_file_results(fn, error_results, warning_results)
+
+        self.files_to_errors[fn] = (error_count, warning_count)
+
+        if error_count > 0:
+            self.total_files_with_errors += 1
+
+    def finish(self):
+        if self.file_count <= 1 or self.quiet:
+            return
+
+        echo = self.echo
+        errorsonly = self.errorsonly
+        echo("Final totals")
+        echo(f"  Number of files examined:          {self.file_count:5}")
+        echo(f"  Total number of files with errors: {self.total_files_with_errors:5}")
+        if not errorsonly:
+            echo(f"  Total number of warnings:          {self.total_warning_count:5}")
+        echo(f"  Total number of errors:            {self.total_error_count:5}")
+        echo()
+
+        file_counts = [
+            (counts[0], counts[1], locale_dir(fn), fn.split(os.sep)[-1])
+            for (fn, counts) in self.files_to_errors.items()
+        ]
+
+        file_counts = list(reversed(sorted(file_counts)))
+        printed_header = False
+        for error_count, warning_count, locale, fn in file_counts:
+            if not error_count and not warning_count:
+                continue
+
+            if not printed_header:
+                if errorsonly:
+                    echo("Errors  Filename")
+                else:
+                    echo("Warnings  Errors  Filename")
+                printed_header = True
+
+            if errorsonly:
+                echo(f" {error_count:5}  {locale} ({fn})")
+            else:
+                echo(f"   {warning_count:5}   {error_count:5}  {locale} ({fn})")
+
+
+class LineReporter(TextReporter):
+    name = "line"
+    desc = "One line per problem for editors and other linters"
+
+    def print_file_results(self, fn, error_results, warning_results):
+        results = error_results
+        if not self.errorsonly:
+            results = results + warning_results
+        for msg in results:
+            properties = mo_properties(msg.poentry)
+            if properties:
+                # .mo entries don't have lines, so the line and column are
+                # left out and the entry is named after the message
+                msgid = json.dumps(properties["msgid"], ensure_ascii=False)
+                self.echo(
+                    f"{fn}: {msg.code}: {msg.msg} "
+                    f"(entry {properties['entry']}: msgid {msgid})"
+                )
+            else:
+                self.echo(f"{fn}: {msg.poentry.linenum}: 0: {msg.code}: {msg.msg}")
+
+    def finish(self):
+        pass
+
+
+class JSONLinesReporter(Reporter):
+    name = "jsonl"
+    desc = "One JSON object per line for each lint message"
+    machine_readable = True
+
+    def write_record(self, fn, line, kind, code, msg, properties=None):
+        record = {
+            "file": fn,
+            "line": line,
+            "code": code,
+            "kind": kind,
+            "message": msg,
+        }
+        if properties:
+            record.update(properties)
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def file_results(self, fn, results):
+        # Problems opening files are still written with quiet
+        if self.quiet:
+            return
+        for msg in results:
+            properties = mo_properties(msg.poentry)
+            line = None if properties else msg.line
+            self.write_record(fn, line, msg.kind, msg.code, msg.msg, properties)
+
+    def file_error(self, fn, ioe):
+        self.write_record(fn, None, "err", None, f"Problem opening file: {ioe}")
+
+
+class SARIFReporter(Reporter):
+    name = "sarif"
+    desc = "SARIF 2.1.0 log for code scanning tools"
+    machine_readable = True
+
+    schema = "https://json.schemastore.org/sarif-2.1.0.json"
+
+    levels = {"err": "error", "warn": "warning"}
+
+    def __init__(self, out, rules, errorsonly=False, quiet=False):
+        super().__init__(out, rules, errorsonly=errorsonly, quiet=quiet)
+        self.first_result = True
+
+    def rule_descriptors(self):
+        descriptors = []
+        for rule in sorted(self.rules, key=lambda rule: rule.num):
+            for num in (rule.num, getattr(rule, "num_error", "")):
+                if num:
+                    descriptors.append(
+                        {
+                            "id": num,
+                            "name": rule.name,
+                            "shortDescription": {"text": rule.desc},
+                        }
+                    )
+        return descriptors
+
+    def start(self):
+        # The log is written a piece at a time so results don't have to be
+        # held in memory. This writes everything up to the results list.
+        log = json.dumps(
+            {
+                "version": "2.1.0",
+                "$schema": self.schema,
+                "runs": [
+                    {
+                        "tool": {
+                            "driver": {
+                                "name": "dennis",
+                                "version": __version__,
+                                "informationUri": "https://github.com/mozilla/dennis",
+                                "rules": self.rule_descriptors(),
+                            }
+                        },
+                        "results": [],
+                    }
+                ],
+            },
+            ensure_ascii=False,
+        )
+        # Strip the closing "]}]}" off so results can follow
+        self.out.write(log[: -len("]}]}")])
+
+    def write_result(self, result):
+        if not self.first_result:
+            self.out.write(",")
+        self.first_result = False
+        self.out.write(json.dumps(result, ensure_ascii=False))
+
+    def location(self, fn, line=None):
+        # Files that aren't on disk like stdin don't have a file URI
+        uri = pathlib.Path(fn).as_uri() if os.path.isabs(fn) else fn
+        physical_location = {"artifactLocation": {"uri": uri}}
+        if line:
+            physical_location["region"] = {"startLine": line}
+        return {"physicalLocation": physical_location}
+
+    def file_results(self, fn, results):
+        # With quiet, the log only has problems opening files
+        if self.quiet:
+            return
+        for msg in results:
+            properties = mo_properties(msg.poentry)
+            line = None if properties else msg.line
+            result = {
+                "ruleId": msg.code,
+                "level": self.levels.get(msg.kind, "note"),
+                "message": {"text": msg.msg},
+                "locations": [self.location(fn, line)],
+            }
+            if properties:
+                result["properties"] = properties
+            self.write_result(result)
+
+    def file_error(self, fn, ioe):
+        self.write_result(
+            {
+                "level": "error",
+                "message": {"text": f"Problem opening file: {ioe}"},
+                "locations": [self.location(fn)],
+            }
+        )
+
+    def finish(self):
+        self.out.write("]}]}\n")
+
+
+def get_reporters():
+    return {cls.name: cls for cls in all_subclasses(Reporter)}
@@ -1,10 +1,5 @@
-from dennis.tools import (
-    VariableTokenizer,
-    all_subclasses,
-    parse_dennis_note,
-    parse_pofile,
-)
-from dennis.linter import LintedEntry, LintMessage
+from dennis.tools import all_subclasses
+from dennis.linter import BaseLinter, LintMessage
 
 WARNING = "warn"
 ERROR = "err"
@@ -42,10 +37,7 @@ class HardToReadNamesTLR(TemplateLintRule):
             if not s:
                 continue
 
-            msgid_tokens = vartok.extract_tokens(s)
-            msgid_tokens = [
-                vartok.extract_variable_name(token) for token in msgid_tokens
-            ]
+            msgid_tokens = linted_entry.variable_names(vartok, s)
 
             for token in msgid_tokens:
                 if token in self.hard_to_read:
@@ -75,10 +67,7 @@ class OneCharNamesTLR(TemplateLintRule):
             if not s:
                 continue
 
-            msgid_tokens = vartok.extract_tokens(s)
-            msgid_tokens = [
-                vartok.extract_variable_name(token) for token in msgid_tokens
-            ]
+            msgid_tokens = linted_entry.variable_names(vartok, s)
 
             for token in msgid_tokens:
                 if len(token) == 1 and token.isalpha():
@@ -108,10 +97,7 @@ class MultipleUnnamedVarsTLR(TemplateLintRule):
             if not s:
                 continue
 
-            msgid_tokens = vartok.extract_tokens(s, unique=False)
-            msgid_tokens = [
-                vartok.extract_variable_name(token) for token in msgid_tokens
-            ]
+            msgid_tokens = linted_entry.variable_names(vartok, s, unique=False)
 
             if msgid_tokens.count("") > 1:
                 msgs.append(
@@ -145,41 +131,8 @@ def convert_rules(rules_spec):
     return rules
 
 
-class TemplateLinter:
-    def __init__(self, vars_, rules_spec):
-        self.vartok = VariableTokenizer(vars_)
-        self.rules_spec = rules_spec
-        self.rules = convert_rules(self.rules_spec)
+class TemplateLinter(BaseLinter):
+    """Lints every entry of .pot files"""
 
-    def lint_poentry(self, poentry):
-        linted_entry = LintedEntry(poentry)
-
-        skip = parse_dennis_note(poentry.comment)
-
-        msgs = []
-
-        # Check the comment to see if what we should ignore.
-        for lint_rule in self.rules:
-            if skip == "*" or lint_rule.num in skip:
-                continue
-
-            msgs.extend(lint_rule.lint(self.vartok, linted_entry))
-
-        return msgs
-
-    def verify_file(self, filename_or_string):
-        """Verifies strings in file.
-
-        :arg filename_or_string: filename to verify or the contents of
-            a pofile as a string
-
-        :returns: list of LintMessage objects
-
-        :raises IOError: if the file is not a valid .po file or
-            doesn't exist
-        """
-        po = parse_pofile(filename_or_string)
-        msgs = []
-        for entry in po:
-            msgs.extend(self.lint_poentry(entry))
-        return msgs
+    def convert_rules(self, rules_spec):
+        return convert_rules(rules_spec)
@@ -1,4 +1,5 @@
 import re
+from collections import OrderedDict
 
 import click
 
@@ -10,6 +11,10 @@ class Format:
     desc = ""
     regexp = ""
 
+    # Characters every variable of this format contains; if a string
+    # has none of them, it has no variables. Empty means it's unknown.
+    triggers = ""
+
     identifier = None
 
     @classmethod
@@ -27,6 +32,7 @@ class PythonBraceFormat(Format):
         # {}, {0}, {foo}, {foo:bar}, {foo:bar baz}
         r"(?:\{[^\}]*?\})"
     )
+    triggers = "{"
 
     identifier = re.compile(r"\{([^!:\}]*)")
 
@@ -50,6 +56,7 @@ class PythonFormat(Format):
         # aren't getting used in gettext contexts anyhow.
         r"(?:%(?:[(]\S+?[)])?[#0+-]?[\.\d\*]*[hlL]?[diouxefGgcrs])"
     )
+    triggers = "%"
 
     identifier = re.compile(
         r"%" r"(?:" + r"\((\S+?)\)" + r")?" r"[#0+-]?[\.\d\*]*[hlL]?[diouxefGgcrs]"
@@ -95,6 +102,7 @@ class VariableTokenizer:
         if not formats:
             self.formats = []
             self.vars_re = None
+            self.triggers = ""
 
         else:
             # Convert names to classes
@@ -111,6 +119,13 @@ class VariableTokenizer:
                 r"(" + "|".join([vt.regexp for vt in self.formats]) + r")"
             )
 
+            # Characters at least one of which is in every variable or
+            # None if some format doesn't say
+            if all(vt.triggers for vt in self.formats):
+                self.triggers = "".join(vt.triggers for vt in self.formats)
+            else:
+                self.triggers = None
+
     def contains(self, fmt):
         """Does this tokenizer contain specified variable format?"""
         return fmt in [tok.name for tok in self.formats]
@@ -154,6 +169,48 @@ class VariableTokenizer:
                 return fmt.extract_variable_name(text)
 
 
+class LRUCache:
+    """Mapping that holds at most maxsize items
+
+    When it's full, the least recently used item is evicted. It keeps
+    track of hits and misses.
+
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 def all_subclasses(cls):
     subc = cls.__subclasses__()
     for d in list(subc):
@@ -183,7 +240,7 @@ def parse_dennis_note(text):
     return [item for item in match.split(",") if item]
 
 
-def parse_pofile(fn_or_string):
+def parse_pofile(fn_or_string, cache=None):
     """Parses a po file and attaches original poentry blocks
 
     When polib parses a pofile, it captures the line number of the
@@ -194,10 +251,40 @@ def parse_pofile(fn_or_string):
     problematic if we want to print out the block with the line
     numbers--one for each line.
 
-    So this wrapper captures the line numbers and original text for
-    each block and attaches that to the parsed poentries in an
-    attribute named "original" thus allowing us to print the original
-    text with line numbers.
+    So this parses the pofile with dennis' single-pass reader which
+    captures the line numbers and original text for each block and
+    attaches that to the parsed poentries in an attribute named
+    "original" thus allowing us to print the original text with line
+    numbers.
+
+    If the reader can't parse the file, this falls back to polib.
+    Compressed files and members of archives are only read by dennis'
+    reader.
+
+    If ``cache`` is a :py:class:`dennis.cache.CatalogCache` and
+    ``fn_or_string`` is a filename, files that haven't changed since
+    they were last parsed are loaded from the cache instead.
+
+    """
+    from dennis.poreader import can_read_span, is_file, is_pofile_path, read_pofile
+
+    if cache is not None and is_file(fn_or_string):
+        return cache.parse(fn_or_string)
+
+    try:
+        return read_pofile(fn_or_string)
+    except IOError:
+        # polib can't read compressed files or archives
+        if is_pofile_path(fn_or_string) and not can_read_span(fn_or_string):
+            raise
+        return parse_pofile_polib(fn_or_string)
+
+
+def parse_pofile_polib(fn_or_string):
+    """Parses a po file with polib and attaches original poentry blocks
+
+    This is slower than :py:func:`parse_pofile` because it reads the
+    file several times, but it uses polib for all the parsing.
 
     """
     from polib import _is_file, detect_encoding, io, pofile
@@ -1,19 +1,13 @@
+import functools
+import operator
 import re
 import string
 
-import click
 from html.parser import HTMLParser
 import polib
 
 from dennis.tools import VariableTokenizer, all_subclasses
 
-DEBUG = False
-
-
-def debug(*args):
-    if DEBUG:
-        click.echo(" ".join([str(arg) for arg in args]))
-
 
 class Token:
     def __init__(self, s, type="text", mutable=True):
@@ -40,10 +34,138 @@ class Token:
         return not self.__eq__(token)
 
 
+# Type of the immutable tokens variables are split out into
+VARIABLE = "variable"
+
+# Variables are replaced with placeholders that are as long as they are
+# while a transform works on the text around them. These are
+# noncharacters, so they're not in the strings being translated.
+PLACEHOLDER_START = "\ufdd0"
+PLACEHOLDER_REST = "\ufdd1"
+PLACEHOLDER_RE = re.compile(PLACEHOLDER_START + PLACEHOLDER_REST + "*")
+
+
+def tokenize_variables(vartok, token_stream):
+    """Splits the variables in mutable tokens out into immutable tokens
+
+    :py:class:`Translator` does this once before the pipeline, so
+    transforms only ever see text in mutable tokens.
+
+    :arg vartok: the variable tokenizer to use
+    :arg token_stream: the tokens to split
+
+    :returns: list of tokens
+
+    """
+    if not vartok.vars_re:
+        return list(token_stream)
+
+    new_tokens = []
+    for token in token_stream:
+        if not token.mutable:
+            new_tokens.append(token)
+            continue
+
+        # This alternates between text and variables
+        parts = vartok.vars_re.split(token.s)
+        if len(parts) == 1:
+            new_tokens.append(token)
+            continue
+
+        for i in range(0, len(parts) - 1, 2):
+            if parts[i]:
+                new_tokens.append(Token(parts[i]))
+            new_tokens.append(Token(parts[i + 1], VARIABLE, False))
+        if parts[-1]:
+            new_tokens.append(Token(parts[-1]))
+
+    return new_tokens
+
+
+def iter_runs(token_stream):
+    """Yields runs of tokens that are text and the variables in it
+
+    A run is what was one mutable token before its variables were split
+    out: text tokens and the variable tokens between them. Other
+    immutable tokens, like HTML, are yielded by themselves.
+
+    """
+    run = []
+    for token in token_stream:
+        if token.mutable:
+            # Text right after text is the start of another run
+            if run and run[-1].mutable:
+                yield run
+                run = []
+            run.append(token)
+        elif token.type == VARIABLE:
+            run.append(token)
+        else:
+            if run:
+                yield run
+                run = []
+            yield token
+    if run:
+        yield run
+
+
+def mask_variables(run):
+    """Returns the text of a run with placeholders for the variables
+
+    :returns: ``(text, variables)`` where variables is the list of the
+        variables in the order they're in
+
+    """
+    if len(run) == 1 and run[0].mutable:
+        return run[0].s, []
+
+    parts = []
+    variables = []
+    for token in run:
+        if token.mutable:
+            parts.append(token.s)
+        else:
+            variables.append(token.s)
+            parts.append(PLACEHOLDER_START + PLACEHOLDER_REST * (len(token.s) - 1))
+    return "".join(parts), variables
+
+
+def unmask_variables(text, variables):
+    """Returns the tokens for text with the placeholders put back
+
+    :arg text: text with placeholders from :py:func:`mask_variables`
+    :arg variables: iterator of the variables for the placeholders in
+        order
+
+    :returns: list of text and variable tokens
+
+    """
+    tokens = []
+    pos = 0
+    for match in PLACEHOLDER_RE.finditer(text):
+        if match.start() > pos:
+            tokens.append(Token(text[pos : match.start()]))
+        tokens.append(Token(next(variables, ""), VARIABLE, False))
+        pos = match.end()
+    if pos < len(text) or not tokens:
+        tokens.append(Token(text[pos:]))
+    return tokens
+
+
 class Transform:
     name = ""
     desc = ""
 
+    def reset(self):
+        """Clears any state left over from the last string
+
+        Transforms are created once per Translator and used for every
+        string it translates, so transforms that keep state while
+        transforming a string override this.
+
+        """
+        pass
+
     def transform(self, vartok, token_stream):
         """Takes a token stream and returns a token stream
 
@@ -58,55 +180,86 @@ class Transform:
         raise NotImplementedError
 
 
-class EmptyTransform(Transform):
-    name = "empty"
-    desc = "Returns empty strings."
+class TextTransform(Transform):
+    """A transform that changes the text of each run of tokens
 
-    def transform(self, vartok, token_stream):
-        return [Token("")]
+    Subclasses implement :py:meth:`transform_text`. Variables in the text
+    are replaced with placeholders that are as long as the variables, so
+    the transform can look at the whole string without changing them.
 
+    """
 
-class DoubleTransform(Transform):
-    name = "double"
-    desc = "Doubles all vowels in a string."
+    def transform_text(self, s):
+        """Returns the transformed text of a run"""
+        raise NotImplementedError
 
     def transform(self, vartok, token_stream):
         new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
+        for run in iter_runs(token_stream):
+            if isinstance(run, Token):
+                new_tokens.append(run)
                 continue
 
-            s = token.s
-            for char in "aeiouyAEIOUY":
-                s = s.replace(char, char + char)
-
-            new_tokens.append(Token("".join(s)))
+            text, variables = mask_variables(run)
+            text = self.transform_text(text)
+            if variables:
+                new_tokens.extend(unmask_variables(text, iter(variables)))
+            else:
+                new_tokens.append(Token(text))
 
         return new_tokens
 
 
-class XXXTransform(Transform):
-    name = "xxx"
-    desc = "Adds xxx before and after lines in a string."
+class CharTransform(Transform):
+    """A transform that changes each character by itself
+
+    Subclasses set :py:attr:`table`, :py:attr:`upper` or
+    :py:attr:`reverse`. Runs of these next to each other in a pipeline are
+    compiled together by :py:func:`compile_char_transforms` into as few
+    passes over each token as possible.
+
+    """
+
+    # str.translate table of what characters become: ordinals to strings
+    table = None
+
+    # Whether the string is upper-cased
+    upper = False
+
+    # Whether the string is reversed
+    reverse = False
 
     def transform(self, vartok, token_stream):
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
+        return FusedTransform([type(self)]).transform(vartok, token_stream)
 
-            new_s = []
-            s = token.s
-            for line in s.splitlines(True):
-                line, ending = self.split_ending(line)
-                line = "xxx" + line + "xxx" + ending
-                new_s.append(line)
 
-            new_tokens.append(Token("".join(new_s)))
+class EmptyTransform(Transform):
+    name = "empty"
+    desc = "Returns empty strings."
+
+    def transform(self, vartok, token_stream):
+        return [Token("")]
+
+
+class DoubleTransform(CharTransform):
+    name = "double"
+    desc = "Doubles all vowels in a string."
+
+    table = {ord(c): c + c for c in "aeiouyAEIOUY"}
 
-        return new_tokens
+
+class XXXTransform(TextTransform):
+    name = "xxx"
+    desc = "Adds xxx before and after lines in a string."
+
+    def transform_text(self, s):
+        new_s = []
+        for line in s.splitlines(True):
+            line, ending = self.split_ending(line)
+            line = "xxx" + line + "xxx" + ending
+            new_s.append(line)
+
+        return "".join(new_s)
 
     def split_ending(self, s):
         ending = []
@@ -120,42 +273,34 @@ class XXXTransform(Transform):
         return "", "".join(ending)
 
 
-class HahaTransform(Transform):
+class HahaTransform(TextTransform):
     name = "haha"
     desc = "Adds haha! before sentences in a string."
 
-    def transform(self, vartok, token_stream):
+    def transform_text(self, s):
         haha = "Haha\u2757"
 
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
-
-            new_s = [haha + " "]
-
-            for i, c in enumerate(token.s):
-                if c in (".!?"):
-                    try:
-                        if token.s[i + 1] == " ":
-                            new_s.append(c)
-                            new_s.append(" ")
-                            new_s.append(haha)
-                            continue
-                    except IndexError:
-                        pass
-                if c == "\n":
-                    new_s.append(c)
-                    new_s.append(haha)
-                    new_s.append(" ")
-                    continue
+        new_s = [haha + " "]
 
+        for i, c in enumerate(s):
+            if c in (".!?"):
+                try:
+                    if s[i + 1] == " ":
+                        new_s.append(c)
+                        new_s.append(" ")
+                        new_s.append(haha)
+                        continue
+                except IndexError:
+                    pass
+            if c == "\n":
                 new_s.append(c)
+                new_s.append(haha)
+                new_s.append(" ")
+                continue
 
-            new_tokens.append(Token("".join(new_s)))
+            new_s.append(c)
 
-        return new_tokens
+        return "".join(new_s)
 
     def split_ending(self, s):
         ending = []
@@ -173,53 +318,26 @@ class AngleQuoteTransform(XXXTransform):
     name = "anglequote"
     desc = "Encloses string in unicode angle quotes."
 
-    def transform(self, vartok, token_stream):
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
-
-            s, ending = self.split_ending(token.s)
-            s = "\u00ab" + s + "\u00bb" + ending
-            new_tokens.append(Token(s))
-
-        return new_tokens
+    def transform_text(self, s):
+        s, ending = self.split_ending(s)
+        return "\u00ab" + s + "\u00bb" + ending
 
 
-class ShoutyTransform(Transform):
+class ShoutyTransform(CharTransform):
     name = "shouty"
     desc = "Translates into all caps."
 
-    def transform(self, vartok, token_stream):
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
-
-            new_tokens.append(Token(token.s.upper()))
-
-        return new_tokens
+    upper = True
 
 
-class ReverseTransform(Transform):
+class ReverseTransform(CharTransform):
     name = "reverse"
     desc = "Reverses strings for RTL."
 
-    def transform(self, vartok, token_stream):
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
-
-            new_tokens.append(Token(token.s[::-1]))
-
-        return new_tokens
+    reverse = True
 
 
-class DubstepTransform(Transform):
+class DubstepTransform(TextTransform):
     name = "dubstep"
     desc = "Translates into written form of dubstep."
 
@@ -238,49 +356,39 @@ class DubstepTransform(Transform):
 
         return "B" + ("W" * int(tl / 4)) + ("A" * int(tl / 3)) + ("a" * int(tl / 4))
 
-    def transform(self, vartok, token_stream):
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
-
-            new_string = []
-            current_string = []
-
-            for i, c in enumerate(token.s):
-                # print i, c, new_string, current_string
-                if c == " ":
-                    if i % 2:
-                        current_string.append(" ")
-                        current_string.append(self.bwaa("".join(current_string)))
+    def transform_text(self, s):
+        new_string = []
+        current_string = []
 
-                if c == "\n":
-                    new_string.append("".join(current_string))
-                    current_string = []
+        for i, c in enumerate(s):
+            # print i, c, new_string, current_string
+            if c == " ":
+                if i % 2:
+                    current_string.append(" ")
+                    current_string.append(self.bwaa("".join(current_string)))
 
-                elif c in (".!?"):
-                    try:
-                        if token.s[i + 1] == " ":
-                            new_string.append("".join(current_string))
-                            current_string = []
-                    except IndexError:
-                        pass
-
-                current_string.append(c)
-
-            if current_string:
+            if c == "\n":
                 new_string.append("".join(current_string))
+                current_string = []
 
-            new_string = " ".join(new_string)
-            new_string = new_string + " " + self.bwaa(new_string) + "\u2757"
+            elif c in (".!?"):
+                try:
+                    if s[i + 1] == " ":
+                        new_string.append("".join(current_string))
+                        current_string = []
+                except IndexError:
+                    pass
 
-            new_tokens.append(Token(new_string))
+            current_string.append(c)
 
-        return new_tokens
+        if current_string:
+            new_string.append("".join(current_string))
+
+        new_string = " ".join(new_string)
+        return new_string + " " + self.bwaa(new_string) + "\u2757"
 
 
-class ZombieTransform(Transform):
+class ZombieTransform(TextTransform):
     # Inspired by
     # http://forum.rpg.net/showthread.php?218042-Necro-Urban-Dead-The-zombie-speech-project/
     name = "zombie"
@@ -332,85 +440,95 @@ class ZombieTransform(Transform):
         new_string = new_string.replace("!", "\u2757")
         return new_string
 
-    def transform(self, vartok, token_stream):
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
+    def transform_text(self, s):
+        new_string = self.zombie_transform(s)
+        if new_string.strip():
+            new_string = new_string + " " + self.last_bit(new_string)
+            new_string = new_string.strip()
+        return new_string
 
-            new_string = []
 
-            for i, part in enumerate(vartok.tokenize(token.s)):
-                if i % 2 == 0 and token.s.strip():
-                    part = self.zombie_transform(part)
-                new_string.append(part)
+class RedactedTransform(CharTransform):
+    name = "redacted"
+    desc = "Redacts everything."
 
-            new_string = "".join(new_string)
-            if new_string.strip():
-                new_string = new_string + " " + self.last_bit(new_string)
-                new_string = new_string.strip()
-            new_tokens.append(Token(new_string))
+    table = {ord(c): "X" for c in string.ascii_uppercase}
+    table.update({ord(c): "x" for c in string.ascii_lowercase})
 
-        return new_tokens
 
+# Characters that are part of a word for PirateTransform
+PIRATE_WORD_CHAR = "[A-Za-z']"
 
-class RedactedTransform(Transform):
-    name = "redacted"
-    desc = "Redacts everything."
 
-    def transform(self, vartok, token_stream):
-        redact_map = {c: "X" for c in string.ascii_uppercase}
-        redact_map.update({c: "x" for c in string.ascii_lowercase})
+def compile_pirate_rules(rules):
+    """Compiles PirateTransform rules into one regular expression
 
-        new_tokens = []
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
+    Rules are alternatives in the order of rules, so the first rule that
+    matches at a position wins. Every match ends in a word character, so
+    a position is in a word exactly when the character before it is a
+    word character and that's checked with a lookbehind. The lookbehind
+    goes after the first character of the match so the regular expression
+    engine can skip ahead to characters a match can start with. The rest
+    of the match is a group, so ``match.lastindex - 1`` is the index of
+    the rule that matched.
 
-            new_s = [redact_map.get(c, c) for c in token.s]
-            new_tokens.append(Token("".join(new_s)))
+    :arg rules: tuples like :py:attr:`PirateTransform.TRANSFORM`
 
-        return new_tokens
+    :returns: compiled regular expression
 
+    """
+    alternatives = []
+    for in_word, not_in_word, match, wc, nw, _ in rules:
+        if not re.fullmatch(f".*{PIRATE_WORD_CHAR}", match):
+            raise ValueError(f"{match!r} doesn't end in a word character")
 
-class PirateTransform(Transform):
-    name = "pirate"
-    desc = "Translates text into Pirate!"
+        if in_word and not_in_word:
+            before = ""
+        elif in_word:
+            before = f"(?<={PIRATE_WORD_CHAR}.)"
+        elif not_in_word and not match.startswith((".", "!", "?")):
+            before = f"(?<!{PIRATE_WORD_CHAR}.)"
+        else:
+            # This rule never matches, but it still needs its group
+            before = "(?!)"
+
+        if wc and nw:
+            after = "(?!)"
+        elif wc:
+            after = f"(?={PIRATE_WORD_CHAR})"
+        elif nw:
+            # The end of the string counts as not a word character
+            after = f"(?!{PIRATE_WORD_CHAR})"
+        else:
+            after = "(?=.)"
 
-    def transform(self, vartok, token_stream):
-        new_tokens = []
+        first, rest = re.escape(match[0]), re.escape(match[1:])
+        alternatives.append(f"{first}{before}({rest}){after}")
+    return re.compile("|".join(alternatives), re.DOTALL)
 
-        for token in token_stream:
-            if not token.mutable:
-                new_tokens.append(token)
-                continue
 
-            out = ""
-            for i, part in enumerate(vartok.tokenize(token.s)):
-                if i % 2 == 0:
-                    out += self.pirate_transform(part)
-                else:
-                    out += part
+class PirateTransform(TextTransform):
+    name = "pirate"
+    desc = "Translates text into Pirate!"
 
-            # Add color which causes every string to be longer, but
-            # only if the string isn't entirely whitespace.
-            if not self.is_whitespace(out):
-                s, ending = self.split_ending(out)
-                out = s + " " + self.COLOR[len(out) % len(self.COLOR)] + ending
+    def transform_text(self, s):
+        out = self.pirate_transform(s)
 
-                # This guarantees that every string has at least one
-                # unicode charater
-                if "!" not in out:
-                    out = out + "!"
+        # Add color which causes every string to be longer, but
+        # only if the string isn't entirely whitespace.
+        if not self.is_whitespace(out):
+            s, ending = self.split_ending(out)
+            out = s + " " + self.COLOR[len(out) % len(self.COLOR)] + ending
 
-                # Replace all ! with related unicode character.
-                out = out.replace("!", "\u2757")
+            # This guarantees that every string has at least one
+            # unicode charater
+            if "!" not in out:
+                out = out + "!"
 
-            new_tokens.append(Token(out))
+            # Replace all ! with related unicode character.
+            out = out.replace("!", "\u2757")
 
-        return new_tokens
+        return out
 
     COLOR = [
         "arr!",
@@ -428,12 +546,6 @@ class PirateTransform(Transform):
         "prepare to be boarded!",
     ]
 
-    def wc(self, c):
-        return c == "'" or c in string.ascii_letters
-
-    def nwc(self, c):
-        return not self.wc(c)
-
     def is_whitespace(self, s):
         return re.match("^\\s*$", s) is not None
 
@@ -491,6 +603,8 @@ class PirateTransform(Transform):
         (True, False, "w", False, True, "ww"),
     )
 
+    TRANSFORM_RE = compile_pirate_rules(TRANSFORM)
+
     def split_ending(self, s):
         ending = []
         while s:
@@ -510,72 +624,10 @@ class PirateTransform(Transform):
         :returns: Piratized token
 
         """
-        out = []
-
-        in_word = False  # in a word?
-
-        # TODO: This is awful--better to do a real lexer
-        while s:
-            if s.startswith((".", "!", "?")):
-                in_word = False
-                out.append(s[0])
-                s = s[1:]
-                continue
-
-            debug(s, in_word)
-
-            for mem in self.TRANSFORM:
-                # Match inside a word? (Not a prefix.)
-                if in_word and not mem[0]:
-                    debug(mem, "not in word")
-                    continue
-
-                # Not match inside a word? (Prefix.)
-                if not in_word and not mem[1]:
-                    debug(mem, "in word")
-                    continue
-
-                if not s.startswith(mem[2]):
-                    debug(mem, "not match")
-                    continue
+        return self.TRANSFORM_RE.sub(self.replace_match, s)
 
-                # Check the character after the match to see if it's a
-                # word character and whether this match covers that.
-                try:
-                    # WC: word character
-                    if mem[3] and not self.wc(s[len(mem[2])]):
-                        debug(mem, "not wc")
-                        continue
-                except IndexError:
-                    # We don't count EOS as a word character.
-                    if mem[3]:
-                        debug(mem, "not wc")
-                        continue
-
-                # Check the character after the match to see if it's not a
-                # word character and whether this match covers that.
-                try:
-                    # NW: not word character
-                    if mem[4] and not self.nwc(s[len(mem[2])]):
-                        debug(mem, "wc")
-                        continue
-                except IndexError:
-                    # We count EOS as a non-word character.
-                    if not mem[4]:
-                        debug(mem, "wc")
-                        continue
-
-                out.append(mem[5])
-                s = s[len(mem[2]) :]
-                in_word = True
-                break
-
-            else:
-                in_word = self.wc(s[0])
-                out.append(s[0])
-                s = s[1:]
-
-        return "".join(out)
+    def replace_match(self, match):
+        return self.TRANSFORM[match.lastindex - 1][5]
 
 
 def collapse_whitespace(text):
@@ -586,25 +638,41 @@ class HTMLExtractorTransform(HTMLParser, Transform):
     name = "html"
     desc = "Tokenizes HTML bits so only text is translated."
 
-    def __init__(self):
-        HTMLParser.__init__(self)
+    def reset(self):
+        # HTMLParser.__init__ calls this, too
+        HTMLParser.reset(self)
         self.new_tokens = []
         self.immutable_data_section = None
 
     def transform(self, vartok, token_stream):
         out = []
 
-        for token in token_stream:
-            if not token.mutable:
-                out.append(token)
+        for run in iter_runs(token_stream):
+            if isinstance(run, Token):
+                out.append(run)
                 continue
 
-            if token.s:
-                self.feed(token.s)
-                out.extend(self.new_tokens)
-                self.new_tokens = []
+            # Variables in the HTML are parsed as placeholders and put
+            # back in the tokens they end up in
+            text, variables = mask_variables(run)
+            if not text:
+                out.extend(run)
+                continue
+
+            self.feed(text)
+            if variables:
+                variables = iter(variables)
+                for token in self.new_tokens:
+                    if token.mutable:
+                        out.extend(unmask_variables(token.s, variables))
+                    else:
+                        token.s = PLACEHOLDER_RE.sub(
+                            lambda match: next(variables, ""), token.s
+                        )
+                        out.append(token)
             else:
-                out.append(token)
+                out.extend(self.new_tokens)
+            self.new_tokens = []
 
         return out
 
@@ -667,6 +735,173 @@ def get_available_pipeline_parts():
     return pipeline_parts
 
 
+def merge_tables(first, second):
+    """Returns a str.translate table that does first and then second"""
+    merged = {}
+    for ordinal in set(first) | set(second):
+        s = first.get(ordinal, chr(ordinal))
+        s = "".join(second.get(ord(c), c) for c in s)
+        if s != chr(ordinal):
+            merged[ordinal] = s
+    return merged
+
+
+def reverse_string(s):
+    return s[::-1]
+
+
+def replace_chars(replacements):
+    """Returns a function that does each ``(old, new)`` str.replace"""
+
+    def _replace_chars(s):
+        for old, new in replacements:
+            s = s.replace(old, new)
+        return s
+
+    return _replace_chars
+
+
+def compile_table(table):
+    """Returns functions that translate strings with a str.translate table
+
+    str.translate is slow when characters become more than one character,
+    so those are done with str.replace. Characters are replaced in layers
+    where no replacement has a character that's replaced in a later layer,
+    so nothing is replaced twice.
+
+    """
+    funcs = []
+    remaining = dict(table)
+    while remaining:
+        layer = {
+            ordinal: s
+            for ordinal, s in remaining.items()
+            if not any(ord(c) in remaining and ord(c) != ordinal for c in s)
+        }
+        if not layer:
+            # Replacements depend on each other, so they have to be done
+            # all at once
+            return [operator.methodcaller("translate", table)]
+
+        single = {ordinal: s for ordinal, s in layer.items() if len(s) == 1}
+        if single:
+            funcs.append(operator.methodcaller("translate", single))
+        multi = [(chr(ordinal), s) for ordinal, s in layer.items() if len(s) != 1]
+        if multi:
+            funcs.append(replace_chars(multi))
+
+        for ordinal in layer:
+            del remaining[ordinal]
+    return funcs
+
+
+@functools.lru_cache(maxsize=None)
+def compile_char_transforms(part_classes):
+    """Compiles a run of CharTransform classes into string functions
+
+    Tables next to each other are merged into one table. Reversing is
+    moved past tables, so it's only done once at the end unless it has
+    to happen before upper-casing.
+
+    :arg part_classes: tuple of CharTransform classes in pipeline order
+
+    :returns: tuple of functions that take a string and return the
+        transformed string; calling them in order is the same as applying
+        each of the transforms in turn
+
+    """
+    steps = []
+    reverse = False
+    for part_class in part_classes:
+        if part_class.table is not None:
+            table = part_class.table
+            if reverse:
+                # Translating a reversed string is the same as reversing
+                # the string translated with reversed replacements
+                table = {ordinal: s[::-1] for ordinal, s in table.items()}
+            if steps and isinstance(steps[-1], dict):
+                steps[-1] = merge_tables(steps[-1], table)
+            else:
+                steps.append(table)
+        if part_class.upper:
+            if reverse:
+                # Some characters upper-case to several characters, so
+                # reversing has to happen first
+                steps.append(reverse_string)
+                reverse = False
+            steps.append(str.upper)
+        if part_class.reverse:
+            reverse = not reverse
+    if reverse:
+        steps.append(reverse_string)
+
+    funcs = []
+    for step in steps:
+        if isinstance(step, dict):
+            funcs.extend(compile_table(step))
+        else:
+            funcs.append(step)
+    return tuple(funcs)
+
+
+class FusedTransform(Transform):
+    """Applies a run of CharTransforms in as few passes as possible
+
+    :arg part_classes: the CharTransform classes in pipeline order
+
+    """
+
+    def __init__(self, part_classes):
+        self.funcs = compile_char_transforms(tuple(part_classes))
+        self.reverse = sum(part_class.reverse for part_class in part_classes) % 2 == 1
+
+    def transform(self, vartok, token_stream):
+        if self.reverse:
+            # Variables aren't reversed, but they move with the text
+            runs = iter_runs(token_stream)
+            token_stream = []
+            for run in runs:
+                if isinstance(run, Token):
+                    token_stream.append(run)
+                else:
+                    token_stream.extend(reversed(run))
+
+        new_tokens = []
+        for token in token_stream:
+            if not token.mutable:
+                new_tokens.append(token)
+                continue
+
+            s = token.s
+            for func in self.funcs:
+                s = func(s)
+            new_tokens.append(Token(s))
+
+        return new_tokens
+
+
+def fuse_pipeline(pipeline):
+    """Replaces runs of CharTransforms in pipeline with FusedTransforms
+
+    :arg pipeline: list of Transform classes
+
+    :returns: list of callables that return the transforms
+
+    """
+    fused = []
+    run = []
+    for part_class in pipeline + [None]:
+        if part_class is not None and issubclass(part_class, CharTransform):
+            run.append(part_class)
+            continue
+        if run:
+            fused.append(functools.partial(FusedTransform, tuple(run)))
+            run = []
+        if part_class is not None:
+            fused.append(part_class)
+    return fused
+
+
 class InvalidPipeline(Exception):
     """Raised when the pipeline spec contains invalid parts"""
 
@@ -686,26 +921,75 @@ def convert_pipeline(pipeline_spec):
 
 
 class Translator:
-    """Translates a string using the specified pipeline"""
+    """Translates a string using the specified pipeline
+
+    The transforms in the pipeline are created once and reused for every
+    string, so a Translator shouldn't be used by several threads at the
+    same time. All the pipeline parts give the same translation for the
+    same string, so translations can be cached.
+
+    """
 
-    def __init__(self, variable_formats, pipeline_spec):
+    def __init__(self, variable_formats, pipeline_spec, cache=None):
+        """
+        :arg variable_formats: list of variable formats
+        :arg pipeline_spec: list of pipeline part names
+        :arg cache: optional :py:class:`dennis.tools.LRUCache` of
+            translated strings, so strings that are the same are only
+            translated once; it can be shared between Translators since
+            the keys include the pipeline and variable formats
+
+        """
         self.vartok = VariableTokenizer(variable_formats)
         self.pipeline_spec = pipeline_spec
-        self._pipeline = convert_pipeline(self.pipeline_spec)
+        # Runs of CharTransforms are applied together in one pass
+        self._pipeline = [
+            part_class()
+            for part_class in fuse_pipeline(convert_pipeline(self.pipeline_spec))
+        ]
+        self.cache = cache
+        self.cache_config = (
+            tuple(self.pipeline_spec),
+            tuple(fmt.name for fmt in self.vartok.formats),
+        )
 
     def translate_string(self, s):
         """Translates string s and returns the new string"""
-        # Create the initial token
-        tokens = [Token(s)]
+        if self.cache is None:
+            return self._translate_string(s)
+
+        key = (self.cache_config, s)
+        translated = self.cache.get(key)
+        if translated is None:
+            translated = self._translate_string(s)
+            self.cache.set(key, translated)
+        return translated
+
+    def _translate_string(self, s):
+        # Create the initial tokens with the variables split out, so
+        # transforms don't change them
+        tokens = tokenize_variables(self.vartok, [Token(s)])
 
         # Pass the token list through the pipeline
-        for part_class in self._pipeline:
-            part = part_class()
+        for part in self._pipeline:
+            part.reset()
             tokens = part.transform(self.vartok, tokens)
 
         # Join all the bits together
         return "".join([token.s for token in tokens])
 
+    def translate_strings(self, strings):
+        """Translates each string in strings
+
+        :arg strings: iterable of strings
+
+        :returns: generator of the translated strings in the same order
+
+        """
+        translate_string = self.translate_string
+        for s in strings:
+            yield translate_string(s)
+
     def translate_file(self, fname):
         """Translates the po file at fname
 
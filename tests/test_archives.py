@@ -0,0 +1,104 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from dennis.archives import (
+    abspath,
+    is_member,
+    list_members,
+    read_member,
+    split_member,
+)
+from dennis.poreader import read_pofile
+from tests import build_po_string
+
+PO_DATA = build_po_string('msgid "Foo"\nmsgstr "Oof"\n').encode("utf-8")
+
+MEMBERS = {
+    "de/LC_MESSAGES/messages.po": PO_DATA,
+    "fr/LC_MESSAGES/messages.po": PO_DATA.replace(b"Oof", b"Foo!"),
+    "README": b"not a catalog",
+}
+
+
+def build_zip(path):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in MEMBERS.items():
+            zf.writestr(name, data)
+    return str(path)
+
+
+def build_tar(path, mode="w"):
+    with tarfile.open(path, mode) as tf:
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+@pytest.fixture(params=["bundle.zip", "bundle.tar", "bundle.tar.gz", "bundle.tar.xz"])
+def archive(request, tmp_path):
+    fn = tmp_path / request.param
+    if request.param.endswith(".zip"):
+        return build_zip(fn)
+    return build_tar(fn, "w:" + {"tar": "", "gz": "gz", "xz": "xz"}[fn.suffix[1:]])
+
+
+class TestArchives:
+    def test_list_members(self, archive):
+        assert list_members(archive, (".po",)) == [
+            archive + "!de/LC_MESSAGES/messages.po",
+            archive + "!fr/LC_MESSAGES/messages.po",
+        ]
+
+    def test_read_member(self, archive):
+        for name, data in MEMBERS.items():
+            assert read_member(archive + "!" + name) == data
+
+        # Members can be read in any order
+        assert read_member(archive + "!de/LC_MESSAGES/messages.po") == PO_DATA
+
+        with pytest.raises(IOError, match="doesn't have"):
+            read_member(archive + "!es/LC_MESSAGES/messages.po")
+
+    def test_read_pofile(self, archive):
+        fn = archive + "!fr/LC_MESSAGES/messages.po"
+        po = read_pofile(fn)
+        assert po[0].msgstr == "Foo!"
+        assert po[0].original == 'msgid "Foo"\nmsgstr "Foo!"\n'
+
+    def test_changed(self, tmp_path):
+        fn = build_zip(tmp_path / "bundle.zip")
+        member = fn + "!de/LC_MESSAGES/messages.po"
+        assert read_member(member) == PO_DATA
+
+        # The archive is opened again if it changed
+        with zipfile.ZipFile(fn, "w") as zf:
+            zf.writestr("de/LC_MESSAGES/messages.po", b"changed")
+        assert read_member(member) == b"changed"
+
+    def test_invalid(self, tmp_path):
+        fn = tmp_path / "bundle.zip"
+        fn.write_bytes(b"not an archive")
+        with pytest.raises(IOError, match="Invalid archive"):
+            list_members(str(fn), (".po",))
+
+
+def test_split_member(tmp_path):
+    fn = build_zip(tmp_path / "a!b.zip")
+    assert split_member(fn + "!de/messages.po") == (fn, "de/messages.po")
+    assert split_member(str(tmp_path / "missing.zip!de/messages.po")) is None
+    assert split_member('msgid "Hi!"\nmsgstr "Hallo!"\n') is None
+    assert not is_member(fn)
+
+
+def test_abspath(tmp_path, monkeypatch):
+    build_zip(tmp_path / "bundle.zip")
+    monkeypatch.chdir(tmp_path)
+    assert abspath("bundle.zip!de//messages.po") == (
+        str(tmp_path / "bundle.zip") + "!de//messages.po"
+    )
+    assert abspath("messages.po") == str(tmp_path / "messages.po")
@@ -0,0 +1,404 @@
+import gzip
+import os
+import pickle
+
+from dennis import cache, poreader
+from dennis.cache import (
+    CatalogCache,
+    DiskCache,
+    EntryCache,
+    EntryIndex,
+    LintCache,
+    PotIndex,
+)
+from dennis.linter import Linter
+from tests import build_po_string
+
+
+class TestDiskCache:
+    def test_get_set(self, tmpdir):
+        cache = DiskCache(str(tmpdir))
+        assert cache.get("abc") is None
+        cache.set("abc", [1, 2, 3])
+        assert cache.get("abc") == [1, 2, 3]
+
+    def test_corrupt(self, tmpdir):
+        cache = DiskCache(str(tmpdir))
+        tmpdir.join("abc.pickle").write("not a pickle")
+        assert cache.get("abc") is None
+
+    def test_evict_lru(self, tmpdir):
+        cache = DiskCache(str(tmpdir), max_size=1)
+        cache.set("old", "x" * 100)
+        cache.set("new", "x" * 100)
+        size = os.path.getsize(cache.path("new"))
+        os.utime(cache.path("old"), (1000, 1000))
+
+        cache.max_size = size
+        cache.evict()
+        assert cache.get("old") is None
+        assert cache.get("new") == "x" * 100
+
+
+class TestLintCache:
+    def test_key(self, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(build_po_string('msgid "Foo"\nmsgstr "Oof"\n'))
+
+        cache = LintCache(str(tmpdir.join("cache")))
+        linter = Linter(["python-format"], ["E201", "W202"])
+        key = cache.key(str(fn), linter)
+        assert key == cache.key(str(fn), linter)
+
+        # Different rules is a different key
+        assert key != cache.key(str(fn), Linter(["python-format"], ["E201"]))
+
+        # Different varformat is a different key
+        assert key != cache.key(str(fn), Linter(["python-brace-format"], ["E201"]))
+
+        # Different contents is a different key
+        fn.write(build_po_string('msgid "Foo"\nmsgstr "Bar"\n'))
+        assert key != cache.key(str(fn), linter)
+
+
+class TestCatalogCache:
+    po_data = build_po_string(
+        "#: foo.py:1\n"
+        'msgid "Foo %(foo)s"\n'
+        'msgstr "Oof %(foo)s"\n'
+        "\n"
+        "#, fuzzy\n"
+        'msgid "Bar"\n'
+        'msgstr "Rab"\n'
+    )
+
+    fields = ("msgid", "msgstr", "flags", "occurrences", "linenum", "original")
+
+    def dont_parse(self, monkeypatch):
+        def parse_pofile(fn):
+            raise AssertionError("file should not have been parsed")
+
+        monkeypatch.setattr(cache, "parse_pofile", parse_pofile)
+
+    def test_parse(self, tmpdir, monkeypatch):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        catalog_cache = CatalogCache(str(tmpdir.join("cache")))
+
+        po = catalog_cache.parse(str(fn))
+
+        # The second time it's loaded from the snapshot
+        self.dont_parse(monkeypatch)
+        snapshot_po = catalog_cache.parse(str(fn))
+        assert snapshot_po.metadata == po.metadata
+        assert len(snapshot_po) == 2
+        for entry, expected in zip(snapshot_po, po):
+            for field in self.fields:
+                assert getattr(entry, field) == getattr(expected, field)
+        assert snapshot_po.fuzzy_entries()[0].msgid == "Bar"
+
+    def test_compressed(self, tmpdir, monkeypatch):
+        fn = tmpdir.join("messages.po.gz")
+        fn.write_binary(gzip.compress(self.po_data.encode("utf-8")))
+        catalog_cache = CatalogCache(str(tmpdir.join("cache")))
+        po = catalog_cache.parse(str(fn))
+
+        # Compressed files can't be read from the middle, so the blocks
+        # are in the snapshot
+        def open_pofile(fn):
+            raise AssertionError("file should not have been opened")
+
+        self.dont_parse(monkeypatch)
+        monkeypatch.setattr(poreader, "open_pofile", open_pofile)
+        snapshot_po = catalog_cache.parse(str(fn))
+        assert [entry.original for entry in snapshot_po] == [
+            entry.original for entry in po
+        ]
+
+    def test_touched(self, tmpdir, monkeypatch):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        catalog_cache = CatalogCache(str(tmpdir.join("cache")))
+        catalog_cache.parse(str(fn))
+
+        # Same contents with a different mtime
+        stat = os.stat(str(fn))
+        os.utime(str(fn), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.dont_parse(monkeypatch)
+        assert len(catalog_cache.parse(str(fn))) == 2
+
+        snapshot = catalog_cache.get(catalog_cache.key(str(fn)))
+        assert snapshot["mtime"] == stat.st_mtime_ns + 10**9
+
+    def test_racy_same_mtime(self, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        catalog_cache = CatalogCache(str(tmpdir.join("cache")))
+        catalog_cache.parse(str(fn))
+
+        # Changed right after it was read, on a filesystem where that
+        # doesn't change the mtime
+        stat = os.stat(str(fn))
+        fn.write(self.po_data.replace("Rab", "Raa"))
+        os.utime(str(fn), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        po = catalog_cache.parse(str(fn))
+        assert po[1].msgstr == "Raa"
+
+    def test_not_racy(self, tmpdir, monkeypatch):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        stat = os.stat(str(fn))
+        os.utime(str(fn), ns=(stat.st_atime_ns, stat.st_mtime_ns - 60 * 10**9))
+        catalog_cache = CatalogCache(str(tmpdir.join("cache")))
+        catalog_cache.parse(str(fn))
+
+        # The file was last modified well before it was read, so the
+        # snapshot is used without hashing the file
+        def file_hash(fn):
+            raise AssertionError("file should not have been hashed")
+
+        monkeypatch.setattr(catalog_cache, "file_hash", file_hash)
+        self.dont_parse(monkeypatch)
+        assert len(catalog_cache.parse(str(fn))) == 2
+
+    def test_changed(self, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        catalog_cache = CatalogCache(str(tmpdir.join("cache")))
+        catalog_cache.parse(str(fn))
+
+        fn.write(self.po_data + '\nmsgid "Baz"\nmsgstr "Zab"\n')
+        po = catalog_cache.parse(str(fn))
+        assert [entry.msgid for entry in po] == ["Foo %(foo)s", "Bar", "Baz"]
+        assert len(catalog_cache.parse(str(fn))) == 3
+
+
+class TestEntryCache:
+    def test_save_load(self, tmpdir):
+        path = str(tmpdir.join("entries.pickle"))
+        cache = EntryCache()
+        cache.set(("key",), [("err", 0, "E201", "invalid variables: %(bar)s")])
+        cache.save(path)
+
+        new_cache = EntryCache()
+        new_cache.load(path)
+        assert new_cache.get(("key",)) == [
+            ("err", 0, "E201", "invalid variables: %(bar)s")
+        ]
+        assert new_cache.pop_added() == []
+
+    def test_load_missing(self, tmpdir):
+        cache = EntryCache()
+        cache.load(str(tmpdir.join("missing.pickle")))
+        assert len(cache) == 0
+
+    def test_added_not_tracked(self):
+        cache = EntryCache(maxsize=10)
+        for i in range(5000):
+            cache.set(("key", i), [])
+        assert len(cache) == 10
+        assert cache.added == []
+        assert cache.pop_added() == []
+
+    def test_pop_added(self):
+        cache = EntryCache(maxsize=2, track_added=True)
+        cache.set("a", [])
+        cache.set("b", [])
+        cache.set("c", [])
+        assert "a" not in cache
+        assert cache.pop_added() == [("a", []), ("b", []), ("c", [])]
+        assert cache.pop_added() == []
+
+
+POT = build_po_string(
+    'msgid "<b>Foo %(foo)s</b>"\n'
+    'msgstr ""\n'
+    "\n"
+    'msgid "{n} apple"\n'
+    'msgid_plural "{n} apples"\n'
+    'msgstr[0] ""\n'
+    'msgstr[1] ""\n'
+)
+
+
+# Things pickles planted next to catalogs got to run
+RAN = []
+
+
+def run_code():
+    RAN.append(True)
+
+
+class PlantedPickle:
+    def __reduce__(self):
+        return (run_code, ())
+
+
+class TestPotIndex:
+    def test_build(self, tmpdir):
+        pot = tmpdir.join("messages.pot")
+        pot.write(POT)
+
+        items = dict(PotIndex(str(pot)).build(["python-format"]))
+        assert items[("tokens", "<b>Foo %(foo)s</b>", True)] == {"%(foo)s"}
+        assert items[("names", "<b>Foo %(foo)s</b>", True)] == ["foo"]
+        assert [token.s for token in items[("html", "<b>Foo %(foo)s</b>")]] == [
+            "</b>",
+            "<b>",
+        ]
+        assert items[("tokens", "{n} apple {n} apples", True)] == set()
+
+    def test_get_items(self, tmpdir, monkeypatch):
+        pot = tmpdir.join("messages.pot")
+        pot.write(POT)
+        index = PotIndex(str(pot))
+
+        items = index.get_items(["python-format"])
+        assert os.path.exists(str(pot) + ".dennis-index")
+
+        # The second time it's loaded from the index file
+        def build(self, varformats):
+            raise AssertionError("index should not have been rebuilt")
+
+        monkeypatch.setattr(PotIndex, "build", build)
+        assert index.get_items(["python-format"]) == items
+
+    def test_html_items(self, tmpdir):
+        pot = tmpdir.join("messages.pot")
+        pot.write(POT)
+        index = PotIndex(str(pot))
+        fingerprint = index.fingerprint(["python-format"])
+        items = index.build(["python-format"])
+        index.save(fingerprint, items)
+        assert index.load(fingerprint) == items
+
+    def test_not_pickle(self, tmpdir):
+        pot = tmpdir.join("messages.pot")
+        pot.write(POT)
+        index = PotIndex(str(pot))
+        with open(index.path, "wb") as fp:
+            pickle.dump(PlantedPickle(), fp)
+
+        assert index.load(index.fingerprint(["python-format"])) is None
+        assert RAN == []
+
+    def test_stale(self, tmpdir):
+        pot = tmpdir.join("messages.pot")
+        pot.write(POT)
+        index = PotIndex(str(pot))
+        fingerprint = index.fingerprint(["python-format"])
+        index.save(fingerprint, [])
+
+        assert index.load(fingerprint) == []
+        assert index.load(index.fingerprint(["python-brace-format"])) is None
+
+        pot.write(POT + '\nmsgid "Bar"\nmsgstr ""\n')
+        assert index.load(index.fingerprint(["python-format"])) is None
+
+        # Same contents is the same fingerprint
+        pot.write(POT)
+        assert index.load(index.fingerprint(["python-format"])) == []
+
+
+class TestEntryIndex:
+    po_data = build_po_string(
+        'msgid "Foo"\n'
+        'msgstr "Oof"\n'
+        "\n"
+        "#: foo.py:1\n"
+        'msgid "Bar"\n'
+        'msgstr "Rab"\n'
+        "\n"
+        "\n"
+        'msgid "Baz"\n'
+        'msgstr "Zab"\n'
+    )
+
+    def test_build(self, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        index = EntryIndex(str(fn))
+        index.load_or_build()
+
+        assert len(index) == 3
+        assert list(index.linenums) == [15, 18, 23]
+        assert index.find_line(1) == 0
+        assert index.find_line(20) == 1
+        assert index.find_line(30) == 2
+
+        entries = list(index.iter_entries(1, 2))
+        assert [entry.msgid for entry in entries] == ["Bar"]
+        assert entries[0].linenum == 18
+        assert entries[0].original == ('#: foo.py:1\nmsgid "Bar"\nmsgstr "Rab"\n')
+
+        assert [entry.msgid for entry in index.iter_lines(19, 23)] == ["Bar", "Baz"]
+        assert list(index.iter_lines(1, 10)) == []
+
+    def test_load_or_build(self, tmpdir, monkeypatch):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        EntryIndex(str(fn)).load_or_build()
+        assert os.path.exists(str(fn) + ".dennis-entries")
+
+        # The second time it's loaded from the index file
+        def build(self, fingerprint):
+            raise AssertionError("index should not have been rebuilt")
+
+        monkeypatch.setattr(EntryIndex, "build", build)
+        index = EntryIndex(str(fn))
+        index.load_or_build()
+        assert list(index.linenums) == [15, 18, 23]
+
+    def test_changed_same_size_and_mtime(self, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        EntryIndex(str(fn)).load_or_build()
+
+        # Changed right after it was indexed without changing the size,
+        # on a filesystem where that doesn't change the mtime
+        stat = os.stat(str(fn))
+        fn.write(self.po_data.replace('"Oof"\n\n#: foo.py:1', '"Oof"\n#: foo.py:1\n'))
+        os.utime(str(fn), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert os.stat(str(fn)).st_size == stat.st_size
+
+        index = EntryIndex(str(fn))
+        assert not index.load(index.fingerprint())
+        index.load_or_build()
+        assert list(index.linenums) == [15, 17, 23]
+        assert [entry.msgid for entry in index.iter_entries(1, 2)] == ["Bar"]
+
+    def test_not_racy(self, tmpdir, monkeypatch):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        stat = os.stat(str(fn))
+        os.utime(str(fn), ns=(stat.st_atime_ns, stat.st_mtime_ns - 60 * 10**9))
+        EntryIndex(str(fn)).load_or_build()
+
+        # The file was last modified well before it was indexed, so the
+        # index is used without hashing the file
+        def file_digest(fn):
+            raise AssertionError("file should not have been hashed")
+
+        monkeypatch.setattr(cache, "file_digest", file_digest)
+        index = EntryIndex(str(fn))
+        assert index.load(index.fingerprint())
+
+    def test_not_pickle(self, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        index = EntryIndex(str(fn))
+        with open(index.path, "wb") as fp:
+            pickle.dump(PlantedPickle(), fp)
+
+        assert not index.load(index.fingerprint())
+        assert RAN == []
+
+    def test_stale(self, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(self.po_data)
+        index = EntryIndex(str(fn))
+        index.load_or_build()
+        assert index.load(index.fingerprint())
+
+        fn.write(self.po_data + '\nmsgid "Qux"\nmsgstr "Xuq"\n')
+        assert not index.load(index.fingerprint())
@@ -1,9 +1,18 @@
+import gzip
+import io
+import json
+import lzma
+import pathlib
+import tarfile
+import zipfile
 from textwrap import dedent
 
 from click.testing import CliRunner
+import polib
 import pytest
 
 from dennis.cmdline import cli
+from dennis.linter import Linter
 from tests import build_po_string, nix_header
 
 
@@ -60,6 +69,71 @@ class TestStatus:
         assert pairs["Total translateable words"] == "3"
         assert pairs["Percentage"] == "100% COMPLETE!"
 
+    def test_status_cache(self, runner, tmpdir):
+        po_file = build_po_string(
+            "#: foo/foo.py:5\n"
+            'msgid "Foo bar baz"\n'
+            'msgstr ""\n'
+            "\n"
+            'msgid "Bar"\n'
+            'msgstr "Rab"\n'
+        )
+        fn = tmpdir.join("messages.po")
+        fn.write(po_file)
+        cache_dir = tmpdir.join("cache")
+
+        expected = runner.invoke(cli, ("status", "--showuntranslated", str(fn)))
+        for _ in range(2):
+            result = runner.invoke(
+                cli,
+                (
+                    "status",
+                    "--showuntranslated",
+                    "--cache-dir",
+                    str(cache_dir),
+                    str(fn),
+                ),
+            )
+            assert result.exit_code == 0
+            assert result.output == expected.output
+        assert len(cache_dir.join("catalogs").listdir()) == 1
+
+    def test_status_archive(self, runner, tmpdir):
+        po_file = build_po_string(
+            "#: foo/foo.py:5\n" 'msgid "Foo bar baz"\n' 'msgstr "Feh"\n'
+        )
+        fn = str(tmpdir.join("bundle.tar.gz"))
+        with tarfile.open(fn, "w:gz") as tf:
+            info = tarfile.TarInfo("de/LC_MESSAGES/messages.po")
+            info.size = len(po_file)
+            tf.addfile(info, io.BytesIO(po_file.encode("utf-8")))
+
+        result = runner.invoke(cli, ("status", fn))
+        assert result.exit_code == 0
+        assert f">>> Working on: {fn}!de/LC_MESSAGES/messages.po" in result.output
+        pairs = build_key_val(result.output)
+        assert pairs["Percentage"] == "100% COMPLETE!"
+
+    def test_status_exclude(self, runner, tmpdir):
+        po_file = build_po_string('msgid "Foo"\nmsgstr "Oof"\n')
+        for name in ("de", "fr", "build/de"):
+            tmpdir.join(name, "messages.po").write(po_file, ensure=True)
+        tmpdir.join(".gitignore").write("build/\n")
+
+        result = runner.invoke(
+            cli, ("status", "--exclude", "fr", "--gitignore", str(tmpdir))
+        )
+        assert result.exit_code == 0
+        assert [line for line in result.output.splitlines() if "Working" in line] == [
+            f">>> Working on: {tmpdir.join('de', 'messages.po')}"
+        ]
+
+    def test_status_nonexistent_file(self, runner, tmpdir):
+        fn = tmpdir.join("missing.po")
+        result = runner.invoke(cli, ("status", str(fn)))
+        assert result.exit_code == 2
+        assert f'File "{fn}" does not exist.' in result.output
+
     # FIXME: test --showuntranslated on .po file
 
     # FIXME: test --showfuzzy on .po file
@@ -136,16 +210,45 @@ class TestTranslate:
         result = runner.invoke(cli, ("translate", "-p", "shouty", str(fn)))
         assert result.exit_code == 0
         pot_file = nix_header(fn.read())
-        # FIXME: This has the wrong variables, too. We need to fix that, too.
         assert pot_file == dedent("""\
             #: test_project/base/views.py:12 test_project/base/views.py:22
             #, python-format
             msgid "%(num)s apple"
             msgid_plural "%(num)s apples"
-            msgstr[0] "%(NUM)S APPLE"
-            msgstr[1] "%(NUM)S APPLES"
+            msgstr[0] "%(num)s APPLE"
+            msgstr[1] "%(num)s APPLES"
             """)
 
+    def test_cache(self, runner, tmpdir):
+        po_file = build_po_string(
+            "#: foo/foo.py:5\n"
+            'msgctxt "button"\n'
+            'msgid "Foo bar baz"\n'
+            'msgstr ""\n'
+            "\n"
+            "#: foo/foo.py:6\n"
+            'msgctxt "title"\n'
+            'msgid "Foo bar baz"\n'
+            'msgstr ""\n'
+        )
+        fn = tmpdir.join("messages.po")
+        fn.write(po_file)
+        fn2 = tmpdir.join("messages2.po")
+        fn2.write(po_file)
+
+        result = runner.invoke(cli, ("translate", "-p", "shouty", str(fn), str(fn2)))
+        assert result.exit_code == 0
+        assert result.output.splitlines()[-1] == (
+            "Translation cache: 3 hits, 1 misses."
+        )
+        assert fn2.read().count('msgstr "FOO BAR BAZ"') == 2
+
+        result = runner.invoke(
+            cli, ("translate", "-p", "shouty", "--cache-size", "0", str(fn))
+        )
+        assert result.exit_code == 0
+        assert "Translation cache" not in result.output
+
 
 class TestLint:
     def test_help(self, runner):
@@ -270,8 +373,434 @@ class TestLint:
         # We're not looking at any variables, so we should never have a variable related warning.
         assert 'W501: one character variable name "o"' not in result.output
 
+    def test_jobs(self, runner, tmpdir):
+        for locale in ("de", "es", "fr", "it"):
+            po_file = build_po_string(
+                "#: foo/foo.py:5\n"
+                'msgid "Foo %(foo)s bar baz"\n'
+                'msgstr "Foo %(bar)s"\n'
+            )
+            fn = tmpdir.join(locale, "LC_MESSAGES", "messages.po")
+            fn.write(po_file, ensure=True)
+
+        serial = runner.invoke(cli, ("lint", "--jobs", "1", str(tmpdir)))
+        parallel = runner.invoke(cli, ("lint", "--jobs", "4", str(tmpdir)))
+        assert serial.exit_code == 1
+        assert parallel.exit_code == 1
+        assert serial.output == parallel.output
+        assert "Total number of files with errors:     4" in parallel.output
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_exclude(self, runner, tmpdir, jobs):
+        po_file = build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n')
+        for name in ("de", "fr", "node_modules/pkg", "build/de", "tmp"):
+            tmpdir.join(name, "messages.po").write(po_file, ensure=True)
+        tmpdir.join(".gitignore").write("node_modules/\n/build\n")
+
+        def linted(*args):
+            options = ("--jobs", jobs, "--reporter", "line", "--rules", "E201")
+            result = runner.invoke(cli, ("lint",) + options + args + (str(tmpdir),))
+            return sorted(line.split(":")[0] for line in result.output.splitlines()[1:])
+
+        assert len(linted()) == 5
+        assert linted("--exclude", "tmp/", "--exclude", "node_modules") == [
+            str(tmpdir.join(name, "messages.po")) for name in ("build/de", "de", "fr")
+        ]
+        assert linted("--gitignore", "--exclude", "fr/*.po") == [
+            str(tmpdir.join(name, "messages.po")) for name in ("de", "tmp")
+        ]
+
+    def test_cache(self, runner, tmpdir, monkeypatch):
+        po_file = build_po_string(
+            "#: foo/foo.py:5\n" 'msgid "Foo %(foo)s bar baz"\n' 'msgstr "Foo %(bar)s"\n'
+        )
+        fn = tmpdir.join("messages.po")
+        fn.write(po_file)
+        cache_dir = str(tmpdir.join("cache"))
+
+        args = ("lint", "--jobs", "1", "--cache-dir", cache_dir, str(fn))
+        first = runner.invoke(cli, args)
+        assert first.exit_code == 1
+
+        # The second run gets the results from the cache, so it never
+        # lints the file.
+        def verify_file(self, filename_or_string):
+            raise AssertionError("file should not have been linted")
+
+        monkeypatch.setattr(Linter, "verify_file", verify_file)
+        second = runner.invoke(cli, args)
+        assert second.exit_code == 1
+        assert second.output == first.output
+
+        # --no-cache lints the file
+        result = runner.invoke(cli, args + ("--no-cache",))
+        assert isinstance(result.exception, AssertionError)
+
+    def test_pot(self, runner, tmpdir):
+        pot = tmpdir.join("messages.pot")
+        pot.write(
+            build_po_string('#: foo/foo.py:5\nmsgid "Foo %(foo)s bar baz"\nmsgstr ""\n')
+        )
+        for locale in ("de", "fr"):
+            po_file = build_po_string(
+                "#: foo/foo.py:5\n"
+                'msgid "Foo %(foo)s bar baz"\n'
+                'msgstr "Foo %(bar)s"\n'
+            )
+            fn = tmpdir.join(locale, "LC_MESSAGES", "messages.po")
+            fn.write(po_file, ensure=True)
+
+        locales = (str(tmpdir.join("de")), str(tmpdir.join("fr")))
+        expected = runner.invoke(cli, ("lint", "--jobs", "1") + locales)
+
+        for jobs in ("1", "2"):
+            result = runner.invoke(
+                cli, ("lint", "--jobs", jobs, "--pot", str(pot)) + locales
+            )
+            assert result.exit_code == 1
+            assert result.output == expected.output
+        assert tmpdir.join("messages.pot.dennis-index").exists()
+
+    def test_lines(self, runner, tmpdir):
+        po_file = build_po_string(
+            "#: foo/foo.py:5\n"
+            'msgid "Foo %(foo)s bar baz"\n'
+            'msgstr "Foo %(bar)s"\n'
+            "\n"
+            'msgid "Bar %(bar)s"\n'
+            'msgstr "Rab %(foo)s"\n'
+        )
+        fn = tmpdir.join("messages.po")
+        fn.write(po_file)
+
+        result = runner.invoke(
+            cli,
+            (
+                "lint",
+                "--jobs",
+                "1",
+                "--reporter",
+                "line",
+                "--rules",
+                "E201",
+                "--lines",
+                "19-30",
+                str(fn),
+            ),
+        )
+        assert result.exit_code == 1
+        assert result.output.splitlines()[1:] == [
+            f"{fn}: 19: 0: E201: invalid variables: %(foo)s"
+        ]
+        assert tmpdir.join("messages.po.dennis-entries").exists()
+
+    @pytest.mark.parametrize("lines", ["100", "a-b", "0-10", "10-5"])
+    def test_lines_invalid(self, runner, tmpdir, lines):
+        fn = tmpdir.join("messages.po")
+        fn.write(build_po_string(""))
+
+        result = runner.invoke(cli, ("lint", "--lines", lines, str(fn)))
+        assert result.exit_code == 2
+        assert f"invalid lines: {lines}." in result.output
+
+    def test_mofile(self, runner, tmpdir):
+        po_file = build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n')
+        tmpdir.join("messages.po").write(po_file)
+        fn = tmpdir.join("messages.mo")
+        polib.pofile(po_file).save_as_mofile(str(fn))
+
+        result = runner.invoke(
+            cli, ("lint", "--reporter", "jsonl", "--rules", "E201", str(fn))
+        )
+        assert result.exit_code == 1
+        assert [json.loads(line) for line in result.output.splitlines()] == [
+            {
+                "file": str(fn),
+                "line": None,
+                "code": "E201",
+                "kind": "err",
+                "message": "invalid variables: %(bar)s",
+                "entry": 1,
+                "msgid": "Foo %(foo)s",
+            }
+        ]
+
+        # .mo entries don't have lines, so the line reporter names the entry
+        result = runner.invoke(
+            cli, ("lint", "--reporter", "line", "--rules", "E201", str(fn))
+        )
+        assert result.output.splitlines()[1:] == [
+            f'{fn}: E201: invalid variables: %(bar)s (entry 1: msgid "Foo %(foo)s")'
+        ]
+
+        # .mo files in directories are skipped in favor of the .po files
+        result = runner.invoke(
+            cli, ("lint", "--reporter", "line", "--rules", "E201", str(tmpdir))
+        )
+        assert result.output.splitlines()[1:] == [
+            f"{tmpdir.join('messages.po')}: 15: 0: E201: invalid variables: %(bar)s"
+        ]
+
+    def test_compressed(self, runner, tmpdir):
+        po_file = build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n')
+        tmpdir.join("messages.po.gz").write_binary(
+            gzip.compress(po_file.encode("utf-8"))
+        )
+        pot_file = build_po_string('msgid "%s %s"\nmsgstr ""\n')
+        tmpdir.join("messages.pot.xz").write_binary(
+            lzma.compress(pot_file.encode("utf-8"))
+        )
+
+        result = runner.invoke(
+            cli,
+            ("lint", "--reporter", "line", "--rules", "E201,W502", str(tmpdir)),
+        )
+        assert result.exit_code == 1
+        # .pot files are linted with the template linter
+        assert sorted(result.output.splitlines()[1:]) == [
+            f"{tmpdir.join('messages.po.gz')}: 15: 0: E201: invalid variables: "
+            "%(bar)s",
+            f"{tmpdir.join('messages.pot.xz')}: 15: 0: W502: multiple variables "
+            "with no name.",
+        ]
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_archive(self, runner, tmpdir, jobs):
+        po_file = build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n')
+        fn = str(tmpdir.join("bundle.zip"))
+        with zipfile.ZipFile(fn, "w") as zf:
+            zf.writestr("de/LC_MESSAGES/messages.po", po_file)
+            zf.writestr("fr/LC_MESSAGES/messages.po", po_file)
+            zf.writestr("fr/LC_MESSAGES/messages.mo", b"")
+
+        result = runner.invoke(
+            cli,
+            ("lint", "--jobs", jobs, "--reporter", "line", "--rules", "E201", fn),
+        )
+        assert result.exit_code == 1
+        assert result.output.splitlines()[1:] == [
+            f"{fn}!{lang}/LC_MESSAGES/messages.po: 15: 0: E201: invalid "
+            "variables: %(bar)s"
+            for lang in ("de", "fr")
+        ]
+
+        # Members can be linted by themselves
+        member = fn + "!fr/LC_MESSAGES/messages.po"
+        result = runner.invoke(cli, ("lint", "--reporter", "line", member))
+        assert result.output.splitlines()[1:] == [
+            f"{member}: 15: 0: E201: invalid variables: %(bar)s",
+            f"{member}: 15: 0: W202: missing variables: %(foo)s",
+        ]
+
+    def test_archive_invalid(self, runner, tmpdir):
+        fn = tmpdir.join("bundle.zip")
+        fn.write("not an archive")
+        result = runner.invoke(cli, ("lint", str(fn)))
+        assert result.exit_code == 2
+        assert f'Problem opening archive "{fn}"' in result.output
+
+    def test_stdin(self, runner, tmpdir):
+        po_file = build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n')
+        fn = tmpdir.join("messages.po")
+        fn.write(po_file)
+
+        result = runner.invoke(
+            cli,
+            ("lint", "--reporter", "line", "--rules", "E201", "-", str(fn)),
+            input=gzip.compress(po_file.encode("utf-8")),
+        )
+        assert result.exit_code == 1
+        assert result.output.splitlines()[1:] == [
+            "<stdin>: 15: 0: E201: invalid variables: %(bar)s",
+            f"{fn}: 15: 0: E201: invalid variables: %(bar)s",
+        ]
+
+        result = runner.invoke(
+            cli,
+            ("lint", "--reporter", "line", "--lines", "16-20", "-"),
+            input=po_file,
+        )
+        assert len(result.output.splitlines()[1:]) == 2
+
+    def test_stdin_template(self, runner):
+        pot_file = build_po_string(
+            "#: foo/foo.py:5\n" 'msgid "Foo %(o)s baz"\n' 'msgstr ""\n'
+        )
+
+        result = runner.invoke(cli, ("lint", "--reporter", "line", "-"), input=pot_file)
+        assert result.exit_code == 0
+        assert result.output.splitlines()[1:] == [
+            '<stdin>: 15: 0: W500: hard to read variable name "o"',
+            '<stdin>: 15: 0: W501: one character variable name "o"',
+        ]
+
+    @pytest.mark.parametrize("null", [False, True])
+    def test_files_from(self, runner, tmpdir, null):
+        po_file = build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n')
+        paths = []
+        for name in ("a b.po", "c.po", "d.txt"):
+            tmpdir.join(name).write(po_file)
+            paths.append(str(tmpdir.join(name)))
+        sep = "\0" if null else "\n"
+
+        args = ["lint", "--reporter", "line", "--rules", "E201"]
+        args += ["--files-from", "-"] + (["--null"] if null else [])
+        result = runner.invoke(cli, args, input=sep.join(paths) + sep)
+        assert result.exit_code == 1
+        # Files are filtered the same way as arguments
+        assert result.output.splitlines()[1:] == [
+            f"{paths[0]}: 15: 0: E201: invalid variables: %(bar)s",
+            f"{paths[1]}: 15: 0: E201: invalid variables: %(bar)s",
+        ]
+
+    @pytest.mark.parametrize(
+        "args, error",
+        [
+            (["--files-from", "-", "-"], "can't read paths and a file from stdin."),
+            (["--null", "foo.po"], "--null only works with --files-from."),
+        ],
+    )
+    def test_files_from_invalid(self, runner, args, error):
+        result = runner.invoke(cli, ["lint"] + args, input="")
+        assert result.exit_code == 2
+        assert result.output.splitlines()[-1] == f"Error: {error}"
+
     # FIXME: test --varformat with values
 
-    # FIXME: test --reporter
+    def test_reporter_jsonl(self, runner, tmpdir):
+        po_file = build_po_string(
+            "#: foo/foo.py:5\n"
+            'msgid "Foo %(foo)s bar baz"\n'
+            'msgstr "Foo %(bar)s"\n'
+            "\n"
+            'msgid "Bar"\n'
+            'msgstr "Bar"\n'
+        )
+        fn = tmpdir.join("messages.po")
+        fn.write(po_file)
+        bad_fn = tmpdir.join("bad.po")
+        bad_fn.write('msgid "Foo"\nmsgstr "Foo "bar""\n')
+
+        result = runner.invoke(
+            cli, ("lint", "--jobs", "1", "--reporter", "jsonl", str(fn), str(bad_fn))
+        )
+        assert result.exit_code == 1
+        records = [json.loads(line) for line in result.output.splitlines()]
+        assert records == [
+            {
+                "file": str(fn),
+                "line": 15,
+                "code": "W202",
+                "kind": "warn",
+                "message": "missing variables: %(foo)s",
+            },
+            {
+                "file": str(fn),
+                "line": 15,
+                "code": "E201",
+                "kind": "err",
+                "message": "invalid variables: %(bar)s",
+            },
+            {
+                "file": str(fn),
+                "line": 19,
+                "code": "W302",
+                "kind": "warn",
+                "message": "translated string is same as source string",
+            },
+            {
+                "file": str(bad_fn),
+                "line": None,
+                "code": None,
+                "kind": "err",
+                "message": (
+                    f"Problem opening file: Syntax error in po file {bad_fn} "
+                    "(line 2): unescaped double quote found"
+                ),
+            },
+        ]
+
+    def test_reporter_sarif(self, runner, tmpdir):
+        po_file = build_po_string(
+            "#: foo/foo.py:5\n" 'msgid "Foo %(foo)s bar baz"\n' 'msgstr "Foo %(bar)s"\n'
+        )
+        fn = tmpdir.join("messages.po")
+        fn.write(po_file)
+
+        result = runner.invoke(
+            cli, ("lint", "--reporter", "sarif", "--rules", "E201,W202", str(fn))
+        )
+        assert result.exit_code == 1
+        log = json.loads(result.output)
+        assert log["version"] == "2.1.0"
+        run = log["runs"][0]
+        assert [rule["id"] for rule in run["tool"]["driver"]["rules"]] == [
+            "E201",
+            "W202",
+            "E202",
+        ]
+        assert [
+            (
+                result["ruleId"],
+                result["level"],
+                result["locations"][0]["physicalLocation"]["region"]["startLine"],
+            )
+            for result in run["results"]
+        ] == [("E201", "error", 15), ("W202", "warning", 15)]
+
+    def test_reporter_jsonl_quiet(self, runner, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n'))
+        bad_fn = tmpdir.join("bad.po")
+        bad_fn.write('msgid "Foo"\nmsgstr "Foo "bar""\n')
+
+        # Only problems opening files are written
+        result = runner.invoke(
+            cli,
+            ("lint", "--quiet", "--jobs", "1", "--reporter", "jsonl")
+            + (str(fn), str(bad_fn)),
+        )
+        assert result.exit_code == 1
+        records = [json.loads(line) for line in result.output.splitlines()]
+        assert [(record["file"], record["code"]) for record in records] == [
+            (str(bad_fn), None)
+        ]
+
+    def test_reporter_sarif_quiet(self, runner, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(build_po_string('msgid "Foo %(foo)s"\nmsgstr "Oof %(bar)s"\n'))
+
+        result = runner.invoke(
+            cli, ("lint", "--quiet", "--reporter", "sarif", "--rules", "E201", str(fn))
+        )
+        assert result.exit_code == 1
+        # The log is still valid, it just doesn't have the lint results
+        log = json.loads(result.output)
+        assert log["runs"][0]["results"] == []
+
+        bad_fn = tmpdir.join("bad.po")
+        bad_fn.write('msgid "Foo"\nmsgstr "Foo "bar""\n')
+        result = runner.invoke(
+            cli,
+            ("lint", "--quiet", "--jobs", "1", "--reporter", "sarif")
+            + (str(fn), str(bad_fn)),
+        )
+        assert result.exit_code == 1
+        log = json.loads(result.output)
+        assert [
+            (
+                result["level"],
+                result["locations"][0]["physicalLocation"]["artifactLocation"]["uri"],
+            )
+            for result in log["runs"][0]["results"]
+        ] == [("error", pathlib.Path(str(bad_fn)).as_uri())]
+
+    def test_reporter_invalid(self, runner, tmpdir):
+        fn = tmpdir.join("messages.po")
+        fn.write(build_po_string('msgid "Foo"\nmsgstr "Oof"\n'))
+
+        result = runner.invoke(cli, ("lint", "--reporter", "xml", str(fn)))
+        assert result.exit_code == 2
+        assert "invalid reporter: xml" in result.output
 
     # FIXME: test --errorsonly
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from dennis.discovery import IgnorePattern, parse_ignore_lines, walk_files
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, expected",
+    [
+        ("build", "build", True, True),
+        ("build", "src/build", True, True),
+        ("build", "src/build.po", False, False),
+        ("build/", "build", False, False),
+        ("build/", "src/build", True, True),
+        ("/build", "build", True, True),
+        ("/build", "src/build", True, False),
+        ("src/build", "src/build", True, True),
+        ("src/build", "lib/src/build", True, False),
+        ("*.po", "de/messages.po", False, True),
+        ("de/*.po", "de/LC_MESSAGES/messages.po", False, False),
+        ("de/**/*.po", "de/LC_MESSAGES/messages.po", False, True),
+        ("de/**/*.po", "de/messages.po", False, True),
+        ("**/LC_MESSAGES", "de/LC_MESSAGES", True, True),
+        ("de/**", "de/LC_MESSAGES", True, True),
+        ("messages.p?", "messages.po", False, True),
+        ("[df][er]", "de", True, True),
+        ("[!d]e", "de", True, False),
+        ("\\#notes", "#notes", False, True),
+        ("a[b", "a[b", False, True),
+    ],
+)
+def test_ignore_pattern(pattern, path, is_dir, expected):
+    assert IgnorePattern(pattern).matches(path, is_dir) == expected
+
+
+def test_parse_ignore_lines():
+    patterns = parse_ignore_lines(["# comment\n", "\n", "build/  \n", "!keep.po\n"])
+    assert [pattern.pattern for pattern in patterns] == ["build/", "!keep.po"]
+    assert patterns[1].negate
+
+
+def build_tree(root, names):
+    for name in names:
+        fn = root / name
+        fn.parent.mkdir(parents=True, exist_ok=True)
+        fn.write_text("")
+
+
+def relative(root, paths):
+    return [os.path.relpath(path, root).replace(os.sep, "/") for path in paths]
+
+
+class TestWalkFiles:
+    def test_order(self, tmp_path):
+        build_tree(tmp_path, ["a.po", "de/b.po", "de/sub/c.po", "fr/d.po", "e.txt"])
+        found = list(walk_files(str(tmp_path), (".po",)))
+        assert all(os.path.isabs(path) for path in found)
+        # Like os.walk, a directory's files come before its subdirectories'
+        walked = []
+        for root, dirs, files in os.walk(str(tmp_path)):
+            walked.extend(os.path.join(root, fn) for fn in files if fn.endswith(".po"))
+        assert found == walked
+
+    def test_exclude(self, tmp_path):
+        build_tree(tmp_path, ["de/a.po", "node_modules/x/b.po", "build/c.po"])
+        found = walk_files(str(tmp_path), (".po",), exclude=["node_modules", "/build"])
+        assert relative(tmp_path, found) == ["de/a.po"]
+
+    def test_gitignore(self, tmp_path):
+        build_tree(
+            tmp_path,
+            ["de/a.po", "de/b.po", "de/keep.po", "tmp/c.po", "fr/tmp/d.po"],
+        )
+        (tmp_path / ".gitignore").write_text("tmp/\n")
+        (tmp_path / "de" / ".gitignore").write_text("*.po\n!keep.po\n")
+
+        found = walk_files(str(tmp_path), (".po",), gitignore=True)
+        assert relative(tmp_path, found) == ["de/keep.po"]
+        # .gitignore files are only read when asked
+        found = walk_files(str(tmp_path), (".po",))
+        assert len(list(found)) == 5
+
+    def test_symlinked_directory(self, tmp_path):
+        build_tree(tmp_path, ["de/a.po"])
+        (tmp_path / "link").symlink_to(tmp_path / "de")
+        found = walk_files(str(tmp_path), (".po",))
+        assert relative(tmp_path, found) == ["de/a.po"]
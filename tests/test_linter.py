@@ -1,5 +1,7 @@
 import polib
+import pytest
 
+from dennis.cache import EntryCache
 from dennis.linter import (
     BadFormatLintRule,
     BlankLintRule,
@@ -12,6 +14,7 @@ from dennis.linter import (
     UnchangedLintRule,
     LintedEntry,
     Linter,
+    TriggerScanner,
 )
 from dennis.templatelinter import (
     HardToReadNamesTLR,
@@ -63,6 +66,191 @@ class LinterTest:
         assert len(msgs) == 0
 
 
+class TestLinterStreaming:
+    po_data = (
+        'msgid "Foo %(foo)s"\n'
+        'msgstr "Oof %(bar)s"\n'
+        "\n"
+        "#, fuzzy\n"
+        'msgid "Bar %(bar)s"\n'
+        'msgstr "Rab %(foo)s"\n'
+        "\n"
+        'msgid "Baz %(baz)s"\n'
+        'msgstr "Zab %(foo)s"\n'
+    )
+
+    def test_same_as_verify_file(self):
+        linter = Linter(["python-format"], ["E201"])
+        pofile = build_po_string(self.po_data)
+
+        expected = linter.verify_file(pofile)
+        msgs = linter.iter_verify_file(pofile)
+        assert not isinstance(msgs, list)
+        assert [(msg.line, msg.code, msg.msg) for msg in msgs] == [
+            (msg.line, msg.code, msg.msg) for msg in expected
+        ]
+        assert [msg.line for msg in expected] == [15, 22]
+
+    def test_streams(self):
+        # Messages for the first entry come out before the syntax error
+        # is hit
+        linter = Linter(["python-format"], ["E201"])
+        pofile = build_po_string(self.po_data + '\nmsgid "Oops"\nmsgstr "A "b""\n')
+
+        msgs = linter.iter_verify_file(pofile)
+        assert next(msgs).line == 15
+        with pytest.raises(IOError):
+            next(msgs)
+
+    def test_verify_lines(self, tmpdir):
+        linter = Linter(["python-format"], ["E201"])
+        fn = tmpdir.join("messages.po")
+        fn.write(build_po_string(self.po_data))
+
+        def lines(first_line, last_line):
+            msgs = linter.verify_lines(str(fn), first_line, last_line)
+            return [msg.line for msg in msgs]
+
+        assert lines(1, 30) == [15, 22]
+        assert lines(16, 16) == [15]
+        assert lines(18, 21) == []
+        assert lines(21, 22) == [22]
+
+    def test_mofile(self, tmpdir):
+        linter = Linter(["python-format"], ["E201"])
+        fn = str(tmpdir.join("messages.mo"))
+        polib.pofile(build_po_string(self.po_data)).save_as_mofile(fn)
+
+        # Lines are entry indexes for .mo files and the fuzzy entry isn't
+        # in the .mo file
+        msgs = linter.verify_file(fn)
+        assert [(msg.line, msg.poentry.msgid) for msg in msgs] == [
+            (1, "Baz %(baz)s"),
+            (2, "Foo %(foo)s"),
+        ]
+        assert [msg.line for msg in linter.iter_verify_file(fn)] == [1, 2]
+        assert [msg.line for msg in linter.verify_lines(fn, 2, 5)] == [2]
+
+    def test_lint_entries(self):
+        linter = Linter(["python-format"], ["E201"])
+        entries = polib.pofile(build_po_string(self.po_data))
+
+        msgs = list(linter.lint_entries(iter(entries)))
+        assert [msg.line for msg in msgs] == [15, 22]
+
+
+class TestLinterScanner:
+    def test_skips_rules(self, monkeypatch):
+        linted = []
+
+        def lint(self, vartok, linted_entry):
+            linted.append(linted_entry.poentry.msgstr)
+            return []
+
+        monkeypatch.setattr(MalformedNoTypeLintRule, "lint", lint)
+
+        linter = Linter(["python-format"], ["E101"])
+        pofile = build_po_string(
+            'msgid "Foo %(foo)s"\n'
+            'msgstr "Oof %(foo)s"\n'
+            "\n"
+            'msgid "Bar"\n'
+            'msgstr "Rab"\n'
+        )
+        linter.verify_file(pofile)
+
+        assert linted == ["Oof %(foo)s"]
+
+
+class TestLinterMsgidAnalysis:
+    def test_shared_between_files(self):
+        linter = Linter(["python-format"], ["E201", "W202", "W303"])
+        fr = build_po_string(
+            'msgid "<b>Foo %(foo)s</b>"\n' 'msgstr "<b>Oof %(foo)s</b>"\n'
+        )
+        de = build_po_string(
+            'msgid "<b>Foo %(foo)s</b>"\n' 'msgstr "<i>Oof %(bar)s</i>"\n'
+        )
+
+        assert linter.verify_file(fr) == []
+        hits = linter.msgid_analysis.hits
+
+        msgs = linter.verify_file(de)
+        assert linter.msgid_analysis.hits > hits
+        assert sorted(msg.code for msg in msgs) == ["E201", "W202", "W303"]
+
+    def test_bounded(self):
+        linter = Linter(["python-format"], ["E201"], msgid_analysis_size=2)
+        linter.verify_file(
+            build_po_string(
+                'msgid "Foo %(foo)s"\n'
+                'msgstr "Oof %(foo)s"\n'
+                "\n"
+                'msgid "Bar %(bar)s"\n'
+                'msgstr "Rab %(bar)s"\n'
+            )
+        )
+        assert len(linter.msgid_analysis) == 2
+
+    def test_load_keeps_all_items(self):
+        linter = Linter(["python-format"], ["E201"], msgid_analysis_size=10)
+        items = [(("tokens", "Foo %d" % i, True), set()) for i in range(25)]
+        linter.load_msgid_analysis(items)
+        assert len(linter.msgid_analysis) == 25
+
+        # Loading them again doesn't grow the table
+        linter.load_msgid_analysis(items)
+        assert linter.msgid_analysis.maxsize == 35
+
+        # There's still room for msgid_analysis_size analyzed strings
+        for i in range(10):
+            linter.msgid_analysis.set(("tokens", "Bar %d" % i, True), set())
+        assert all(key in linter.msgid_analysis for key, value in items)
+
+    def test_off(self):
+        linter = Linter(["python-format"], ["E201"], msgid_analysis_size=0)
+        assert linter.msgid_analysis is None
+
+
+class TestLinterEntryCache:
+    def test_cached_entries(self):
+        entry_cache = EntryCache()
+        linter = Linter(["python-format"], ["E201"], entry_cache=entry_cache)
+        pofile = build_po_string(
+            "#: foo/foo.py:5\n"
+            'msgid "Foo %(foo)s"\n'
+            'msgstr "Oof %(bar)s"\n'
+            "\n"
+            "#: foo/bar.py:5\n"
+            'msgid "Foo %(foo)s"\n'
+            'msgstr "Oof %(bar)s"\n'
+        )
+        msgs = linter.verify_file(pofile)
+
+        # The second entry is the same as the first, so it comes from the
+        # cache, but the message is for the second entry.
+        assert entry_cache.misses == 1
+        assert entry_cache.hits == 1
+        assert [(msg.line, msg.code) for msg in msgs] == [(15, "E201"), (19, "E201")]
+        assert msgs[1].poentry.occurrences == [("foo/bar.py", "5")]
+
+    def test_dennis_ignore_in_key(self):
+        entry_cache = EntryCache()
+        linter = Linter(["python-format"], ["E201"], entry_cache=entry_cache)
+        pofile = build_po_string(
+            'msgid "Foo %(foo)s"\n'
+            'msgstr "Oof %(bar)s"\n'
+            "\n"
+            "#. dennis-ignore: E201\n"
+            'msgid "Foo %(foo)s"\n'
+            'msgstr "Oof %(bar)s"\n'
+        )
+        msgs = linter.verify_file(pofile)
+
+        assert entry_cache.misses == 2
+        assert [msg.line for msg in msgs] == [15]
+
+
 def build_linted_entry(po_data):
     po = polib.pofile(build_po_string(po_data))
     poentry = list(po)[0]
@@ -73,6 +261,77 @@ class LintRuleTestCase:
     vartok = VariableTokenizer(["python-format", "python-brace-format"])
 
 
+class TestLintedEntry(LintRuleTestCase):
+    def test_strs_computed_once(self):
+        linted_entry = build_linted_entry(
+            'msgid "Foo: {foo}"\n' 'msgstr "Oof: {foo}"\n'
+        )
+        assert linted_entry.strs is linted_entry.strs
+        assert linted_entry.str is linted_entry.str
+
+    def test_tokenized_once(self):
+        linted_entry = build_linted_entry(
+            'msgid "%(foo)s <b>{bar}</b>"\n' 'msgstr "%(foo)s <b>{baz}</b>"\n'
+        )
+        calls = []
+
+        class CountingTokenizer(VariableTokenizer):
+            def extract_tokens(self, text, unique=True):
+                calls.append(text)
+                return super().extract_tokens(text, unique=unique)
+
+        vartok = CountingTokenizer(["python-format", "python-brace-format"])
+        for lintrule in (
+            BadFormatLintRule(),
+            MissingVarsLintRule(),
+            InvalidVarsLintRule(),
+        ):
+            lintrule.lint(vartok, linted_entry)
+
+        assert sorted(calls) == [
+            "%(foo)s <b>{bar}</b>",
+            "%(foo)s <b>{baz}</b>",
+        ]
+
+    def test_may_contain(self):
+        linted_entry = build_linted_entry(
+            'msgid "Foo: {foo}"\n' 'msgstr "Oof: {foo}"\n'
+        )
+        # Without a scanner, anything might be in there
+        assert linted_entry.may_contain("Oof", "%") is True
+
+        linted_entry.scanner = TriggerScanner(["%", "{}"])
+        assert linted_entry.may_contain("Oof: {foo}", "{") is True
+        assert linted_entry.may_contain("Oof: {foo}", "%") is False
+        # The scanner doesn't look for <, so it might be there
+        assert linted_entry.may_contain("Oof: {foo}", "<") is True
+
+    def test_scanner_skips_tokenizing(self):
+        linted_entry = build_linted_entry('msgid "Foo"\n' 'msgstr "Oof"\n')
+        linted_entry.scanner = TriggerScanner(["%{"])
+
+        class FailingTokenizer(VariableTokenizer):
+            def extract_tokens(self, text, unique=True):
+                raise AssertionError("should not tokenize {!r}".format(text))
+
+        vartok = FailingTokenizer(["python-format", "python-brace-format"])
+        assert linted_entry.extract_tokens(vartok, "Oof") == set()
+        assert linted_entry.extract_tokens(vartok, "Oof", unique=False) == []
+
+    def test_html_tokens(self):
+        linted_entry = build_linted_entry(
+            'msgid "<b>Foo</b> &amp; <a href=\\"x\\">bar</a>"\n' 'msgstr "Oof"\n'
+        )
+        tokens = linted_entry.html_tokens(self.vartok, linted_entry.msgid)
+        assert [token.s for token in tokens] == [
+            "</a>",
+            "</b>",
+            '<a href="x">',
+            "<b>",
+        ]
+        assert linted_entry.html_tokens(self.vartok, linted_entry.msgid) is tokens
+
+
 class TestBadFormatLintRule(LintRuleTestCase):
     lintrule = BadFormatLintRule()
 
@@ -295,6 +554,23 @@ class TestMalformedMissingRightBraceLintRule(LintRuleTestCase):
         assert msgs[0].code == "E102"
         assert msgs[0].msg == "missing right curly-brace: {product}} foo bar"
 
+    def test_double_braces_next_to_variable(self):
+        linted_entry = build_linted_entry(
+            'msgid "{{{0}}} and {{{1} and {{literal}}"\n'
+            'msgstr "{{{0}}} and {{{1} and {{literal}}"\n'
+        )
+
+        msgs = self.lintrule.lint(self.vartok, linted_entry)
+        assert len(msgs) == 0
+
+        linted_entry = build_linted_entry(
+            'msgid "{{{0}}} and {{{1}"\n' 'msgstr "{{{0}}} and {{{1 and {{literal}}"\n'
+        )
+
+        msgs = self.lintrule.lint(self.vartok, linted_entry)
+        assert len(msgs) == 1
+        assert msgs[0].msg == "missing right curly-brace: {1 and {{literal}}"
+
     def test_varformat_empty(self):
         vartok = VariableTokenizer([])
 
@@ -344,6 +620,15 @@ class TestMalformedMissingLeftBraceLintRuleTest(LintRuleTestCase):
         msgs = self.lintrule.lint(self.vartok, linted_entry)
         assert len(msgs) == 0
 
+    def test_double_braces_next_to_variable(self):
+        linted_entry = build_linted_entry(
+            'msgid "{{{0}}} and {{literal}}}"\n' 'msgstr "{{{0}}} and {{literal}}}"\n'
+        )
+
+        msgs = self.lintrule.lint(self.vartok, linted_entry)
+        assert len(msgs) == 1
+        assert msgs[0].msg == "missing left curly-brace: } and {{literal}}}"
+
     def test_varformat_empty(self):
         vartok = VariableTokenizer([])
 
@@ -707,6 +992,21 @@ class TestMismatchedHTMLLintRule(LintRuleTestCase):
         # [<html <a>>]
         assert msgs[0].msg == 'different html: "</a>" vs. "<a>"'
 
+    def test_unclosed_tag_in_plural(self):
+        # The unclosed tag in msgstr[0] doesn't carry over to the
+        # strings after it
+        linted_entry = build_linted_entry(
+            "#: foo/foo.py:5\n"
+            "#, python-format\n"
+            'msgid "<b>Hello</b> %(n)s"\n'
+            'msgid_plural "<b>Hellos</b> %(n)s"\n'
+            'msgstr[0] "<b>Hallo</b %(n)s"\n'
+            'msgstr[1] "<b>Hallos</b> %(n)s"\n'
+        )
+
+        msgs = self.lintrule.lint(self.vartok, linted_entry)
+        assert [msg.msg for msg in msgs] == ['different html: "</b>" vs. "<b>"']
+
 
 class TLRTestCase:
     vartok = VariableTokenizer(["python-format", "python-brace-format"])
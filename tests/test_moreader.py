@@ -0,0 +1,129 @@
+import struct
+from textwrap import dedent
+
+import polib
+import pytest
+
+from dennis.moreader import MOReaderEntry, is_mofile, iter_mofile, read_mofile
+from tests import build_po_string
+
+SAMPLE = build_po_string(dedent("""\
+    msgid "Foo %(foo)s"
+    msgstr "Oof %(foo)s"
+
+    msgctxt "menu"
+    msgid "%(num)s apple"
+    msgid_plural "%(num)s apples"
+    msgstr[0] "%(num)s Apfel"
+    msgstr[1] "%(num)s Äpfel"
+    """))
+
+
+def entry_fields(entry):
+    plural = {int(key): val for key, val in entry.msgstr_plural.items()}
+    return (entry.msgctxt, entry.msgid, entry.msgid_plural, entry.msgstr, plural)
+
+
+def build_mofile(path, pairs, order="<"):
+    """Writes a .mo file with the (msgid, msgstr) byte string pairs"""
+    count = len(pairs)
+    ids_offset = 28
+    strs_offset = ids_offset + count * 8
+    data_offset = strs_offset + count * 8
+
+    tables = [b"", b""]
+    data = b""
+    for index in (0, 1):
+        for pair in pairs:
+            offset = data_offset + len(data)
+            tables[index] += struct.pack(order + "2I", len(pair[index]), offset)
+            data += pair[index] + b"\0"
+
+    header = struct.pack(
+        order + "7I", 0x950412DE, 0, count, ids_offset, strs_offset, 0, 0
+    )
+    path.write_bytes(header + tables[0] + tables[1] + data)
+    return str(path)
+
+
+class TestMOReader:
+    def test_matches_polib(self, tmpdir):
+        po = polib.pofile(SAMPLE)
+        fn = str(tmpdir.join("messages.mo"))
+        po.save_as_mofile(fn)
+
+        entries = list(iter_mofile(fn))
+        assert [entry_fields(entry) for entry in entries] == [
+            entry_fields(entry) for entry in polib.mofile(fn)
+        ]
+        assert all(isinstance(entry, MOReaderEntry) for entry in entries)
+        # The metadata is entry 0
+        assert [entry.linenum for entry in entries] == [1, 2]
+
+    def test_read_mofile(self, tmpdir):
+        po = polib.pofile(SAMPLE)
+        fn = str(tmpdir.join("messages.mo"))
+        po.save_as_mofile(fn)
+
+        mo = read_mofile(fn)
+        assert mo.encoding == "UTF-8"
+        assert mo.metadata == polib.mofile(fn).metadata
+        assert mo[1].msgstr_plural[1] == "%(num)s Äpfel"
+        assert 'msgstr "Oof %(foo)s"' in mo[0].original
+
+    def test_big_endian(self, tmp_path):
+        pairs = [
+            (b"", b"Content-Type: text/plain; charset=UTF-8\n"),
+            (b"Foo", "Föö".encode("utf-8")),
+        ]
+        fn = build_mofile(tmp_path / "messages.mo", pairs, order=">")
+        entries = list(iter_mofile(fn))
+        assert [(entry.msgid, entry.msgstr) for entry in entries] == [("Foo", "Föö")]
+
+    def test_charset(self, tmp_path):
+        pairs = [
+            (b"", b"Content-Type: text/plain; charset=ISO-8859-1\n"),
+            (b"Foo", "Föö".encode("latin-1")),
+        ]
+        fn = build_mofile(tmp_path / "messages.mo", pairs)
+        mo = read_mofile(fn)
+        assert mo.encoding == "ISO-8859-1"
+        assert mo[0].msgstr == "Föö"
+
+    @pytest.mark.parametrize(
+        "data, reason",
+        [
+            (b"", "file is empty"),
+            (b"\0" * 8, "file is too short"),
+            (b"\0" * 28, "magic number is incorrect"),
+            (
+                struct.pack("<7I", 0x950412DE, 0, 10, 28, 108, 0, 0),
+                "string tables are past the end of the file",
+            ),
+            (
+                struct.pack("<7I", 0x950412DE, 5 << 16, 0, 28, 28, 0, 0),
+                "unexpected major revision number",
+            ),
+        ],
+    )
+    def test_invalid(self, tmp_path, data, reason):
+        fn = tmp_path / "messages.mo"
+        fn.write_bytes(data)
+        with pytest.raises(IOError, match=reason):
+            read_mofile(str(fn))
+
+    def test_string_past_end(self, tmp_path):
+        fn = build_mofile(tmp_path / "messages.mo", [(b"Foo", b"Bar")])
+        # Truncate the string data
+        data = (tmp_path / "messages.mo").read_bytes()
+        (tmp_path / "messages.mo").write_bytes(data[:-6])
+        with pytest.raises(IOError, match="string 0 is past the end"):
+            read_mofile(fn)
+
+
+def test_is_mofile(tmp_path):
+    fn = tmp_path / "messages.mo"
+    assert not is_mofile(str(fn))
+    fn.write_bytes(b"")
+    assert is_mofile(str(fn))
+    assert not is_mofile(SAMPLE)
@@ -0,0 +1,310 @@
+from textwrap import dedent
+
+import bz2
+import gzip
+import lzma
+import pickle
+
+import polib
+import pytest
+
+from dennis import poreader
+from dennis.poreader import (
+    POReader,
+    ReaderEntry,
+    compression,
+    decode_pofile,
+    iter_pofile,
+    iter_pofile_lines,
+    read_pofile,
+)
+from tests import build_po_string
+
+SAMPLE = build_po_string(dedent("""\
+    #. dennis-ignore: E201
+    #: foo/foo.py:5 foo/bar.py
+    #, python-format
+    msgid "Foo %(foo)s"
+    msgstr ""
+    "Oof "
+    "%(foo)s"
+
+    # translator comment
+    msgctxt "menu"
+    msgid "%(num)s apple"
+    msgid_plural "%(num)s apples"
+    msgstr[0] "%(num)s Apfel"
+    msgstr[1] "%(num)s \\"Äpfel\\""
+
+
+    #~ msgid "Old"
+    #~ msgstr "Alt"
+    """))
+
+
+FIELDS = (
+    "msgid",
+    "msgid_plural",
+    "msgstr",
+    "msgstr_plural",
+    "msgctxt",
+    "comment",
+    "tcomment",
+    "occurrences",
+    "flags",
+    "obsolete",
+    "linenum",
+)
+
+
+def test_matches_polib():
+    po = read_pofile(SAMPLE)
+    expected = polib.pofile(SAMPLE)
+
+    assert po.metadata == expected.metadata
+    assert po.metadata_is_fuzzy == expected.metadata_is_fuzzy
+    assert len(po) == len(expected)
+    for entry, expected_entry in zip(po, expected):
+        for field in FIELDS:
+            assert getattr(entry, field) == getattr(expected_entry, field)
+
+
+def test_original():
+    entries = list(iter_pofile(SAMPLE))
+    assert [entry.original for entry in entries] == [
+        (
+            "#. dennis-ignore: E201\n"
+            "#: foo/foo.py:5 foo/bar.py\n"
+            "#, python-format\n"
+            'msgid "Foo %(foo)s"\n'
+            'msgstr ""\n'
+            '"Oof "\n'
+            '"%(foo)s"\n'
+        ),
+        (
+            "# translator comment\n"
+            'msgctxt "menu"\n'
+            'msgid "%(num)s apple"\n'
+            'msgid_plural "%(num)s apples"\n'
+            'msgstr[0] "%(num)s Apfel"\n'
+            'msgstr[1] "%(num)s \\"Äpfel\\""\n'
+        ),
+        ('#~ msgid "Old"\n' '#~ msgstr "Alt"\n'),
+    ]
+
+
+def test_original_from_file(tmpdir):
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(SAMPLE.encode("utf-8"))
+
+    entries = list(iter_pofile(str(fn)))
+    assert isinstance(entries[1], ReaderEntry)
+    # The block text isn't kept on the entry, it's read when it's used
+    assert "original" not in vars(entries[1])
+    assert entries[1].original == (
+        "# translator comment\n"
+        'msgctxt "menu"\n'
+        'msgid "%(num)s apple"\n'
+        'msgid_plural "%(num)s apples"\n'
+        'msgstr[0] "%(num)s Apfel"\n'
+        'msgstr[1] "%(num)s \\"Äpfel\\""\n'
+    )
+
+
+def test_original_reads_only_the_block(tmpdir, monkeypatch):
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(SAMPLE.encode("utf-8"))
+    entries = list(iter_pofile(str(fn)))
+    expected = [entry.original for entry in entries]
+
+    # Each block is read by itself; the rest of the file isn't read or
+    # kept on the reader
+    reads = []
+    real_open = open
+
+    def logging_open(*args, **kwargs):
+        fp = real_open(*args, **kwargs)
+        real_read = fp.read
+
+        def read(size=-1):
+            data = real_read(size)
+            reads.append(len(data))
+            return data
+
+        fp.read = read
+        return fp
+
+    monkeypatch.setattr("builtins.open", logging_open)
+    assert [entry.original for entry in entries] == expected
+    assert reads == [len(original.encode("utf-8")) for original in expected]
+    assert not any(
+        isinstance(value, bytes) for value in vars(entries[0].reader).values()
+    )
+
+
+def test_original_pickle(tmpdir):
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(SAMPLE.encode("utf-8"))
+
+    entry = list(iter_pofile(str(fn)))[0]
+    original = entry.original
+    data = pickle.dumps(entry)
+
+    # Pickled entries from files read their block when it's used
+    unpickled = pickle.loads(data)
+    assert "_original" not in vars(unpickled)
+    assert unpickled.original == original
+    assert unpickled.msgstr == entry.msgstr
+
+
+def test_original_pickle_string():
+    entry = list(iter_pofile(SAMPLE))[0]
+    data = pickle.dumps(entry)
+
+    # Entries from strings take their block with them, not the string
+    assert SAMPLE.encode("utf-8") not in data
+    unpickled = pickle.loads(data)
+    assert unpickled.reader is None
+    assert unpickled.original == entry.original
+
+
+@pytest.mark.parametrize(
+    "module, suffix", [(gzip, ".gz"), (lzma, ".xz"), (bz2, ".bz2")]
+)
+def test_original_compressed(tmpdir, monkeypatch, module, suffix):
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(SAMPLE.encode("utf-8"))
+    compressed_fn = tmpdir.join("messages.po" + suffix)
+    compressed_fn.write_binary(module.compress(SAMPLE.encode("utf-8")))
+    expected = [entry.original for entry in iter_pofile(str(fn))]
+
+    opened = []
+    real_open_pofile = poreader.open_pofile
+
+    def open_pofile(fn):
+        opened.append(fn)
+        return real_open_pofile(fn)
+
+    monkeypatch.setattr(poreader, "open_pofile", open_pofile)
+    entries = list(iter_pofile(str(compressed_fn)))
+    # The file is decompressed once while it's parsed and the blocks
+    # are kept then, so using them or pickling doesn't read it again
+    assert len(opened) == 1
+    assert [entry.original for entry in entries] == expected
+    unpickled = pickle.loads(pickle.dumps(entries))
+    assert [entry.original for entry in unpickled] == expected
+    assert len(opened) == 1
+
+
+def test_read_span(tmpdir):
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(SAMPLE.encode("utf-8"))
+    entries = list(iter_pofile(str(fn)))
+
+    # Read just the second and third entries
+    span = (entries[1].span[0], len(fn.read_binary()))
+    reader = POReader(str(fn), span=span, first_line=entries[1].linenum)
+    span_entries = list(reader)
+    assert reader.metadata == {}
+    assert len(span_entries) == 2
+    for entry, expected in zip(span_entries, entries[1:]):
+        for field in FIELDS + ("span", "original"):
+            assert getattr(entry, field) == getattr(expected, field)
+
+
+def test_file_encoding(tmpdir):
+    po_data = SAMPLE.replace("charset=UTF-8", "charset=ISO-8859-1")
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(po_data.encode("iso-8859-1"))
+
+    reader = POReader(str(fn))
+    entries = list(reader)
+    assert reader.encoding == "ISO-8859-1"
+    assert entries[1].msgstr_plural[1] == '%(num)s "Äpfel"'
+    assert entries[1].original.endswith('"%(num)s \\"Äpfel\\""\n')
+
+
+def test_crlf(tmpdir):
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(SAMPLE.replace("\n", "\r\n").encode("utf-8"))
+
+    entries = list(iter_pofile(str(fn)))
+    assert entries[0].msgstr == "Oof %(foo)s"
+    assert entries[0].original.endswith('"%(foo)s"\n')
+
+
+def test_syntax_error():
+    po_data = build_po_string('msgid "Foo"\nmsgstr "Foo "bar""\n')
+    with pytest.raises(IOError) as exc_info:
+        read_pofile(po_data)
+    assert str(exc_info.value) == (
+        "Syntax error in po file (line 16): unescaped double quote found"
+    )
+
+
+@pytest.mark.parametrize(
+    "module, suffix", [(gzip, ".gz"), (lzma, ".xz"), (bz2, ".bz2")]
+)
+def test_compressed(tmpdir, module, suffix):
+    data = SAMPLE.encode("utf-8")
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(data)
+    compressed_fn = tmpdir.join("messages.po" + suffix)
+    compressed_fn.write_binary(module.compress(data))
+
+    assert compression(str(compressed_fn)) == module.__name__
+    assert compression(str(fn)) is None
+
+    po = read_pofile(str(compressed_fn))
+    expected = read_pofile(str(fn))
+    assert po.metadata == expected.metadata
+    assert len(po) == len(expected)
+    for entry, expected_entry in zip(po, expected):
+        for field in FIELDS + ("original",):
+            assert getattr(entry, field) == getattr(expected_entry, field)
+
+
+def test_compressed_by_magic(tmpdir):
+    # The file type comes from the contents, not the name
+    fn = tmpdir.join("messages.po")
+    fn.write_binary(gzip.compress(SAMPLE.encode("utf-8")))
+    assert [entry.msgid for entry in iter_pofile(str(fn))] == [
+        "Foo %(foo)s",
+        "%(num)s apple",
+        "Old",
+    ]
+
+
+def test_compressed_broken(tmpdir):
+    data = gzip.compress(SAMPLE.encode("utf-8"))
+    fn = tmpdir.join("messages.po.gz")
+    fn.write_binary(data[: len(data) // 2])
+    with pytest.raises(IOError, match="Invalid compressed file"):
+        read_pofile(str(fn))
+
+
+def test_iter_pofile_lines():
+    entries = list(iter_pofile(SAMPLE))
+    assert [entry.linenum for entry in entries] == [15, 23, 31]
+
+    def lines(first_line, last_line):
+        return [
+            entry.linenum for entry in iter_pofile_lines(SAMPLE, first_line, last_line)
+        ]
+
+    assert lines(1, 100) == [15, 23, 31]
+    assert lines(16, 16) == [15]
+    assert lines(22, 23) == [15, 23]
+    assert lines(24, 40) == [23, 31]
+    assert lines(1, 10) == []
+
+
+def test_decode_pofile():
+    po_data = SAMPLE.replace("charset=UTF-8", "charset=ISO-8859-1")
+    data = po_data.encode("iso-8859-1")
+    assert decode_pofile(data) == po_data
+    assert decode_pofile(bz2.compress(data)) == po_data
+    assert decode_pofile(data.replace(b"\n", b"\r\n")) == po_data
+
+    with pytest.raises(IOError):
+        decode_pofile(SAMPLE.encode("utf-16"))
@@ -0,0 +1,49 @@
+import click
+
+from dennis.reporters import OutputBuffer, get_reporters, make_styler
+
+
+class TestOutputBuffer:
+    def test_buffers_until_flush(self, capsys):
+        out = OutputBuffer()
+        out.write("foo\n")
+        out.write("bar\n")
+        assert capsys.readouterr().out == ""
+
+        out.flush()
+        assert capsys.readouterr().out == "foo\nbar\n"
+
+    def test_streams(self, capsys, monkeypatch):
+        calls = []
+
+        def echo(message, nl=True, err=False):
+            calls.append((message, err))
+
+        monkeypatch.setattr(click, "echo", echo)
+
+        out = OutputBuffer()
+        out.write("a\n")
+        out.write("b\n", err=True)
+        out.write("c\n", err=True)
+        out.write("d\n")
+        out.write("e\n")
+        out.flush()
+
+        # Keeps the order, but joins text for the same stream
+        assert calls == [("a\n", False), ("b\nc\n", True), ("d\ne\n", False)]
+
+    def test_max_size(self, capsys):
+        out = OutputBuffer(max_size=10)
+        out.write("12345")
+        assert capsys.readouterr().out == ""
+        out.write("67890")
+        assert capsys.readouterr().out == "1234567890"
+
+
+def test_make_styler():
+    style = make_styler(fg="red", bold=True)
+    assert style("foo") == click.style("foo", fg="red", bold=True)
+
+
+def test_get_reporters():
+    assert sorted(get_reporters()) == ["", "jsonl", "line", "sarif"]
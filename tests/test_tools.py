@@ -17,6 +17,13 @@ def test_empty_tokenizer():
     assert vartok.extract_variable_name("{0}") is None
 
 
+def test_tokenizer_triggers():
+    assert VariableTokenizer([]).triggers == ""
+    assert VariableTokenizer(["python-format"]).triggers == "%"
+    vartok = VariableTokenizer(["python-format", "python-brace-format"])
+    assert sorted(vartok.triggers) == ["%", "{"]
+
+
 @pytest.mark.parametrize(
     "text,expected",
     [
@@ -1,10 +1,11 @@
 import pytest
 
-from dennis.tools import VariableTokenizer
+from dennis.tools import LRUCache, VariableTokenizer
 from dennis.translator import (
     AngleQuoteTransform,
     DubstepTransform,
     EmptyTransform,
+    FusedTransform,
     HTMLExtractorTransform,
     HahaTransform,
     PirateTransform,
@@ -16,6 +17,9 @@ from dennis.translator import (
     DoubleTransform,
     XXXTransform,
     ZombieTransform,
+    compile_table,
+    get_available_pipeline_parts,
+    tokenize_variables,
 )
 
 
@@ -70,11 +74,34 @@ class TestPirateTransform(TransformTestCase):
     )
     def test_basic(self, text, expected):
         trans = PirateTransform()
-        output = trans.transform(self.vartok, [Token(text)])
+        tokens = tokenize_variables(self.vartok, [Token(text)])
+        output = trans.transform(self.vartok, tokens)
         output = "".join([token.s for token in output])
 
         assert output == expected
 
+    @pytest.mark.parametrize(
+        "text,expected",
+        [
+            ("add-ons and add-on", "bilge rats and bilge rat"),
+            ("the theme there", "th' theme tharr"),
+            ("Need no needles", "Need nay needles"),
+            ("Hi! Hello, help", "H'ello! 'ello, 'elp"),
+            ("other.er", "otherr.err"),
+            ("war raw", "warr raww"),
+            ("You are your own", "Ye' bee yerr own"),
+        ],
+    )
+    def test_pirate_transform(self, text, expected):
+        trans = PirateTransform()
+        assert trans.pirate_transform(text) == expected
+
+    def test_pirate_transform_long(self):
+        trans = PirateTransform()
+        text = "Where are your add-ons? There's no need to restart.\n"
+        expected = "Wharre bee yerr bilge rats? Tharre's nay need to restart.\n"
+        assert trans.pirate_transform(text * 2000) == expected * 2000
+
 
 class TestDubstepTransform(TransformTestCase):
     @pytest.mark.parametrize(
@@ -129,9 +156,7 @@ class TestZombieTransform(TransformTestCase):
             ("Hi   \nHello!\nmultiline", "HAR   \nHHAMNMNHR\u2757\nmNMMNHGARMNARnHA"),
             ("Hello %(username)s", "HHAMNMNHR %(username)s"),
             ("Hello %s", "HHAMNMNHR %s GRRRRRrrRR!!"),
-            # FIXME: This is a problem where variables from the variable tokenizer should
-            # be treated as immutable tokens and right now they aren't. Issue #67.
-            ("Hello {user}{name}", "HHAMNMNHR {user}{namHA}"),
+            ("Hello {user}{name}", "HHAMNMNHR {user}{name}"),
             ("Products and Services", "PMZHRGBNMZZHGRZ anGB SHAMZBBARZZHARZ"),
             ("Get community support", "GHAHG ZZHRmmNMnARHGRA RZNMBZBZHRMZHG"),
             (
@@ -146,7 +171,8 @@ class TestZombieTransform(TransformTestCase):
     )
     def test_basic(self, text, expected):
         trans = ZombieTransform()
-        output = trans.transform(self.vartok, [Token(text)])
+        tokens = tokenize_variables(self.vartok, [Token(text)])
+        output = trans.transform(self.vartok, tokens)
         output = "".join([token.s for token in output])
 
         assert output == expected
@@ -312,6 +338,44 @@ class TestRedactedTransform(TransformTestCase):
         assert output == expected
 
 
+class TestFusedTransform(TransformTestCase):
+    @pytest.mark.parametrize(
+        "spec",
+        [
+            "shouty,double",
+            "double,redacted",
+            "double,reverse,redacted",
+            "reverse,shouty,reverse",
+            "redacted,shouty,double,reverse,double",
+        ],
+    )
+    @pytest.mark.parametrize("text", ["Hello World!", "Straße \ufb03 \u0130", ""])
+    def test_same_as_in_turn(self, spec, text):
+        parts = get_available_pipeline_parts()
+        part_classes = [parts[name] for name in spec.split(",")]
+
+        tokens = [Token(text), Token("{name}", "var", False)]
+        for part_class in part_classes:
+            tokens = part_class().transform(self.vartok, tokens)
+
+        fused = FusedTransform(part_classes).transform(
+            self.vartok, [Token(text), Token("{name}", "var", False)]
+        )
+        assert fused == tokens
+
+    def test_compile_table(self):
+        # Characters that swap have to be translated all at once
+        funcs = compile_table({ord("a"): "b", ord("b"): "aa"})
+        assert len(funcs) == 1
+        assert funcs[0]("abc") == "baac"
+
+        funcs = compile_table({ord("a"): "bb", ord("b"): "c", ord("d"): ""})
+        s = "abcd"
+        for func in funcs:
+            s = func(s)
+        assert s == "bbcc"
+
+
 class TestTranslator:
     def test_pirate_translate(self):
         trans = Translator(["python-format", "python-brace-format"], ["pirate"])
@@ -333,3 +397,65 @@ class TestTranslator:
             ["python-format", "python-brace-format"], ["shouty", "html", "pirate"]
         )
         assert trans.translate_string("<b>hello.</b>\n") == "<b>HELLO aye\u2757.</b>"
+
+    @pytest.mark.parametrize(
+        "part", sorted(set(get_available_pipeline_parts()) - {"empty"})
+    )
+    def test_variables_unchanged(self, part):
+        trans = Translator(["python-format", "python-brace-format"], ["html", part])
+        output = trans.translate_string(
+            '<a title="Hi {user.name}">Where are %(count)s of {0}?</a>'
+        )
+        for variable in ("{user.name}", "%(count)s", "{0}"):
+            assert variable in output
+
+    def test_reverse_moves_variables(self):
+        trans = Translator(["python-format", "python-brace-format"], ["reverse"])
+        assert trans.translate_string("Hello %(name)s and {x}!") == (
+            "!{x} dna %(name)s olleH"
+        )
+
+    def test_html_state_not_kept(self):
+        trans = Translator(["python-format", "python-brace-format"], ["html", "shouty"])
+        assert trans.translate_string("Hello <b") == "HELLO"
+        assert trans.translate_string("there</b>") == "THERE</b>"
+        assert trans.translate_string("<style>a") == "<style>"
+        assert trans.translate_string("b") == "B"
+
+    def test_translate_strings(self):
+        trans = Translator(["python-format", "python-brace-format"], ["html", "pirate"])
+        strings = ["hello", "<b>hello</b>", "Hi %(name)s", ""]
+        assert list(trans.translate_strings(strings)) == [
+            trans.translate_string(s) for s in strings
+        ]
+
+    def test_cache(self):
+        cache = LRUCache()
+        trans = Translator(
+            ["python-format", "python-brace-format"], ["html", "pirate"], cache
+        )
+        for s in ("hello", "<b>hello</b>", "hello"):
+            assert trans.translate_string(s) == Translator(
+                ["python-format", "python-brace-format"], ["html", "pirate"]
+            ).translate_string(s)
+        assert (cache.hits, cache.misses) == (1, 2)
+        assert len(cache) == 2
+
+    def test_cache_shared(self):
+        cache = LRUCache()
+        shouty = Translator(["python-format"], ["shouty"], cache)
+        reverse = Translator(["python-format"], ["reverse"], cache)
+        assert shouty.translate_string("hello") == "HELLO"
+        assert reverse.translate_string("hello") == "olleh"
+        assert shouty.translate_string("hello") == "HELLO"
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_tokenize_variables(self):
+        vartok = VariableTokenizer(["python-format", "python-brace-format"])
+        tokens = tokenize_variables(vartok, [Token("%(a)s%(b)s x")])
+        assert tokens == [
+            Token("%(a)s", "variable", False),
+            Token("%(b)s", "variable", False),
+            Token(" x"),
+        ]
+        assert tokenize_variables(vartok, [Token("")]) == [Token("")]